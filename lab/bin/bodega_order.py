@@ -560,6 +560,21 @@ def get_order_times(sid):
   avg_prodbrik = 0
 
 
+  order  = bodega_client.get('/orders/'+sid)
+
+
+  order_time = order['time_created'].replace('T',' ').split('.')[0].replace('Z','')
+  order_time_d =  datetime.strptime(order_time,"%Y-%m-%d %H:%M:%S") - timedelta(hours=8)
+  if (DEBUG):
+    print('order_time:'+str(order_time_d))
+
+  # Prefer the estimate the server refreshes on every fulfillment pass.
+  estimated_time = order.get('estimated_fulfillment_time', None)
+  if (estimated_time):
+    estimated_time = estimated_time.replace('T',' ').split('.')[0].replace('Z','')
+    target_finish_time = datetime.strptime(estimated_time,"%Y-%m-%d %H:%M:%S") - timedelta(hours=8)
+    return (order_time_d, target_finish_time)
+
   filename = '/tmp/order-time.yml'
   stream = open(filename, "r")
   docs = yaml.load_all(stream)
@@ -573,13 +588,6 @@ def get_order_times(sid):
       if (DEBUG):
         print(k,',',v)
    
-  order  = bodega_client.get('/orders/'+sid)
-
-
-  order_time = order['time_created'].replace('T',' ').split('.')[0].replace('Z','')
-  order_time_d =  datetime.strptime(order_time,"%Y-%m-%d %H:%M:%S") - timedelta(hours=8)
-  if (DEBUG):
-    print('order_time:'+str(order_time_d))
 
   plat = ''
   loc = ''
@@ -0,0 +1,338 @@
+"""Benchmark a fulfillment pass against the number of open orders.
+
+Synthetic RktestYml items and open orders are created inside a transaction
+which is always rolled back, so this is safe to run against a development
+database. Signals are disconnected while the data is created so that no
+tasks are published. Each pass is timed and its queries are counted:
+
+    ./manage.py benchmark_fulfillment --orders 50 100 200 400 --items 300
+
+With --compare-assignment, each pass is run on the same data both with
+greedy selection and with the order assignment solver, to compare how many
+orders get an order fulfiller in a single pass.
+
+With --throughput, orders are instead fulfilled one after another with
+FulfillmentManager.fulfill_order to report fulfillments per minute. Those
+orders request STATIC pods, whose taste test doesn't reach out to anything.
+
+With --shards, every order requests pods in a single location, and a pass
+over all open orders is compared with one pass per location shard. Shard
+passes run on separate workers in production, so their wall-clock time is
+that of the slowest shard. They're run one after another here since the
+benchmark data is only visible inside its own transaction.
+
+With --requirements, no data is created. The overhead of building the
+eligible items queryset of each nickname of the orders is compared between
+a fresh FilterSet for every nickname and the compiled requirements cached by
+the item tools, without running the queries.
+"""
+import json
+import logging
+import random
+import time
+from datetime import timedelta
+
+from bodega_all.item_types import item_tools
+from bodega_all.signals import task_triggers_disconnected
+from bodega_core.fulfillment import FulfillmentManager
+from bodega_core.models import Item, Location, Network, Order, OrderUpdate
+from bodega_legacy_items.models import RktestYml
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rkelery.models import Task
+
+log = logging.getLogger(__name__)
+
+BENCHMARK_USERNAME = 'benchmark_fulfillment'
+REQUIREMENTS_CHOICES = [
+    {'platform': RktestYml.PLATFORM_DYNAPOD},
+    {'platform': RktestYml.PLATFORM_DYNAPOD, 'linux_agent': True},
+    {'platform': RktestYml.PLATFORM_DYNAPOD, 'location': 'HQ'},
+    {'platform': RktestYml.PLATFORM_STATIC, 'location': 'COLO'},
+    {'platform': RktestYml.PLATFORM_DYNAPOD_ROBO},
+]
+LOCATION_NAMES = ['COLO', 'HQ']
+
+
+class _BenchmarkRollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark a fulfillment pass against the number of open orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, nargs='+',
+                            default=[50, 100, 200, 400],
+                            help='Numbers of open orders to benchmark.')
+        parser.add_argument('--items', type=int, default=300,
+                            help='Number of RktestYml items in inventory.')
+        parser.add_argument('--items-per-order', type=int, default=2,
+                            help='Number of nicknames in each order.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed for the synthetic data.')
+        parser.add_argument('--compare-assignment', action='store_true',
+                            help='Also run each pass with the order '
+                                 'assignment solver.')
+        parser.add_argument('--throughput', action='store_true',
+                            help='Benchmark fulfilling orders instead of '
+                                 'fulfillment passes.')
+        parser.add_argument('--shards', action='store_true',
+                            help='Compare a single pass with one pass per '
+                                 'location shard.')
+        parser.add_argument('--requirements', action='store_true',
+                            help='Compare the per-nickname overhead of '
+                                 'FilterSets and compiled requirements.')
+
+    def _create_items(self, count, rand):
+        locations = {location.name: location
+                     for location in Location.objects.filter(
+                         name__in=['HQ', 'COLO'])}
+        networks = {name: Network.objects.filter(location=location).first()
+                    for name, location in locations.items()}
+        platforms = [RktestYml.PLATFORM_DYNAPOD, RktestYml.PLATFORM_STATIC,
+                     RktestYml.PLATFORM_DYNAPOD_ROBO]
+        for index in range(count):
+            location_name = rand.choice(sorted(locations.keys()))
+            RktestYml.objects.create(
+                filename='benchmark-%d.yml' % index,
+                location=locations[location_name],
+                network=networks[location_name],
+                platform=rand.choice(platforms),
+                linux_agent=rand.random() < 0.3)
+
+    def _create_orders(self, count, items_per_order, rand,
+                       requirements_choices=REQUIREMENTS_CHOICES):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        tab = user.tabs.get()
+        for _ in range(count):
+            items_delta = {
+                'pod%d' % index: {
+                    'type': 'rktest_yml',
+                    'requirements': rand.choice(requirements_choices)
+                }
+                for index in range(items_per_order)
+            }
+            order = Order.objects.create(
+                status=Order.STATUS_OPEN,
+                owner=user,
+                tab=tab)
+            OrderUpdate.objects.create(
+                items_delta=json.dumps(items_delta),
+                order=order,
+                creator=user,
+                expiration_time_limit_delta=timedelta(hours=24))
+        return user
+
+    def _create_location_orders(self, count, items_per_order, rand):
+        user = None
+        for _ in range(count):
+            location_name = rand.choice(LOCATION_NAMES)
+            requirements_choices = [
+                dict(requirements, location=location_name)
+                for requirements in REQUIREMENTS_CHOICES]
+            user = self._create_orders(1, items_per_order, rand,
+                                       requirements_choices)
+        return user
+
+    def _run_pass(self, order_update_creator, shard=None):
+        manager = FulfillmentManager(item_tools)
+        with CaptureQueriesContext(connection) as queries:
+            start_time = time.time()
+            signatures = manager.fulfill_open_orders(
+                get_order_fulfillers=lambda order_sid: Task.objects.none(),
+                create_order_fulfiller=lambda order_sid, item_sids:
+                    ('fulfill', order_sid, item_sids),
+                create_item_maintenance_setter=lambda item_sid:
+                    ('maintenance', item_sid),
+                order_update_creator=order_update_creator,
+                shard=shard)
+            elapsed_time = time.time() - start_time
+        return {
+            'seconds': elapsed_time,
+            'queries': len(queries),
+            'fulfilled': len([signature for signature in signatures
+                              if signature[0] == 'fulfill'])
+        }
+
+    def _run_fulfillments(self, order_update_creator):
+        manager = FulfillmentManager(item_tools)
+        static_items = list(Item.objects.filter(
+            rktestyml__platform=RktestYml.PLATFORM_STATIC,
+            held_by_object_id=None))
+        open_orders = list(Order.objects.filter(status=Order.STATUS_OPEN))
+
+        num_fulfilled_orders = 0
+        with CaptureQueriesContext(connection) as queries:
+            start_time = time.time()
+            for order in open_orders:
+                nicknames = list(order.items.keys())
+                if len(static_items) < len(nicknames):
+                    break
+                selected_items = {nickname: static_items.pop()
+                                  for nickname in nicknames}
+                manager.fulfill_order(order, selected_items,
+                                      order_update_creator)
+                num_fulfilled_orders += 1
+            elapsed_time = time.time() - start_time
+        return {
+            'seconds': elapsed_time,
+            'queries': len(queries),
+            'fulfilled': num_fulfilled_orders
+        }
+
+    def _benchmark_throughput(self, num_orders, options):
+        rand = random.Random(options['seed'])
+        result = None
+        try:
+            with transaction.atomic():
+                self._create_items(options['items'], rand)
+                user = self._create_orders(
+                    num_orders, options['items_per_order'], rand,
+                    [{'platform': RktestYml.PLATFORM_STATIC}])
+                result = self._run_fulfillments(user)
+                raise _BenchmarkRollback()
+        except _BenchmarkRollback:
+            pass
+        return result
+
+    def _handle_throughput(self, options):
+        self.stdout.write('%8s %10s %10s %10s %14s' %
+                          ('orders', 'seconds', 'queries', 'fulfilled',
+                           'per_minute'))
+        for num_orders in options['orders']:
+            result = self._benchmark_throughput(num_orders, options)
+            per_minute = 60.0 * result['fulfilled'] / \
+                max(result['seconds'], 1e-6)
+            self.stdout.write('%8d %10.3f %10d %10d %14.1f' %
+                              (num_orders, result['seconds'],
+                               result['queries'], result['fulfilled'],
+                               per_minute))
+
+    def _benchmark_shards(self, num_orders, options):
+        rand = random.Random(options['seed'])
+        random.seed(options['seed'])
+        shards = {
+            location_name.lower(): {
+                'item_types': ['rktest_yml'],
+                'locations': [location_name]
+            }
+            for location_name in LOCATION_NAMES
+        }
+        results = None
+        try:
+            with transaction.atomic(), override_settings(
+                    FULFILLMENT_SHARDS=shards):
+                self._create_items(options['items'], rand)
+                user = self._create_location_orders(
+                    num_orders, options['items_per_order'], rand)
+                single_result = self._run_pass(user)
+                shard_results = [self._run_pass(user, shard)
+                                 for shard in sorted(shards.keys())]
+                results = [
+                    (1, single_result['seconds'], single_result),
+                    (len(shard_results),
+                     max(result['seconds'] for result in shard_results),
+                     {key: sum(result[key] for result in shard_results)
+                      for key in ['seconds', 'queries', 'fulfilled']})
+                ]
+                raise _BenchmarkRollback()
+        except _BenchmarkRollback:
+            pass
+        return results
+
+    def _handle_shards(self, options):
+        self.stdout.write('%8s %8s %10s %10s %10s %10s' %
+                          ('shards', 'orders', 'wall_secs', 'total_secs',
+                           'queries', 'fulfilled'))
+        for num_orders in options['orders']:
+            for num_shards, wall_seconds, result in \
+                    self._benchmark_shards(num_orders, options):
+                self.stdout.write('%8d %8d %10.3f %10.3f %10d %10d' %
+                                  (num_shards, num_orders, wall_seconds,
+                                   result['seconds'], result['queries'],
+                                   result['fulfilled']))
+
+    def _benchmark_requirements(self, num_orders, options):
+        rand = random.Random(options['seed'])
+        nicknames_requirements = [
+            rand.choice(REQUIREMENTS_CHOICES)
+            for _ in range(num_orders * options['items_per_order'])
+        ]
+        item_type = item_tools.item_types['rktest_yml']
+
+        start_time = time.time()
+        for requirements in nicknames_requirements:
+            item_type.filter_class(requirements, item_type.queryset.all()).qs
+        filterset_seconds = time.time() - start_time
+
+        start_time = time.time()
+        for requirements in nicknames_requirements:
+            item_tools.find_eligible_items_for_requirements(
+                'rktest_yml', requirements, item_type.queryset.all())
+        compiled_seconds = time.time() - start_time
+        return (len(nicknames_requirements), filterset_seconds,
+                compiled_seconds)
+
+    def _handle_requirements(self, options):
+        self.stdout.write('%10s %14s %14s' %
+                          ('nicknames', 'filterset_us', 'compiled_us'))
+        for num_orders in options['orders']:
+            num_nicknames, filterset_seconds, compiled_seconds = \
+                self._benchmark_requirements(num_orders, options)
+            self.stdout.write('%10d %14.1f %14.1f' %
+                              (num_nicknames,
+                               1e6 * filterset_seconds / num_nicknames,
+                               1e6 * compiled_seconds / num_nicknames))
+
+    def _benchmark(self, num_orders, options, assignment_solver):
+        rand = random.Random(options['seed'])
+        # Item selection itself uses the global random module.
+        random.seed(options['seed'])
+        result = None
+        try:
+            with transaction.atomic(), override_settings(
+                    ENABLE_ORDER_ASSIGNMENT_SOLVER=assignment_solver):
+                self._create_items(options['items'], rand)
+                user = self._create_orders(num_orders,
+                                           options['items_per_order'],
+                                           rand)
+                result = self._run_pass(user)
+                raise _BenchmarkRollback()
+        except _BenchmarkRollback:
+            pass
+        return result
+
+    def handle(self, *args, **options):
+        if options['throughput']:
+            with task_triggers_disconnected():
+                self._handle_throughput(options)
+            return
+
+        if options['shards']:
+            with task_triggers_disconnected():
+                self._handle_shards(options)
+            return
+
+        if options['requirements']:
+            self._handle_requirements(options)
+            return
+
+        modes = [('greedy', False)]
+        if options['compare_assignment']:
+            modes.append(('solver', True))
+
+        self.stdout.write('%8s %8s %10s %10s %10s' %
+                          ('mode', 'orders', 'seconds', 'queries',
+                           'fulfilled'))
+        with task_triggers_disconnected():
+            for num_orders in options['orders']:
+                for mode, assignment_solver in modes:
+                    result = self._benchmark(num_orders, options,
+                                             assignment_solver)
+                    self.stdout.write('%8s %8d %10.3f %10d %10d' %
+                                      (mode, num_orders, result['seconds'],
+                                       result['queries'],
+                                       result['fulfilled']))
@@ -0,0 +1,50 @@
+"""Check the materialized times of orders against their updates.
+
+Reports every order whose time limits or ejection state drifted from what
+walking all its updates gives. With --rebuild, the drifted orders get the
+values computed from scratch.
+"""
+import logging
+from bodega_core.models import Order
+from django.core.management.base import BaseCommand
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Check the materialized times of orders and optionally rebuild ' \
+           'them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Rebuild the drifted times from scratch.')
+        parser.add_argument('--all', action='store_true',
+                            help='Also check closed orders.')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if not options['all']:
+            orders = orders.exclude(status=Order.STATUS_CLOSED)
+
+        num_drifted_orders = 0
+        for order in orders.iterator():
+            expected_times = order.get_update_times_from_updates()
+            drifted_field_names = [
+                field_name for field_name in Order.UPDATE_TIME_FIELDS
+                if getattr(order, field_name) != expected_times[field_name]
+            ]
+            if not drifted_field_names:
+                continue
+
+            num_drifted_orders += 1
+            for field_name in drifted_field_names:
+                self.stdout.write('%s of %s is %s but should be %s.'
+                                  % (field_name, order,
+                                     getattr(order, field_name),
+                                     expected_times[field_name]))
+            if options['rebuild']:
+                order.rebuild_update_times()
+        self.stdout.write('Found %d drifted orders.' % num_drifted_orders)
+
+        if options['rebuild']:
+            self.stdout.write('Rebuilt the drifted orders.')
@@ -0,0 +1,31 @@
+"""Check the TabDemand totals against a computation from scratch.
+
+Reports every order price and tab total which drifted from what pricing all
+live orders gives. With --rebuild, the totals are replaced by the ones
+computed from scratch.
+"""
+import logging
+from bodega_all.item_types import item_tools
+from bodega_core.demand import find_tab_demand_drift, rebuild_tab_demands
+from django.core.management.base import BaseCommand
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Check the TabDemand totals and optionally rebuild them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Rebuild the totals from scratch.')
+
+    def handle(self, *args, **options):
+        drift = find_tab_demand_drift(item_tools)
+        for (description, expected, actual) in drift:
+            self.stdout.write('%s is %s but should be %s.'
+                              % (description, actual, expected))
+        self.stdout.write('Found %d drifted values.' % len(drift))
+
+        if options['rebuild']:
+            rebuild_tab_demands(item_tools)
+            self.stdout.write('Rebuilt the tab demands.')
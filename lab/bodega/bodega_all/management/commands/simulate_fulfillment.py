@@ -0,0 +1,174 @@
+"""Replay a stream of orders against the fulfillment code offline.
+
+Events are read from a file with one JSON event per line, in the format
+described in bodega_core.simulation, or generated synthetically:
+
+    ./manage.py simulate_fulfillment --events orders.jsonl
+    ./manage.py simulate_fulfillment --orders 300 --items 100 --hold 3600
+
+Everything is created inside a transaction which is always rolled back, with
+task triggers disconnected, so this is safe to run against a development
+database. Only rktest_yml items can be created by events for now; their
+"location" field is given by name.
+"""
+import json
+import logging
+import random
+
+from bodega_all.item_types import item_tools
+from bodega_all.signals import task_triggers_disconnected
+from bodega_core.models import Location, Network
+from bodega_core.simulation import FulfillmentSimulator
+from bodega_legacy_items.models import RktestYml
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+log = logging.getLogger(__name__)
+
+SIMULATION_USERNAME = 'simulate_fulfillment'
+REQUIREMENTS_CHOICES = [
+    {'platform': RktestYml.PLATFORM_DYNAPOD},
+    {'platform': RktestYml.PLATFORM_DYNAPOD, 'linux_agent': True},
+    {'platform': RktestYml.PLATFORM_DYNAPOD, 'location': 'HQ'},
+    {'platform': RktestYml.PLATFORM_STATIC, 'location': 'COLO'},
+    {'platform': RktestYml.PLATFORM_DYNAPOD_ROBO},
+]
+PLATFORM_CHOICES = [RktestYml.PLATFORM_DYNAPOD, RktestYml.PLATFORM_STATIC,
+                    RktestYml.PLATFORM_DYNAPOD_ROBO]
+LOCATION_NAMES = ['COLO', 'HQ']
+NUM_OWNERS = 10
+
+
+class _SimulationRollback(Exception):
+    pass
+
+
+def _create_rktest_yml(event):
+    if event.get('item_type', None) != 'rktest_yml':
+        raise CommandError('Cannot create items of type %s.'
+                           % repr(event.get('item_type', None)))
+
+    fields = dict(event['fields'])
+    location = Location.objects.get(name=fields.pop('location'))
+    RktestYml.objects.create(
+        location=location,
+        network=Network.objects.filter(location=location).first(),
+        **fields)
+
+
+def _generate_events(options):
+    rand = random.Random(options['seed'])
+    events = []
+    for index in range(options['items']):
+        events.append({
+            'time': 0,
+            'type': 'create',
+            'item_type': 'rktest_yml',
+            'fields': {
+                'filename': 'simulation-%d.yml' % index,
+                'location': rand.choice(LOCATION_NAMES),
+                'platform': rand.choice(PLATFORM_CHOICES),
+                'linux_agent': rand.random() < 0.3
+            }
+        })
+
+    arrival_time = 0.0
+    for index in range(options['orders']):
+        arrival_time += rand.expovariate(1.0 / options['arrival_interval'])
+        events.append({
+            'time': int(arrival_time),
+            'type': 'order',
+            'id': 'order%d' % index,
+            'owner': 'simulation_owner%d' % rand.randrange(NUM_OWNERS),
+            'items': {
+                'pod%d' % nickname_index: {
+                    'type': 'rktest_yml',
+                    'requirements': rand.choice(REQUIREMENTS_CHOICES)
+                }
+                for nickname_index in range(options['items_per_order'])
+            },
+            'hold': int(rand.expovariate(1.0 / options['hold']))
+        })
+    return events
+
+
+def _read_events(path):
+    with open(path) as events_file:
+        return [json.loads(line) for line in events_file if line.strip()]
+
+
+def _format_optional(value):
+    if value is None:
+        return '-'
+    return '%.3f' % value
+
+
+class Command(BaseCommand):
+    help = 'Replay a stream of orders against the fulfillment code offline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events',
+                            help='File with one JSON event per line. If not '
+                                 'given, events are generated.')
+        parser.add_argument('--orders', type=int, default=200,
+                            help='Number of orders to generate.')
+        parser.add_argument('--items', type=int, default=100,
+                            help='Number of RktestYml items to generate.')
+        parser.add_argument('--items-per-order', type=int, default=2,
+                            help='Number of nicknames in each generated '
+                                 'order.')
+        parser.add_argument('--arrival-interval', type=float, default=30.0,
+                            help='Mean simulated seconds between generated '
+                                 'orders.')
+        parser.add_argument('--hold', type=float, default=3600.0,
+                            help='Mean simulated seconds generated orders '
+                                 'hold their items.')
+        parser.add_argument('--pass-interval', type=int, default=60,
+                            help='Simulated seconds between fulfillment '
+                                 'passes.')
+        parser.add_argument('--max-passes', type=int, default=1000,
+                            help='Stop after this many passes.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed for generated events and item '
+                                 'selection.')
+
+    def handle(self, *args, **options):
+        if options['events']:
+            events = _read_events(options['events'])
+        else:
+            events = _generate_events(options)
+
+        # Item selection itself uses the global random module.
+        random.seed(options['seed'])
+        results = None
+        with task_triggers_disconnected():
+            try:
+                with transaction.atomic():
+                    user, _ = User.objects.get_or_create(
+                        username=SIMULATION_USERNAME)
+                    simulator = FulfillmentSimulator(
+                        item_tools, events, _create_rktest_yml, user,
+                        pass_interval=options['pass_interval'],
+                        max_passes=options['max_passes'])
+                    results = simulator.run()
+                    raise _SimulationRollback()
+            except _SimulationRollback:
+                pass
+
+        self.stdout.write('Fulfilled %d of %d orders in %d passes.'
+                          % (results['fulfilled'], results['orders'],
+                             results['passes']))
+        self.stdout.write('Latency in simulated seconds: p50=%s p90=%s '
+                          'p99=%s max=%s'
+                          % tuple(_format_optional(results[key]) for key in
+                                  ['latency_p50', 'latency_p90',
+                                   'latency_p99', 'latency_max']))
+        self.stdout.write('Orders fulfilled per pass: %.2f'
+                          % results['fulfilled_per_pass'])
+        self.stdout.write('Item creators requested: %d' % results['creators'])
+        self.stdout.write('Pass duration in seconds: p50=%s max=%s'
+                          % (_format_optional(results['pass_seconds_p50']),
+                             _format_optional(results['pass_seconds_max'])))
+        self.stdout.write('Queries per pass: %.1f'
+                          % results['queries_per_pass'])
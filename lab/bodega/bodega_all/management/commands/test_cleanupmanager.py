@@ -7,7 +7,7 @@ from time import sleep
 from unittest import skipUnless
 
 from bodega_all.item_types import item_tools
-from bodega_all.tasks import HandleItemCleanupTask
+from bodega_all.tasks import HandleItemsCleanupTask
 from bodega_core.cleanup import CleanupManager
 from bodega_core.models import Location, Order, Network
 from bodega_legacy_items.models import JenkinsTask, ReleaseQualBaton, RktestYml
@@ -34,10 +34,10 @@ def jenkins_flag():
     return 'jenkins' in flags
 
 
-def create_item_cleaner(item_sid):
+def create_items_cleaner(item_sids):
     return Task.objects.create(
-        task=HandleItemCleanupTask.name,
-        args=[item_sid],
+        task=HandleItemsCleanupTask.name,
+        args=[item_sids],
         kwargs={})
 
 
@@ -56,7 +56,7 @@ class CleanupManagerReleaseQualBatonTestCase(TestCase):
         baton = ReleaseQualBaton.objects.create(held_by=order)
         self.assertEqual(baton.held_by, order,
                          msg='setup error: baton not assigned to order')
-        self.manager.process_items_cleanup(create_item_cleaner)
+        self.manager.process_items_cleanup(create_items_cleaner)
         Task.objects.simulate_run_all()
         order.refresh_from_db()
         baton.refresh_from_db()
@@ -116,7 +116,7 @@ class CleanupManagerRktestYmlTestCase(TestCase):
         order2 = self.create_fulfilled_order()
         dynapod1 = self.create_dynapod(self.get_random_name(), held_by=order1)
         dynapod2 = self.create_dynapod(self.get_random_name(), held_by=order2)
-        self.manager.process_items_cleanup(create_item_cleaner)
+        self.manager.process_items_cleanup(create_items_cleaner)
         Task.objects.simulate_run_all()
         order1.refresh_from_db()
         order2.refresh_from_db()
@@ -136,7 +136,7 @@ class CleanupManagerRktestYmlTestCase(TestCase):
         order = self.create_closed_order()
         self.create_dynapod(self.get_random_name(), held_by=order)
         initial_task_count = JenkinsTask.objects.all().count()
-        self.manager.process_items_cleanup(create_item_cleaner)
+        self.manager.process_items_cleanup(create_items_cleaner)
         Task.objects.simulate_run_all()
         new_task_count = JenkinsTask.objects.all().count()
         self.assertEqual(new_task_count - initial_task_count, 1,
@@ -146,7 +146,7 @@ class CleanupManagerRktestYmlTestCase(TestCase):
     def testHeldByTransitionToRecovery(self):
         order = self.create_closed_order()
         dynapod = self.create_dynapod(self.get_random_name(), held_by=order)
-        self.manager.process_items_cleanup(create_item_cleaner)
+        self.manager.process_items_cleanup(create_items_cleaner)
         Task.objects.simulate_run_all()
         order.refresh_from_db()
         dynapod.refresh_from_db()
@@ -170,7 +170,7 @@ class CleanupManagerRktestYmlTestCase(TestCase):
     # def testJenkinsBuildTrigger(self):
     #     order = self.create_closed_order()
     #     dynapod = self.create_dynapod(self.get_random_name(), held_by=order)
-    #     self.manager.process_items_cleanup(create_item_cleaner)
+    #     self.manager.process_items_cleanup(create_items_cleaner)
     #     Task.objects.simulate_run_all()
     #     sleep(RECOVERY_SLEEP)
     #     dynapod.refresh_from_db()
@@ -181,10 +181,10 @@ class CleanupManagerRktestYmlTestCase(TestCase):
     def testHeldByTransitionToFree(self):
         order = self.create_closed_order()
         dynapod = self.create_dynapod(self.get_random_name(), held_by=order)
-        self.manager.process_items_cleanup(create_item_cleaner)
+        self.manager.process_items_cleanup(create_items_cleaner)
         Task.objects.simulate_run_all()
         sleep(RECOVERY_SLEEP)
-        self.manager.process_items_cleanup(create_item_cleaner)
+        self.manager.process_items_cleanup(create_items_cleaner)
         Task.objects.simulate_run_all()
         order.refresh_from_db()
         dynapod.refresh_from_db()
@@ -204,10 +204,10 @@ class CleanupManagerRktestYmlTestCase(TestCase):
         dynapod7 = self.create_dynapod('dynapod7', order3)
         dynapod8 = self.create_dynapod('dynapod8', order4)
         dynapod9 = self.create_dynapod('dynapod9', order3)
-        self.manager.process_items_cleanup(create_item_cleaner)
+        self.manager.process_items_cleanup(create_items_cleaner)
         Task.objects.simulate_run_all()
         sleep(RECOVERY_SLEEP)
-        self.manager.process_items_cleanup(create_item_cleaner)
+        self.manager.process_items_cleanup(create_items_cleaner)
         Task.objects.simulate_run_all()
         dynapod5.refresh_from_db()
         dynapod6.refresh_from_db()
@@ -0,0 +1,49 @@
+"""Report the demand, size, hit rate and idle cost of each warm pool.
+
+Pools are configured with WARM_POOLS as described in bodega_core.warm_pools.
+The hit rate is the fraction of fulfilled orders for a pool's items which
+didn't wait as long as creating an item takes, and the idle cost is the
+total price of the pool's items which are currently unheld.
+"""
+import logging
+from bodega_all.item_types import item_tools
+from bodega_all.tasks import (
+    get_creator_wall_times, get_num_pending_warm_pool_creators)
+from bodega_core.fulfillment import FulfillmentManager
+from bodega_core.warm_pools import WarmPoolManager
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+log = logging.getLogger(__name__)
+
+
+def _format_optional(value, format_string):
+    if value is None:
+        return '-'
+    return format_string % value
+
+
+class Command(BaseCommand):
+    help = 'Report the demand, size, hit rate and idle cost of warm pools.'
+
+    def handle(self, *args, **options):
+        warm_pool_manager = WarmPoolManager(item_tools,
+                                            FulfillmentManager(item_tools))
+        self.stdout.write('%-20s %8s %10s %8s %8s %8s %10s %10s' %
+                          ('pool', 'demand', 'latency', 'target', 'idle',
+                           'pending', 'hit_rate', 'idle_cost'))
+        for pool_name, pool_spec in sorted(settings.WARM_POOLS.items()):
+            status = warm_pool_manager.get_pool_status(
+                pool_name, pool_spec, get_num_pending_warm_pool_creators,
+                get_creator_wall_times, include_hit_rate=True)
+            self.stdout.write(
+                '%-20s %8d %10s %8d %8d %8d %10s %10.3f' %
+                (pool_name, status['demand'],
+                 _format_optional(status['creation_latency'], '%.0f'),
+                 status['target'], status['idle_items'],
+                 status['pending_creators'],
+                 _format_optional(status['hit_rate'], '%.2f'),
+                 status['idle_cost']))
+        self.stdout.write('Demand is the number of matching order items '
+                          'placed in the last %s.'
+                          % settings.WARM_POOL_DEMAND_WINDOW)
@@ -203,8 +203,11 @@ class OrderUpdateSerializer(HyperlinkedModelWithSidFromIdSerializer):
         if 'new_owner' in validated_data:
             order.owner = validated_data['new_owner']
 
+        # The update materializes its times on the order itself, so only
+        # save the fields changed here rather than stale times.
         with transaction.atomic():
-            order.save()
+            order.save(update_fields=['owner', 'status',
+                                      'tab_based_priority'])
             return super(OrderUpdateSerializer, self).create(validated_data)
 
     class Meta(HyperlinkedModelWithSidFromIdSerializer.Meta):
@@ -358,7 +361,9 @@ class OrderSerializer(HyperlinkedModelWithSidFromIdSerializer):
 class OrderDetailSerializer(OrderSerializer):
     """Detailed serializer for the Order model."""
 
+    estimated_fulfillment_time = serializers.SerializerMethodField()
     item_prices = serializers.SerializerMethodField()
+    queue_position = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
     # Only serialize the first ten updates since in most cases, all of the
     # useful information will be materialized there. For orders with many
@@ -367,6 +372,19 @@ class OrderDetailSerializer(OrderSerializer):
                                     read_only=True,
                                     source='first_few_updates')
 
+    def get_estimated_fulfillment_time(self, order):
+        # Estimates are only refreshed while the order is open.
+        if order.status != Order.STATUS_OPEN or \
+                order.estimated_fulfillment_time is None:
+            return None
+        return serializers.DateTimeField().to_representation(
+            order.estimated_fulfillment_time)
+
+    def get_queue_position(self, order):
+        if order.status != Order.STATUS_OPEN:
+            return None
+        return order.queue_position
+
     def get_item_prices(self, order):
         item_prices = item_tools.get_prices_for_items(order.items.items())
 
@@ -394,12 +412,15 @@ class OrderDetailSerializer(OrderSerializer):
         # Use the serializer for each specific Item so the attributes
         # shown in the detailed view
         fulfilled_items_dict = order.fulfilled_items
+        specific_items = item_tools.get_specific_items(
+            fulfilled_items_dict.values())
         fulfilled_items = OrderedDict()
-        for nickname in fulfilled_items_dict:
+        for nickname, specific_item in zip(fulfilled_items_dict,
+                                           specific_items):
             fulfilled_item = fulfilled_items_dict[nickname]
             serializer_class = item_tools.get_serializer_class(fulfilled_item)
             fulfilled_items[nickname] = serializer_class(
-                item_tools.get_specific_item(fulfilled_item),
+                specific_item,
                 context=self.context).data
         return fulfilled_items
 
@@ -407,9 +428,11 @@ class OrderDetailSerializer(OrderSerializer):
         """Serialized fields for the OrderDetail view."""
 
         fields = OrderSerializer.Meta.fields +\
-            ('item_prices', 'total_price', 'updates',)
+            ('estimated_fulfillment_time', 'item_prices', 'queue_position',
+             'total_price', 'updates',)
         read_only_fields = OrderSerializer.Meta.read_only_fields +\
-            ('item_prices', 'total_price', 'updates',)
+            ('estimated_fulfillment_time', 'item_prices', 'queue_position',
+             'total_price', 'updates',)
 
 
 class TaskSerializer(serializers.HyperlinkedModelSerializer):
@@ -9,21 +9,41 @@ changing situations such as new user requests or crashes / hardware failures
 without wasting much work or having tasks queued for a long time.
 """
 import sys
+from contextlib import contextmanager
 
 from bodega_core.models import Item, Order, OrderUpdate, Tab
+from bodega_core.pricing import invalidate_item_prices
+from bodega_core.sharding import get_fulfillment_shards
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from rkelery import Group
 from .tasks import (
-    FulfillOpenOrdersTask, ProcessItemCleanupTask,
-    SendOrderUpdateNotificationsTask)
+    ProcessItemCleanupTask, request_fulfillment_pass,
+    request_item_fulfillment, SendOrderUpdateNotificationsTask)
 
 # Detect whether we're running unit tests using technique suggested at
 # http://stackoverflow.com/questions/6957016/detect-django-testing-mode
 _running_unit_tests = 'test' in sys.argv
 
 
+@contextmanager
+def task_triggers_disconnected():
+    """Stop saving order updates and items from triggering tasks.
+
+    This is for offline tools such as benchmarks and simulations which create
+    orders and items that real tasks should never see.
+    """
+    post_save.disconnect(on_order_update_saved, sender=OrderUpdate)
+    post_save.disconnect(on_item_saved)
+    try:
+        yield
+    finally:
+        post_save.connect(on_order_update_saved, sender=OrderUpdate)
+        post_save.connect(on_item_saved)
+
+
 @receiver(post_save, sender=OrderUpdate)
 def on_order_update_saved(sender, instance, created, *args, **kwargs):
     if _running_unit_tests:
@@ -40,7 +60,12 @@ def on_order_update_saved(sender, instance, created, *args, **kwargs):
     SendOrderUpdateNotificationsTask.delay(order_update_sid=instance.sid)
 
     if instance.items_delta:
-        FulfillOpenOrdersTask.delay()
+        # Wait for the commit so a pending pass can't start without seeing
+        # this update. Only the shard of the order needs a pass, if it has
+        # one.
+        order = instance.order
+        transaction.on_commit(lambda: request_fulfillment_pass(
+            shard=get_fulfillment_shards().get_order_shard(order.items)))
     elif instance.new_status == Order.STATUS_CLOSED:
         signatures = [ProcessItemCleanupTask.si(item.sid)
                       for item in instance.order.fulfilled_items.values()]
@@ -55,8 +80,22 @@ def on_item_saved(sender, instance, created, *args, **kwargs):
     if not(issubclass(sender, Item)):
         return
 
+    # Only the open orders waiting for this item need another look. Full
+    # passes still run periodically to catch anything missed.
     if instance.held_by is None and instance.state != Item.STATE_DESTROYED:
-        FulfillOpenOrdersTask.delay()
+        item_sid = instance.sid
+        transaction.on_commit(lambda: request_item_fulfillment(item_sid))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def on_item_inventory_changed(sender, instance, *args, **kwargs):
+    """Forget item prices, which may depend on the items in inventory."""
+    if not issubclass(sender, Item):
+        return
+
+    if kwargs.get('created', True):
+        invalidate_item_prices()
 
 
 @receiver(post_save, sender=User)
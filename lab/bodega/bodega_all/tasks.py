@@ -12,11 +12,16 @@ from bodega_core.cleanup import CleanupManager
 from bodega_core.ejection import EjectionManager
 from bodega_core.fulfillment import FulfillmentManager
 from bodega_core.models import Item, Order, OrderUpdate
-from bodega_core.tasks import GlobalTask, SingleItemTask
+from bodega_core.profiling import PassProfiler
+from bodega_core.tasks import (GlobalTask, ITEM_LINK_NAME, MultipleItemsTask,
+                               SingleItemTask, WARM_POOL_LINK_NAME)
+from bodega_core.warm_pools import WarmPoolManager
 from django.conf import settings
+from django.db.models import Q
+from instrumentation.utils import increment_counter
 from requests.exceptions import HTTPError
-from rkelery import Group, register_task, states, Task
-from rkelery.utils import json_dump
+from rkelery import Group, register_task, states, SynchronizedTask, Task
+from sid_from_id.encoder import SidEncoder
 from .item_types import item_tools
 from .utils import absolute_reverse, get_url_and_display_name
 
@@ -26,6 +31,12 @@ rkslacker = RkSlacker(bot_token=getattr(settings, 'SLACK_TOKEN', None))
 DEFAULT_NOTIFICATION_RETRY_SECONDS = 1
 MAX_EXPONENTIAL_BACKOFF_SECONDS = 60
 MAX_NOTIFICATION_RETRY_ATTEMPTS = 10
+ORDER_LINK_NAME = 'order'
+SHARD_LINK_NAME = 'fulfillment_shard'
+# The shard link of passes over all open orders.
+ALL_SHARDS_LINK_SID = '*'
+# Keep each query well below the 2100 parameters allowed by SQL Server.
+ORDER_SIDS_BATCH_SIZE = 1000
 
 
 # TODO(kenny) This function, and in general the mixture of task
@@ -35,24 +46,179 @@ MAX_NOTIFICATION_RETRY_ATTEMPTS = 10
 def get_order_fulfillers(order_sid):
     return rkelery.models.Task.objects.filter(
         task=FulfillOrderTask.name,
-        args_json__contains=json_dump(order_sid),
+        links__name=ORDER_LINK_NAME,
+        links__sid=str(order_sid),
         task_result__status__in=(
             states.PRE_RUNNING_STATES.union(frozenset(states.RUNNING))))
 
 
+def get_sids_of_orders_with_fulfillers(order_sids):
+    """Return the SIDs of the given orders which have order fulfillers."""
+    order_sids = [str(order_sid) for order_sid in order_sids]
+    sids_of_orders_with_fulfillers = set()
+    for start in range(0, len(order_sids), ORDER_SIDS_BATCH_SIZE):
+        order_fulfiller_links = rkelery.models.TaskLink.objects.filter(
+            name=ORDER_LINK_NAME,
+            sid__in=order_sids[start:start + ORDER_SIDS_BATCH_SIZE],
+            task__task=FulfillOrderTask.name,
+            task__task_result__status__in=(
+                states.PRE_RUNNING_STATES.union(
+                    frozenset(states.RUNNING))))
+        sids_of_orders_with_fulfillers.update(
+            order_fulfiller_links.values_list('sid', flat=True))
+    return sids_of_orders_with_fulfillers
+
+
+def _filter_passes_covering_shard(tasks, shard):
+    """Filter fulfillment passes down to those covering a shard.
+
+    A pass over all open orders covers every shard.
+    """
+    shard_link_sids = [ALL_SHARDS_LINK_SID]
+    if shard is not None:
+        shard_link_sids.append(shard)
+    return tasks.filter(task=FulfillOpenOrdersTask.name,
+                        links__name=SHARD_LINK_NAME,
+                        links__sid__in=shard_link_sids)
+
+
+def request_fulfillment_pass(shard=None):
+    """Make sure a fulfillment pass will run after this request.
+
+    Signals request a pass on every relevant change, which comes in bursts
+    such as many cleanups finishing together or a release pipeline placing
+    hundreds of orders. Since fulfillment passes are synchronized, a pass
+    which hasn't started running yet will see every change made before it
+    starts, so there's no need to publish another one while it waits. At
+    most one pass is then pending and one running, and the pending one is
+    the trailing pass after the last request.
+
+    If shard is given, only the open orders of that fulfillment shard need
+    to be processed, so a pass over just that shard is published unless a
+    pass covering it is pending.
+
+    New passes are published with a short countdown so the rest of a burst
+    is coalesced into them. Returns the published task, or None if the
+    request was coalesced into a pending pass.
+    """
+    increment_counter('fulfillment_triggers.received')
+    pending_passes = _filter_passes_covering_shard(
+        rkelery.models.Task.objects.filter_pre_running_tasks(), shard)
+    if pending_passes.exists():
+        increment_counter('fulfillment_triggers.coalesced')
+        return None
+
+    increment_counter('fulfillment_triggers.published')
+    kwargs = {}
+    if shard is not None:
+        kwargs['shard'] = shard
+    return FulfillOpenOrdersTask.apply_async(
+        kwargs=kwargs,
+        countdown=settings.FULFILLMENT_TRIGGER_DEBOUNCE.total_seconds())
+
+
+def request_item_fulfillment(item_sid):
+    """Make sure the open orders waiting for an item will be tried with it.
+
+    Like request_fulfillment_pass, the request is coalesced into a pending
+    task which will see the item as it is now. That's either a pass over all
+    open orders or a FulfillOpenOrdersForItemTask for the same item. Returns
+    the published task, or None if the request was coalesced.
+    """
+    increment_counter('item_fulfillment_triggers.received')
+    pending_tasks = rkelery.models.Task.objects.filter_pre_running_tasks()
+    if _filter_passes_covering_shard(pending_tasks, None).exists() or \
+            pending_tasks.filter(
+                task=FulfillOpenOrdersForItemTask.name,
+                links__name=ITEM_LINK_NAME,
+                links__sid=str(item_sid)).exists():
+        increment_counter('item_fulfillment_triggers.coalesced')
+        return None
+
+    increment_counter('item_fulfillment_triggers.published')
+    return FulfillOpenOrdersForItemTask.delay(item_sid=item_sid)
+
+
+def find_fulfillment_competitors(tasks, shard=None):
+    """Filter tasks down to those which may assign the same items.
+
+    Passes over different fulfillment shards never select the same items,
+    so they run concurrently. Everything else, including incremental
+    fulfillment for an item and replenishing warm pools, runs one at a time
+    with them.
+    """
+    if shard is None:
+        return tasks.filter(task__in=[FulfillOpenOrdersTask.name,
+                                      FulfillOpenOrdersForItemTask.name,
+                                      ReplenishWarmPoolsTask.name])
+    return tasks.filter(
+        Q(task__in=[FulfillOpenOrdersForItemTask.name,
+                    ReplenishWarmPoolsTask.name]) |
+        Q(task=FulfillOpenOrdersTask.name,
+          links__name=SHARD_LINK_NAME,
+          links__sid__in=[ALL_SHARDS_LINK_SID, shard])).distinct()
+
+
+@register_task
+class FulfillOpenOrdersTask(SynchronizedTask):
+    @classmethod
+    def get_summary(cls, shard=None):
+        if shard is None:
+            return 'Fulfill open orders.'
+        return 'Fulfill open orders of shard %s.' % repr(shard)
+
+    @classmethod
+    def get_links(cls, shard=None):
+        if shard is None:
+            return [(SHARD_LINK_NAME, ALL_SHARDS_LINK_SID)]
+        return [(SHARD_LINK_NAME, shard)]
+
+    def find_competitors(self, tasks, shard=None):
+        return find_fulfillment_competitors(tasks, shard)
+
+    def run(self, shard=None):
+        profiler = PassProfiler()
+        fulfillment_manager = FulfillmentManager(item_tools,
+                                                 profiler=profiler)
+        with profiler:
+            signatures = fulfillment_manager.fulfill_open_orders(
+                get_order_fulfillers,
+                FulfillOrderTask.si,
+                SetItemToMaintenanceTask.si,
+                self.model_instance,
+                get_sids_of_orders_with_fulfillers,
+                shard=shard)
+            with profiler.phase('publish_signatures'):
+                Group(signatures).delay()
+
+        profiler.publish()
+        profiler.save(self.model_instance,
+                      settings.FULFILLMENT_PASS_PROFILE_RETENTION)
+
+
 @register_task
-class FulfillOpenOrdersTask(GlobalTask):
+class FulfillOpenOrdersForItemTask(SynchronizedTask):
     @classmethod
-    def get_summary(cls, *args, **kwargs):
-        return 'Fulfill open orders.'
+    def get_summary(cls, item_sid):
+        return ('Fulfill open orders waiting for item %s.'
+                % repr(str(item_sid)))
 
-    def run(self, *args, **kwargs):
+    @classmethod
+    def get_links(cls, item_sid):
+        return [(ITEM_LINK_NAME, item_sid)]
+
+    def find_competitors(self, tasks, item_sid):
+        return find_fulfillment_competitors(tasks)
+
+    def run(self, item_sid):
+        item = Item.objects.get(sid=item_sid)
         fulfillment_manager = FulfillmentManager(item_tools)
-        signatures = fulfillment_manager.fulfill_open_orders(
+        signatures = fulfillment_manager.fulfill_open_orders_for_item(
+            item,
             get_order_fulfillers,
             FulfillOrderTask.si,
-            SetItemToMaintenanceTask.si,
-            self.model_instance)
+            self.model_instance,
+            get_sids_of_orders_with_fulfillers)
         Group(signatures).delay()
 
 
@@ -65,6 +231,10 @@ class FulfillOrderTask(Task):
             'Fulfill order %s using items %s.' %
             (repr(str(order_sid)), repr(item_sids)))
 
+    @classmethod
+    def get_links(cls, order_sid, selected_item_sids):
+        return [(ORDER_LINK_NAME, order_sid)]
+
     def get_blockage_cause(self, order_sid, selected_item_sids):
         # TODO: https://rubrik.atlassian.net/browse/INFRA-1634
         # The task needs to make sure it is holding the selected items
@@ -126,7 +296,7 @@ class ProcessItemsCleanupTask(GlobalTask):
     def run(self):
         cleanup_manager = CleanupManager(item_tools)
         signatures = cleanup_manager.process_items_cleanup(
-            HandleItemCleanupTask.si)
+            HandleItemsCleanupTask.si)
         Group(signatures).delay()
 
 
@@ -156,6 +326,21 @@ class HandleItemCleanupTask(SingleItemTask):
         cleanup_manager.handle_item_cleanup(item)
 
 
+@register_task
+class HandleItemsCleanupTask(MultipleItemsTask):
+    @classmethod
+    def get_summary(cls, item_sids):
+        return 'Handle cleanup of items %s.' % \
+            ', '.join(repr(str(item_sid)) for item_sid in item_sids)
+
+    def run(self, item_sids):
+        cleanup_manager = CleanupManager(item_tools)
+        encoder = SidEncoder(Item)
+        items = Item.objects.filter(
+            id__in=[encoder.decode(item_sid) for item_sid in item_sids])
+        cleanup_manager.handle_items_cleanup(items)
+
+
 @register_task
 class ProcessOrderTimeLimitsTask(GlobalTask):
     @classmethod
@@ -167,6 +352,42 @@ class ProcessOrderTimeLimitsTask(GlobalTask):
         ejection_manager.process_orders_time_limits()
 
 
+def get_num_pending_warm_pool_creators(pool_name):
+    return rkelery.models.Task.objects.filter(
+        links__name=WARM_POOL_LINK_NAME,
+        links__sid=pool_name,
+        task_result__status__in=states.UNREADY_STATES).count()
+
+
+def get_creator_wall_times(task_name, start_time):
+    successful_creators = rkelery.models.Task.objects.filter(
+        task=task_name,
+        time_published__gte=start_time,
+        task_result__status=states.SUCCESS).select_related('task_result')
+    return [creator.wall_time for creator in successful_creators]
+
+
+@register_task
+class ReplenishWarmPoolsTask(SynchronizedTask):
+    @classmethod
+    def get_summary(cls):
+        return 'Replenish warm pools.'
+
+    def find_competitors(self, tasks):
+        # Ingredients of pool items are selected like those of orders, so
+        # this competes with fulfillment as well as other replenishments.
+        return find_fulfillment_competitors(tasks)
+
+    def run(self):
+        warm_pool_manager = WarmPoolManager(item_tools,
+                                            FulfillmentManager(item_tools))
+        pool_creators = warm_pool_manager.replenish_pools(
+            get_num_pending_warm_pool_creators, get_creator_wall_times)
+        for pool_name, item_creator in pool_creators:
+            item_creator.delay()
+            increment_counter('warm_pools.%s.creators' % pool_name)
+
+
 @register_task
 class SendOrderUpdateNotificationsTask(Task):
     """Send notifications for an order update.
@@ -251,6 +472,9 @@ class SendOrderUpdateNotificationsTask(Task):
 
         items = order.items
         fulfilled_items = order.fulfilled_items
+        specific_fulfilled_items = dict(zip(
+            fulfilled_items.keys(),
+            item_tools.get_specific_items(fulfilled_items.values())))
         msg += ('> %d item(s) in order:\n' % len(items))
         for nickname, item in items.items():
             requirements = ', '.join(['%s=%s' %
@@ -258,8 +482,7 @@ class SendOrderUpdateNotificationsTask(Task):
                                       for name, value
                                       in item['requirements'].items()])
             if fulfilled_items:
-                fulfilled_item = \
-                    item_tools.get_specific_item(fulfilled_items[nickname])
+                fulfilled_item = specific_fulfilled_items[nickname]
                 fulfilled_item_str = ('=> `%s`\n' % str(fulfilled_item.name))
             else:
                 fulfilled_item_str = '\n'
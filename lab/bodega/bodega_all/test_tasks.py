@@ -0,0 +1,143 @@
+"""Test global Bodega tasks."""
+import logging
+
+from bodega_core.models import Order
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rkelery import get_task_class, states
+from rkelery.models import Task
+from bodega_test_items.tasks import CreateBasicItemTask
+from .tasks import (
+    find_fulfillment_competitors, FulfillOpenOrdersForItemTask,
+    FulfillOpenOrdersTask, FulfillOrderTask,
+    get_num_pending_warm_pool_creators, get_order_fulfillers,
+    get_sids_of_orders_with_fulfillers, HandleItemCleanupTask,
+    HandleItemsCleanupTask, ReplenishWarmPoolsTask, request_fulfillment_pass)
+
+log = logging.getLogger(__name__)
+
+
+class OrderFulfillersTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='User')
+        self.orders = [
+            Order.objects.create(status=Order.STATUS_OPEN,
+                                 owner=user,
+                                 tab=user.tabs.get())
+            for _ in range(3)
+        ]
+
+    def create_order_fulfiller(self, order):
+        task = Task.objects.create(
+            task=FulfillOrderTask.name,
+            args=[order.sid, {}],
+            kwargs={})
+        task.create_links()
+        return task
+
+    def test_order_fulfillers_are_found_by_links(self):
+        order_fulfiller = self.create_order_fulfiller(self.orders[0])
+        finished_order_fulfiller = self.create_order_fulfiller(self.orders[1])
+        finished_order_fulfiller.task_result.status = states.SUCCESS
+        finished_order_fulfiller.task_result.save()
+
+        self.assertEqual(order_fulfiller.links.get().sid,
+                         str(self.orders[0].sid))
+        self.assertEqual(list(get_order_fulfillers(self.orders[0].sid)),
+                         [order_fulfiller])
+        self.assertFalse(get_order_fulfillers(self.orders[1].sid).exists())
+        self.assertFalse(get_order_fulfillers(self.orders[2].sid).exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_sids_of_orders_with_fulfillers(
+                    [order.sid for order in self.orders]),
+                set([str(self.orders[0].sid)]))
+
+
+class RequestFulfillmentPassTestCase(TestCase):
+    def create_pass(self, **kwargs):
+        fulfillment_pass = Task.objects.create(
+            task=FulfillOpenOrdersTask.name, args=[], kwargs=kwargs)
+        fulfillment_pass.create_links()
+        return fulfillment_pass
+
+    def test_requests_are_coalesced_into_pending_pass(self):
+        pending_pass = self.create_pass()
+
+        for _ in range(3):
+            self.assertIsNone(request_fulfillment_pass())
+        self.assertIsNone(request_fulfillment_pass(shard='colo'))
+        self.assertEqual(
+            list(Task.objects.filter(task=FulfillOpenOrdersTask.name)),
+            [pending_pass])
+
+    def test_shard_competitors(self):
+        colo_pass = self.create_pass(shard='colo')
+        hq_pass = self.create_pass(shard='hq')
+        all_shards_pass = self.create_pass()
+        item_task = Task.objects.create(
+            task=FulfillOpenOrdersForItemTask.name, args=[],
+            kwargs={'item_sid': 'item'})
+        warm_pools_task = Task.objects.create(
+            task=ReplenishWarmPoolsTask.name, args=[], kwargs={})
+
+        self.assertEqual(
+            set(find_fulfillment_competitors(Task.objects.all(), 'colo')),
+            set([colo_pass, all_shards_pass, item_task, warm_pools_task]))
+        self.assertEqual(
+            set(find_fulfillment_competitors(Task.objects.all())),
+            set([colo_pass, hq_pass, all_shards_pass, item_task,
+                 warm_pools_task]))
+
+
+class ItemTaskCompetitorsTestCase(TestCase):
+    def create_task(self, task_class, item_sids):
+        task = Task.objects.create(task=task_class.name,
+                                   args=[item_sids],
+                                   kwargs={})
+        task.create_links()
+        return task
+
+    def get_competitors(self, task_class, item_sids):
+        task = get_task_class(task_class.name)(None, [item_sids], {})
+        return set(task.find_competitors_of_task(Task.objects.all()))
+
+    def test_item_tasks_compete_by_links(self):
+        single_item_task = self.create_task(HandleItemCleanupTask, 'a')
+        items_task = self.create_task(HandleItemsCleanupTask, ['a', 'b'])
+        other_items_task = self.create_task(HandleItemsCleanupTask, ['c'])
+
+        self.assertEqual(
+            self.get_competitors(HandleItemsCleanupTask, ['a', 'b']),
+            set([single_item_task, items_task]))
+        self.assertEqual(
+            self.get_competitors(HandleItemCleanupTask, 'a'),
+            set([single_item_task, items_task]))
+        self.assertEqual(
+            self.get_competitors(HandleItemsCleanupTask, ['b', 'c']),
+            set([items_task, other_items_task]))
+
+
+class WarmPoolCreatorsTestCase(TestCase):
+    def create_creator(self, **kwargs):
+        creator = Task.objects.create(
+            task=CreateBasicItemTask.name,
+            args=[],
+            kwargs=dict(ingredients={}, requirements={}, **kwargs))
+        creator.create_links()
+        return creator
+
+    def test_creators_are_linked_to_their_pool(self):
+        pool_creator = self.create_creator(warm_pool='basic_d')
+        self.create_creator()
+        self.create_creator(warm_pool='basic_a')
+
+        self.assertEqual(
+            [(link.name, link.sid) for link in pool_creator.links.all()],
+            [('warm_pool', 'basic_d')])
+        self.assertEqual(get_num_pending_warm_pool_creators('basic_d'), 1)
+
+        pool_creator.task_result.status = states.SUCCESS
+        pool_creator.task_result.save()
+        self.assertEqual(get_num_pending_warm_pool_creators('basic_d'), 0)
@@ -0,0 +1,126 @@
+"""Test Bodega views."""
+
+from bodega_core.models import (
+    ItemFulfillment, Location, Network, Order, OrderUpdate)
+from bodega_legacy_items.models import RktestYml
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+ITEMS_DELTA = """
+pod1:
+  type: rktest_yml
+  requirements: {}
+pod2:
+  type: rktest_yml
+  requirements: {}
+"""
+
+
+class OrderListTests(APITestCase):
+
+    def setUp(self):
+        self.location = Location.objects.get(name='HQ')
+        self.network = Network.objects.get(location=self.location)
+        self.user = User.objects.create_user(
+            username='Foo',
+            password='Bar',
+            email='john.doe@rubrik.com')
+        self.tab = self.user.tabs.get()
+        self.client.login(username='Foo', password='Bar')
+
+    def create_fulfilled_order(self, index):
+        order = Order.objects.create(
+            status=Order.STATUS_FULFILLED,
+            owner=self.user,
+            tab=self.tab)
+        # Like orders placed through the API, start with the items so they
+        # are materialized on the order.
+        OrderUpdate.objects.create(
+            order=order,
+            creator=self.user,
+            items_delta=ITEMS_DELTA)
+        order_update = OrderUpdate.objects.create(
+            order=order,
+            creator=self.user,
+            new_status=Order.STATUS_FULFILLED)
+        for nickname in ['pod1', 'pod2']:
+            item = RktestYml.objects.create(
+                filename='%s-%d.yml' % (nickname, index),
+                location=self.location,
+                network=self.network,
+                held_by=order)
+            ItemFulfillment.objects.create(
+                order_update=order_update,
+                nickname=nickname,
+                item=item)
+        OrderUpdate.objects.create(
+            order=order,
+            creator=self.user,
+            time_limit_notice=True)
+        return order
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/orders/', {'page_size': 50})
+        self.assertEquals(response.status_code, 200)
+        return (len(context.captured_queries), response.data['results'])
+
+    def test_list_queries_do_not_grow_with_orders(self):
+        order = self.create_fulfilled_order(0)
+        (num_queries, results) = self.count_list_queries()
+        self.assertEquals(len(results), 1)
+        self.assertEquals(sorted(results[0]['fulfilled_items'].keys()),
+                          ['pod1', 'pod2'])
+        self.assertEquals(results[0]['time_last_updated'],
+                          order.latest_update.time_created.isoformat()
+                          .replace('+00:00', 'Z'))
+
+        for index in range(1, 5):
+            self.create_fulfilled_order(index)
+        (num_more_queries, results) = self.count_list_queries()
+        self.assertEquals(len(results), 5)
+        self.assertEquals(num_more_queries, num_queries)
+
+
+class ItemListTests(APITestCase):
+
+    def setUp(self):
+        self.location = Location.objects.get(name='HQ')
+        self.network = Network.objects.get(location=self.location)
+        self.user = User.objects.create_user(
+            username='Foo',
+            password='Bar',
+            email='john.doe@rubrik.com')
+        self.tab = self.user.tabs.get()
+        self.client.login(username='Foo', password='Bar')
+
+    def create_held_item(self, index):
+        order = Order.objects.create(
+            status=Order.STATUS_FULFILLED,
+            owner=self.user,
+            tab=self.tab)
+        return RktestYml.objects.create(
+            filename='pod-%d.yml' % index,
+            location=self.location,
+            network=self.network,
+            held_by=order)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/items/')
+        self.assertEquals(response.status_code, 200)
+        return (len(context.captured_queries), response.data['results'])
+
+    def test_list_queries_do_not_grow_with_items(self):
+        item = self.create_held_item(0)
+        (num_queries, results) = self.count_list_queries()
+        self.assertEquals([result['sid'] for result in results], [item.sid])
+        self.assertIn('/rktest_ymls/', results[0]['specific_item'])
+
+        for index in range(1, 5):
+            self.create_held_item(index)
+        (num_more_queries, results) = self.count_list_queries()
+        self.assertEquals(len(results), 5)
+        self.assertEquals(num_more_queries, num_queries)
@@ -7,6 +7,7 @@ import rkelery.filters
 
 from bodega_core.pagination import SmallResultsSetPagination
 from django.contrib.auth.models import User
+from django.db.models import Prefetch
 from rest_framework import mixins, viewsets
 from sid_from_id.views import SidFromIdGenericViewSet
 from . import serializers
@@ -27,7 +28,10 @@ class ItemViewSet(mixins.ListModelMixin,
     queryset = bodega_core.models.Item.objects.all()
 
     def get_queryset(self):
-        return item_tools.get_generic_queryset_for_all_item_types()
+        # Prefetch the holders shown by each item so a page of items takes a
+        # constant number of queries.
+        return item_tools.get_generic_queryset_for_all_item_types() \
+            .order_by('id').prefetch_related('held_by_object')
 
 
 class JenkinsTaskViewSet(mixins.ListModelMixin,
@@ -60,6 +64,28 @@ class OrderViewSet(mixins.CreateModelMixin,
         else:
             return self.detail_serializer_class
 
+    def get_queryset(self):
+        queryset = super(OrderViewSet, self).get_queryset()
+        if self.action != 'list':
+            return queryset
+
+        # Load everything the list serializer shows for a page of orders in
+        # a constant number of queries, rather than a few for every order.
+        fulfilled_items = item_tools.select_specific_items(
+            bodega_core.models.Item.objects.all()).prefetch_related(
+                'held_by_object')
+        item_fulfillments = bodega_core.models.ItemFulfillment.objects \
+            .prefetch_related(Prefetch('item', queryset=fulfilled_items))
+        fulfilling_updates = bodega_core.models.OrderUpdate.objects.filter(
+            id__in=bodega_core.models.ItemFulfillment.objects.values(
+                'order_update_id')).prefetch_related(
+                    Prefetch('item_fulfillments',
+                             queryset=item_fulfillments))
+        return queryset.select_related('owner', 'tab__owner') \
+            .prefetch_related(Prefetch('updates',
+                                       queryset=fulfilling_updates,
+                                       to_attr='fulfilling_updates'))
+
 
 class OrderUpdateViewSet(mixins.CreateModelMixin,
                          mixins.ListModelMixin,
@@ -68,7 +94,7 @@ class OrderUpdateViewSet(mixins.CreateModelMixin,
     """A viewset for updating orders."""
 
     queryset = bodega_core.models.OrderUpdate.objects.all().order_by(
-        '-time_created')
+        '-time_created', '-sequence')
     serializer_class = serializers.OrderUpdateSerializer
     filter_class = bodega_core.filters.OrderUpdateFilter
 
@@ -1,14 +1,46 @@
 """Tasks for Bodega AWS."""
 import logging
+from collections import defaultdict
+from bodega_core.exceptions import bodega_error
 from bodega_core.models import Item
-from bodega_core.tasks import SingleItemTask
+from bodega_core.tasks import MultipleItemsTask, SingleItemTask
 from botocore.exceptions import ClientError
-from rkelery import register_task
+from rkelery import Group, register_task
+from sid_from_id.encoder import SidEncoder
 from .models import Ec2Instance
-from .utils import delete_ec2_instance
+from .utils import delete_ec2_instance, delete_ec2_instances
 
 log = logging.getLogger(__name__)
 
+# Instances of a farm are destroyed by tasks of up to this many instances.
+EC2_INSTANCES_BATCH_SIZE = 50
+
+
+def _is_instance_not_found(client_error):
+    return client_error.response['Error']['Code'] == \
+        'InvalidInstanceID.NotFound'
+
+
+def _delete_ec2_instance(ec2_instance):
+    try:
+        delete_ec2_instance(ec2_instance)
+    except ClientError as e:
+        if _is_instance_not_found(e):
+            log.warning('Attempted to delete %s which no longer exists '
+                        'in AWS. Marking this item as DESTROYED.'
+                        % ec2_instance,
+                        exc_info=True)
+            ec2_instance.state = Item.STATE_DESTROYED
+            ec2_instance.save()
+        else:
+            # We were not able to clean up the Ec2Instance on AWS and
+            # cannot be sure that it no longer exists. Throw an error
+            # and do not change the state of the Ec2Instance so that
+            # we attempt clean up on it again.
+            log.error('Failed to delete ec2 instance (%s).'
+                      % ec2_instance.instance_id)
+            raise
+
 
 @register_task
 class DestroyEc2InstanceTask(SingleItemTask):
@@ -26,21 +58,103 @@ class DestroyEc2InstanceTask(SingleItemTask):
                         % Item.STATE_DESTROYED)
             return
 
+        _delete_ec2_instance(ec2_instance)
+
+
+@register_task
+class DestroyEc2InstancesTask(MultipleItemsTask):
+
+    @classmethod
+    def get_summary(cls, item_sids):
+        return ('Destroy Ec2Instances with sids of %s'
+                % ', '.join(str(item_sid) for item_sid in item_sids))
+
+    def run(self, item_sids):
+        encoder = SidEncoder(Ec2Instance)
+        ec2_instances = Ec2Instance.objects.filter(
+            id__in=[encoder.decode(item_sid) for item_sid in item_sids]) \
+            .exclude(state=Item.STATE_DESTROYED).select_related('farm')
+        ec2_instances_by_farm = defaultdict(list)
+        for ec2_instance in ec2_instances:
+            ec2_instances_by_farm[ec2_instance.farm_id].append(ec2_instance)
+
+        failed_ec2_instances = []
+        for farm_ec2_instances in ec2_instances_by_farm.values():
+            try:
+                delete_ec2_instances(farm_ec2_instances)
+                continue
+            except Exception:
+                # Terminating instances fails altogether if any of them
+                # can't be terminated, such as one which no longer exists or
+                # is protected from termination, so find out which one by
+                # deleting them one at a time.
+                log.warning('Could not delete %s together. Deleting them one '
+                            'at a time.' % farm_ec2_instances, exc_info=True)
+
+            for ec2_instance in farm_ec2_instances:
+                try:
+                    _delete_ec2_instance(ec2_instance)
+                except Exception:
+                    log.warning('Caught Exception while deleting %s. Moving '
+                                'on to the other instances.' % ec2_instance,
+                                exc_info=True)
+                    failed_ec2_instances.append(ec2_instance)
+
+        if failed_ec2_instances:
+            # Leave the state of these instances alone so cleanup attempts
+            # them again, but fail the task so the failures are noticed.
+            bodega_error(log, 'Failed to delete %d of %d Ec2Instances: %s'
+                         % (len(failed_ec2_instances), len(ec2_instances),
+                            failed_ec2_instances))
+
+
+def get_ec2_instances_destroyers(ec2_instances):
+    """Return the tasks destroying Ec2Instances in batches per farm."""
+    item_sids_by_farm = defaultdict(list)
+    for ec2_instance in ec2_instances:
+        item_sids_by_farm[ec2_instance.farm_id].append(ec2_instance.sid)
+
+    destroyers = []
+    for farm_id, item_sids in sorted(item_sids_by_farm.items()):
+        for start in range(0, len(item_sids), EC2_INSTANCES_BATCH_SIZE):
+            destroyers.append(DestroyEc2InstancesTask.si(
+                item_sids[start:start + EC2_INSTANCES_BATCH_SIZE]))
+    return destroyers
+
+
+def get_ec2_ingredient_to_destroy(item):
+    """Return the Ec2Instance an item is made from, unless it's destroyed."""
+    ingredient = item._ingredient
+    if isinstance(ingredient, Ec2Instance) and \
+            ingredient.state != Item.STATE_DESTROYED:
+        return ingredient
+    return None
+
+
+def handle_ec2_ingredients_cleanup(items, handle_cleanup):
+    """Handle cleanup of items by destroying their Ec2Instances in batches.
+
+    The Ec2Instances the items are made from are destroyed by one task per
+    farm rather than one per item. Items which aren't made from an
+    Ec2Instance left to destroy are handled by handle_cleanup(item).
+    """
+    ec2_instances = []
+    for item in items:
         try:
-            delete_ec2_instance(ec2_instance)
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'InvalidInstanceID.NotFound':
-                log.warning('Attempted to delete %s which no longer exists '
-                            'in AWS. Marking this item as DESTROYED.'
-                            % ec2_instance,
-                            exc_info=True)
-                ec2_instance.state = Item.STATE_DESTROYED
-                ec2_instance.save()
-            else:
-                # We were not able to clean up the Ec2Instance on AWS and
-                # cannot be sure that it no longer exists. Throw an error
-                # and do not change the state of the Ec2Instance so that
-                # we attempt clean up on it again.
-                log.error('Failed to delete ec2 instance (%s).'
-                          % ec2_instance.instance_id)
-                raise
+            ec2_instance = get_ec2_ingredient_to_destroy(item)
+            if ec2_instance is None:
+                handle_cleanup(item)
+                continue
+        except Exception:
+            log.warning('Caught Exception while handling cleanup of %s. '
+                        'Moving on to the other items.' % item,
+                        exc_info=True)
+            continue
+
+        log.debug('%s has an Ec2Instance ingredient %s to destroy.'
+                  % (item, ec2_instance))
+        ec2_instances.append(ec2_instance)
+
+    destroyers = get_ec2_instances_destroyers(ec2_instances)
+    if destroyers:
+        Group(destroyers).delay()
@@ -0,0 +1,116 @@
+"""Test destroying Ec2Instances."""
+from unittest import mock
+
+from bodega_core.exceptions import BodegaException
+from bodega_core.models import Item
+from botocore.exceptions import ClientError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rkelery import get_task_class
+from .models import AwsFarm, Ec2Instance
+from .tasks import DestroyEc2InstancesTask
+
+NOT_FOUND_INSTANCE_ID = 'i-notfound'
+PROTECTED_INSTANCE_ID = 'i-protected'
+
+
+def _client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}},
+                       'TerminateInstances')
+
+
+def _terminate_instances(InstanceIds):
+    # Like AWS, fail the whole call if any of the instances can't be
+    # terminated.
+    if PROTECTED_INSTANCE_ID in InstanceIds:
+        raise _client_error('OperationNotPermitted')
+    if NOT_FOUND_INSTANCE_ID in InstanceIds:
+        raise _client_error('InvalidInstanceID.NotFound')
+
+
+class DestroyEc2InstancesTestCase(TestCase):
+    def setUp(self):
+        self.farm = AwsFarm.objects.create(
+            region_name='us-west-1',
+            aws_access_key_id='access_key_id',
+            aws_secret_access_key='secret_access_key',
+            subnet_id='subnet-1',
+            security_group_id='sg-1')
+
+        patcher = mock.patch('bodega_aws.utils._get_ec2_client_for_farm')
+        self.addCleanup(patcher.stop)
+        self.ec2_client = patcher.start().return_value
+        self.ec2_client.terminate_instances.side_effect = _terminate_instances
+        self.waiter = self.ec2_client.get_waiter.return_value
+
+    def create_ec2_instance(self, instance_id):
+        return Ec2Instance.objects.create(
+            _name=instance_id,
+            instance_id=instance_id,
+            ami_id='ami-1',
+            instance_type='m4.large',
+            farm=self.farm)
+
+    def destroy_ec2_instances(self, ec2_instances):
+        item_sids = [ec2_instance.sid for ec2_instance in ec2_instances]
+        task_class = get_task_class(DestroyEc2InstancesTask.name)
+        task = task_class(None, [item_sids], {})
+        task.run(item_sids)
+
+    def get_terminated_instance_ids(self):
+        return [sorted(call[1]['InstanceIds']) for call
+                in self.ec2_client.terminate_instances.call_args_list]
+
+    def assertStates(self, ec2_instances, state):
+        for ec2_instance in ec2_instances:
+            ec2_instance.refresh_from_db()
+            self.assertEqual(state, ec2_instance.state)
+
+    def test_instances_are_destroyed_together(self):
+        instance_ids = ['i-1', 'i-2', 'i-3']
+        ec2_instances = [self.create_ec2_instance(instance_id)
+                         for instance_id in instance_ids]
+
+        with CaptureQueriesContext(connection) as context:
+            self.destroy_ec2_instances(ec2_instances)
+
+        self.assertEqual([instance_ids], self.get_terminated_instance_ids())
+        self.ec2_client.get_waiter.assert_called_once_with(
+            'instance_terminated')
+        self.assertEqual(1, self.waiter.wait.call_count)
+        self.assertEqual(instance_ids,
+                         sorted(self.waiter.wait.call_args[1]['InstanceIds']))
+        self.assertStates(ec2_instances, Item.STATE_DESTROYED)
+
+        # The states are all updated in a single transaction, which is a
+        # savepoint within the transaction of the test case.
+        savepoints = [query for query in context.captured_queries
+                      if query['sql'].startswith('SAVEPOINT')]
+        self.assertEqual(1, len(savepoints))
+
+    def test_not_found_instance_falls_back_to_one_at_a_time(self):
+        instance_ids = ['i-1', NOT_FOUND_INSTANCE_ID, 'i-3']
+        ec2_instances = [self.create_ec2_instance(instance_id)
+                         for instance_id in instance_ids]
+
+        self.destroy_ec2_instances(ec2_instances)
+
+        self.assertEqual(
+            [sorted(instance_ids)] +
+            [[instance_id] for instance_id in instance_ids],
+            self.get_terminated_instance_ids())
+        self.assertStates(ec2_instances, Item.STATE_DESTROYED)
+
+    def test_failed_instance_doesnt_stop_the_others(self):
+        ec2_instances = [self.create_ec2_instance(instance_id)
+                         for instance_id in ['i-1', 'i-2']]
+        protected_ec2_instance = \
+            self.create_ec2_instance(PROTECTED_INSTANCE_ID)
+
+        with self.assertRaises(BodegaException):
+            self.destroy_ec2_instances(
+                ec2_instances + [protected_ec2_instance])
+
+        self.assertStates(ec2_instances, Item.STATE_DESTROYED)
+        self.assertStates([protected_ec2_instance], Item.STATE_ACTIVE)
@@ -8,6 +8,7 @@ from bodega_core.models import Item, Network
 from botocore.config import Config
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from memoize import memoize
 from .models import AwsFarm
 
@@ -90,31 +91,50 @@ def get_ec2_instance_private_ip(ec2_instance):
     return aws_ec2_instance['PrivateIpAddress']
 
 
-def delete_ec2_instance(ec2_instance):
-    ec2_client = _get_ec2_client_for_farm(ec2_instance.farm)
+def delete_ec2_instances(ec2_instances):
+    """Terminate Ec2Instances of the same farm and mark them as DESTROYED.
 
-    if not ec2_instance.instance_id:
-        log.warning('%s did not have an associated instance_id. We may be '
-                    'leaking Ec2Instances on AWS.' % ec2_instance)
-        # Cannot retroactively assign this Ec2Instance to the correct
-        # instance it represents in AWS so just mark it as DESTROYED
-        ec2_instance.state = Item.STATE_DESTROYED
-        ec2_instance.save()
+    All the instances are terminated with a single call and waited on
+    together, then marked as DESTROYED in a single transaction.
+    """
+    if not ec2_instances:
         return
 
-    ec2_client.terminate_instances(
-        InstanceIds=[
-            ec2_instance.instance_id
-        ]
-    )
-    log.info('Waiting for ec2 instance with id of %s to terminate.'
-             % ec2_instance.instance_id)
-    waiter = ec2_client.get_waiter('instance_terminated')
-    waiter.wait(InstanceIds=[ec2_instance.instance_id])
-    log.info('ec2 instance %s successfully terminated.'
-             % ec2_instance.instance_id)
-    ec2_instance.state = Item.STATE_DESTROYED
-    ec2_instance.save()
+    farm = ec2_instances[0].farm
+    if any(ec2_instance.farm_id != farm.id
+           for ec2_instance in ec2_instances):
+        bodega_value_error(
+            log,
+            'Cannot delete Ec2Instances of different farms together: %s'
+            % ec2_instances)
+
+    instance_ids = []
+    for ec2_instance in ec2_instances:
+        if not ec2_instance.instance_id:
+            log.warning('%s did not have an associated instance_id. We may '
+                        'be leaking Ec2Instances on AWS.' % ec2_instance)
+            # Cannot retroactively assign this Ec2Instance to the correct
+            # instance it represents in AWS so just mark it as DESTROYED
+        else:
+            instance_ids.append(ec2_instance.instance_id)
+
+    if instance_ids:
+        ec2_client = _get_ec2_client_for_farm(farm)
+        ec2_client.terminate_instances(InstanceIds=instance_ids)
+        log.info('Waiting for ec2 instances with ids of %s to terminate.'
+                 % instance_ids)
+        waiter = ec2_client.get_waiter('instance_terminated')
+        waiter.wait(InstanceIds=instance_ids)
+        log.info('ec2 instances %s successfully terminated.' % instance_ids)
+
+    with transaction.atomic():
+        for ec2_instance in ec2_instances:
+            ec2_instance.state = Item.STATE_DESTROYED
+            ec2_instance.save()
+
+
+def delete_ec2_instance(ec2_instance):
+    delete_ec2_instances([ec2_instance])
 
 
 def create_ec2_instance_on_aws(ec2_instance,
@@ -9,6 +9,9 @@ PY_ROOT = os.path.join(SDMAIN_ROOT, 'src', 'py')  # noqa
 sys.path.append(PY_ROOT)  # noqa
 import cdm_tivan  # noqa
 
+from bodega_aws.tasks import (get_ec2_ingredient_to_destroy,
+                              get_ec2_instances_destroyers,
+                              handle_ec2_ingredients_cleanup)
 from bodega_core import ItemManager
 from bodega_core.exceptions import bodega_validation_error
 from bodega_core.models import Item
@@ -83,6 +86,9 @@ class CdmNodeManager(ItemManager):
             cdm_node.state = Item.STATE_DESTROYED
             cdm_node.save()
 
+    def handle_items_cleanup(self, cdm_nodes):
+        handle_ec2_ingredients_cleanup(cdm_nodes, self.handle_cleanup)
+
     def taste_test(self, cdm_node, requirements):
         return True
 
@@ -173,6 +179,34 @@ class CdmClusterManager(ItemManager):
             cdm_cluster.state = Item.STATE_DESTROYED
             cdm_cluster.save()
 
+    def handle_items_cleanup(self, cdm_clusters):
+        """Destroy the Ec2Instances of the nodes of all clusters in batches.
+
+        Clusters with any node which isn't made from an Ec2Instance left to
+        destroy are handled on their own.
+        """
+        ec2_instances = []
+        for cdm_cluster in cdm_clusters:
+            try:
+                node_ec2_instances = [get_ec2_ingredient_to_destroy(node)
+                                      for node in cdm_cluster.nodes]
+                if not node_ec2_instances or None in node_ec2_instances:
+                    self.handle_cleanup(cdm_cluster)
+                    continue
+            except Exception:
+                log.warning('Caught Exception while handling cleanup of %s. '
+                            'Moving on to the other clusters.' % cdm_cluster,
+                            exc_info=True)
+                continue
+
+            log.debug('Destroying the Ec2Instances of the nodes of %s: %s'
+                      % (cdm_cluster, node_ec2_instances))
+            ec2_instances += node_ec2_instances
+
+        destroyers = get_ec2_instances_destroyers(ec2_instances)
+        if destroyers:
+            Group(destroyers).delay()
+
     def taste_test(self, cdm_cluster, requirements):
         return True
 
@@ -8,8 +8,8 @@ from bodega_aws.utils import (create_ec2_instance_on_aws,
                               get_ec2_instance_type_for_model,
                               get_or_create_aws_network)
 from bodega_core.models import Location, Network
-from bodega_core.tasks import ThrottledTask
-from rkelery import register_task, Task
+from bodega_core.tasks import ItemCreatorTask, ThrottledTask
+from rkelery import register_task
 from .models import CdmCluster, CdmNode
 from .utils import (bootstrap_cdm_cluster,
                     get_ami_id_for_code_version,
@@ -21,7 +21,7 @@ log = logging.getLogger(__name__)
 
 
 @register_task
-class CreateCdmNodeFromAwsTask(ThrottledTask):
+class CreateCdmNodeFromAwsTask(ItemCreatorTask, ThrottledTask):
     """Create a CdmNode in AWS with the given requirements."""
 
     @classmethod
@@ -127,7 +127,7 @@ class CreateCdmNodeFromAwsTask(ThrottledTask):
 
 
 @register_task
-class CreateCdmClusterFromAwsTask(Task):
+class CreateCdmClusterFromAwsTask(ItemCreatorTask):
     """Create a CdmCluster in AWS with the given requirements."""
 
     @classmethod
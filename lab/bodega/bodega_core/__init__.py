@@ -76,6 +76,23 @@ class ItemManager(object):
         raise NotImplementedError(
             "Child classes need to implement handle_cleanup.")
 
+    def handle_items_cleanup(self, items):
+        """Handle cleanup of several items of this manager's item type.
+
+        Item managers which can clean up items in bulk, such as by destroying
+        their cloud instances with a single call, should override this. The
+        default implementation handles each item on its own. Implementations
+        should keep going when an item fails so the rest of its batch still
+        gets cleaned up.
+        """
+        for item in items:
+            try:
+                self.handle_cleanup(item)
+            except Exception:
+                log.warning('Caught Exception while handling cleanup of %s. '
+                            'Moving on to the other items.' % item,
+                            exc_info=True)
+
     def get_shelf_life(self, item):
         """Return the shelf life of the item.
 
@@ -83,6 +100,10 @@ class ItemManager(object):
         clean up an Item if it is created but never used. The default timedelta
         means the Item never perishes and we should not clean it up until it is
         used.
+
+        Cleanup also calls this with item=None to find the Items of this type
+        which may have perished, so the shelf life of the item type should be
+        no longer than that of any of its Items.
         """
         raise NotImplementedError(
             "Child classes need to implement get_shelf_life.")
@@ -101,6 +122,14 @@ class ItemManager(object):
         """
         return False
 
+    def get_managed_items_queryset(self, item_queryset):
+        """Return the items of item_queryset this manager may be managing.
+
+        Cleanup only asks is_managing about these items. Item managers which
+        override is_managing should override this to match.
+        """
+        return item_queryset.none()
+
     def validate_item_requirements(self, item_requirements, user_sid,
                                    is_maintenance_order):
         """Check if the given item requirements are valid for this Item."""
@@ -0,0 +1,130 @@
+"""Match open orders to items together instead of one order at a time."""
+import logging
+import random
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class OrderAssignmentSolver(object):
+    """Solve a bipartite matching between order nicknames and items.
+
+    Orders must be added in priority order. Each order is matched all or
+    nothing: either every one of its nicknames gets a distinct item, or the
+    order is left out and the matching is restored to what it was before the
+    order was added. Adding an order may move the nicknames of orders which
+    were added earlier to different eligible items, but never unmatches them,
+    so a later order can only be matched if every earlier matched order stays
+    matched. This fixes the case of greedy selection where an early order
+    takes the only item satisfying a later, more constrained order while an
+    interchangeable item was free.
+
+    Like process_open_order, an order is first matched with non-rare items
+    only and falls back to all eligible items. The nicknames of an order
+    matched with non-rare items are only ever moved to other non-rare items.
+
+    Only items held by nothing are matched, since those are the only items
+    which an order fulfiller can use right away.
+    """
+
+    def __init__(self, inventory, excluded_items_ids):
+        """Create a solver drawing items from an InventorySnapshot."""
+        self.inventory = inventory
+        self.excluded_items_ids = set(excluded_items_ids)
+        self._items = {}
+        self._slot_edges = {}
+        self._slot_items_ids = {}
+        self._item_slots = {}
+        self._orders_items = {}
+
+    def _get_edges(self, order_item, ignore_rare):
+        candidate_items = self.inventory.get_candidate_items(
+            order_item,
+            self.excluded_items_ids,
+            held_by_any=False,
+            requires_maintenance_items=False,
+            ignore_rare=ignore_rare)
+
+        edges = []
+        for item in candidate_items:
+            if item.held_by_object_id is None:
+                self._items[item.id] = item
+                edges.append(item.id)
+
+        # Spread usage across interchangeable items like greedy selection.
+        random.shuffle(edges)
+        return edges
+
+    def _augment(self, slot):
+        """Find an item for slot, moving other slots along the way.
+
+        This is a breadth-first search for an augmenting path in the
+        matching. Returns whether the slot could be matched.
+        """
+        parent_slots = {}
+        visited_slots = set([slot])
+        queue = deque([slot])
+        while queue:
+            current_slot = queue.popleft()
+            for item_id in self._slot_edges[current_slot]:
+                if item_id in parent_slots:
+                    continue
+                parent_slots[item_id] = current_slot
+
+                matched_slot = self._item_slots.get(item_id, None)
+                if matched_slot is None:
+                    self._flip_path(item_id, parent_slots)
+                    return True
+
+                if matched_slot not in visited_slots:
+                    visited_slots.add(matched_slot)
+                    queue.append(matched_slot)
+
+        return False
+
+    def _flip_path(self, item_id, parent_slots):
+        while item_id is not None:
+            slot = parent_slots[item_id]
+            previous_item_id = self._slot_items_ids.get(slot, None)
+            self._slot_items_ids[slot] = item_id
+            self._item_slots[item_id] = slot
+            item_id = previous_item_id
+
+    def add_order(self, order_sid, order_items):
+        """Try to match every nickname of an order.
+
+        Returns whether the order was matched.
+        """
+        slots = [(order_sid, nickname) for nickname in sorted(order_items)]
+        saved_slot_items_ids = dict(self._slot_items_ids)
+        saved_item_slots = dict(self._item_slots)
+
+        for ignore_rare in [True, False]:
+            for (_, nickname) in slots:
+                self._slot_edges[(order_sid, nickname)] = self._get_edges(
+                    order_items[nickname], ignore_rare)
+
+            if all(self._augment(slot) for slot in slots):
+                self._orders_items[order_sid] = order_items
+                log.debug('Matched all item requests of %s with '
+                          'ignore_rare=%s.' % (order_sid, ignore_rare))
+                return True
+
+            self._slot_items_ids = dict(saved_slot_items_ids)
+            self._item_slots = dict(saved_item_slots)
+
+        for slot in slots:
+            del self._slot_edges[slot]
+        log.debug('Could not match all item requests of %s.' % order_sid)
+        return False
+
+    def get_assignments(self):
+        """Return a dictionary of selected items for each matched order."""
+        assignments = {}
+        for order_sid, order_items in self._orders_items.items():
+            assignments[order_sid] = {
+                nickname:
+                    self._items[self._slot_items_ids[(order_sid, nickname)]]
+                for nickname in order_items
+            }
+        return assignments
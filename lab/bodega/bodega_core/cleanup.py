@@ -1,39 +1,136 @@
-"""Manages cleanup of all items in Bodega."""
+"""Manages cleanup of all items in Bodega.
+
+Most items are neither held by something in a final state nor past their
+shelf life, so a cleanup scan starts from the few items which are instead of
+looking at every item. Items held by something in a final state are found
+with one query per kind of holder, and items which may be past their shelf
+life with one query per item type. Only those items are then checked one by
+one, and the ones which need cleanup are cleaned up in batches of the same
+item type.
+"""
 
 import logging
+from collections import defaultdict
 from datetime import datetime
 from pytz import utc
 
+from django.contrib.contenttypes.models import ContentType
 from rkelery import states
 from rkelery.models import Task
 from .models import Item, Order
+from .utils import get_remote_field_name
 
 log = logging.getLogger(__name__)
 
+# Cleaning up many items with a single task saves workers and API calls, but
+# a batch is only as fast as its slowest item.
+CLEANUP_BATCH_SIZE = 50
+
+
+def _get_item_sid(item_sid):
+    return item_sid
+
 
 class CleanupManager(object):
     def __init__(self, item_tools):
         self.item_tools = item_tools
 
-    def process_items_cleanup(self, create_item_cleaner):
+    def _get_held_items_to_process(self, held_items):
+        """Return the held items which may need cleanup.
+
+        These are the items held by closed orders or ready tasks, along with
+        the items their managers may be managing.
+        """
+        order_content_type = ContentType.objects.get_for_model(Order)
+        task_content_type = ContentType.objects.get_for_model(Task)
+        candidate_querysets = [
+            held_items.filter(
+                held_by_content_type=order_content_type,
+                held_by_object_id__in=Order.objects.filter(
+                    status=Order.STATUS_CLOSED).values('id')),
+            held_items.filter(
+                held_by_content_type=task_content_type,
+                held_by_object_id__in=Task.objects.filter(
+                    task_result__status__in=states.READY_STATES)
+                .values('id'))
+        ]
+        for item_type_name, item_type in \
+                sorted(self.item_tools.item_types.items()):
+            manager = item_type.manager_class()
+            candidate_querysets.append(manager.get_managed_items_queryset(
+                held_items.filter(
+                    specific_type=get_remote_field_name(item_type))))
+
+        candidate_items = {}
+        for candidate_queryset in candidate_querysets:
+            for item in candidate_queryset:
+                candidate_items[item.id] = item
+        return [candidate_items[item_id]
+                for item_id in sorted(candidate_items.keys())]
+
+    def _get_perished_items(self, not_held_items):
+        """Return the items not held for longer than their type's shelf life.
+
+        Each item is still checked against its own shelf life.
+        """
+        curr_time = datetime.now(utc)
+        perished_items = []
+        for item_type_name, item_type in \
+                sorted(self.item_tools.item_types.items()):
+            manager = item_type.manager_class()
+            shelf_life = manager.get_shelf_life(None)
+            if not shelf_life:
+                continue
+
+            perished_items += list(not_held_items.filter(
+                specific_type=get_remote_field_name(item_type),
+                time_held_by_object_updated__lt=curr_time - shelf_life)
+                .order_by('id'))
+        return perished_items
+
+    def process_items_cleanup(self, create_items_cleaner):
+        """Return the cleaners of every item which needs cleanup.
+
+        Items are cleaned up in batches of the same item type, so each
+        cleaner is create_items_cleaner(item_sids) for up to
+        CLEANUP_BATCH_SIZE items.
+        """
         existing_items = Item.objects.exclude(state=Item.STATE_DESTROYED)
         held_items = existing_items.exclude(held_by_object_id=None)
-        cleaners = []
-        for item in held_items:
+        # Items of unknown item types have no manager to clean them up.
+        held_items_to_process = [
+            item for item in self.item_tools.get_specific_items(
+                self._get_held_items_to_process(held_items))
+            if item is not None
+        ]
+        item_sids_by_type = defaultdict(list)
+        for item in held_items_to_process:
             log.debug('Attempting cleanup on %s' % item)
-            cleaner = self.process_item_cleanup(item, create_item_cleaner)
-            if cleaner is not None:
-                cleaners.append(cleaner)
+            item_sid = self.process_item_cleanup(item, _get_item_sid)
+            if item_sid is not None:
+                item_sids_by_type[
+                    self.item_tools.get_item_type_name(item)].append(item_sid)
 
         not_held_items = existing_items.filter(held_by_object_id=None,
                                                state=Item.STATE_ACTIVE)
+        perished_items = self.item_tools.get_specific_items(
+            self._get_perished_items(not_held_items))
 
-        for item in not_held_items:
+        for item in perished_items:
             log.debug('Checking if %s has passed its shelf life.' % item)
-            cleaner = self.process_item_shelf_life(item, create_item_cleaner)
-            if cleaner is not None:
-                cleaners.append(cleaner)
+            item_sid = self.process_item_shelf_life(item, _get_item_sid)
+            if item_sid is not None:
+                item_sids_by_type[
+                    self.item_tools.get_item_type_name(item)].append(item_sid)
 
+        log.debug('Processed %d held items and %d items which may have '
+                  'perished for cleanup.'
+                  % (len(held_items_to_process), len(perished_items)))
+        cleaners = []
+        for item_type_name, item_sids in sorted(item_sids_by_type.items()):
+            for start in range(0, len(item_sids), CLEANUP_BATCH_SIZE):
+                cleaners.append(create_items_cleaner(
+                    item_sids[start:start + CLEANUP_BATCH_SIZE]))
         return cleaners
 
     def process_item_cleanup(self, item, create_item_cleaner):
@@ -160,3 +257,24 @@ class CleanupManager(object):
         log.debug('Handling cleanup for item %s currently held by %s.' %
                   (specific_item, repr(specific_item.held_by)))
         manager.handle_cleanup(specific_item)
+
+    def handle_items_cleanup(self, items):
+        """Handle cleanup of items together with the others of their type."""
+        items_by_type = defaultdict(list)
+        for specific_item in self.item_tools.get_specific_items(items):
+            if specific_item is None:
+                continue
+            log.debug('Handling cleanup for item %s currently held by %s.' %
+                      (specific_item, repr(specific_item.held_by)))
+            items_by_type[self.item_tools.get_item_type_name(
+                specific_item)].append(specific_item)
+
+        for item_type_name, specific_items in sorted(items_by_type.items()):
+            manager = self.item_tools.item_types[item_type_name] \
+                .manager_class()
+            try:
+                manager.handle_items_cleanup(specific_items)
+            except Exception:
+                log.warning('Caught Exception while handling cleanup of %s '
+                            'items. Moving on to the other item types.'
+                            % repr(item_type_name), exc_info=True)
@@ -0,0 +1,111 @@
+"""Check and rebuild the TabDemand totals from scratch."""
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Order, TabDemand
+
+log = logging.getLogger(__name__)
+
+TAB_DEMAND_FIELD_NAMES = ['open_orders_count', 'open_orders_price',
+                          'fulfilled_orders_count', 'fulfilled_orders_price']
+PRICE_TOLERANCE = 1e-6
+
+
+def _price_order(item_tools, order):
+    item_prices = item_tools.get_prices_for_items(order.items.items())
+    return sum(item_prices.values())
+
+
+def compute_tab_demands(item_tools, live_orders):
+    """Compute the demand of each tab by pricing every live order.
+
+    Returns a tuple of a dictionary mapping tab ids to dictionaries of
+    TabDemand field values, and a dictionary mapping the ids of the live
+    orders to their prices.
+    """
+    tab_demands = defaultdict(lambda: dict.fromkeys(TAB_DEMAND_FIELD_NAMES, 0))
+    order_prices = {}
+    for order in live_orders:
+        order_price = _price_order(item_tools, order)
+        order_prices[order.id] = order_price
+        if order.maintenance:
+            continue
+
+        if order.status == Order.STATUS_OPEN:
+            prefix = 'open_orders'
+        else:
+            prefix = 'fulfilled_orders'
+        tab_demand = tab_demands[order.tab_id]
+        tab_demand['%s_count' % prefix] += 1
+        tab_demand['%s_price' % prefix] += order_price
+
+    return dict(tab_demands), order_prices
+
+
+def _get_live_orders():
+    return Order.objects.filter(
+        status__in=[Order.STATUS_OPEN, Order.STATUS_FULFILLED])
+
+
+def find_tab_demand_drift(item_tools):
+    """Compare the TabDemand totals and order prices to computed ones.
+
+    Returns a list of (description, expected, actual) tuples, one for each
+    value which drifted.
+    """
+    live_orders = list(_get_live_orders())
+    expected_tab_demands, order_prices = \
+        compute_tab_demands(item_tools, live_orders)
+    actual_tab_demands = {
+        tab_demand.tab_id: {
+            field_name: getattr(tab_demand, field_name)
+            for field_name in TAB_DEMAND_FIELD_NAMES
+        }
+        for tab_demand in TabDemand.objects.all()
+    }
+    zero_tab_demand = dict.fromkeys(TAB_DEMAND_FIELD_NAMES, 0)
+
+    drift = []
+    for order in live_orders:
+        if order.price is None or \
+                abs(order.price - order_prices[order.id]) > PRICE_TOLERANCE:
+            drift.append(('price of %s' % order,
+                          order_prices[order.id], order.price))
+
+    for tab_id in sorted(set(expected_tab_demands) |
+                         set(actual_tab_demands)):
+        expected = expected_tab_demands.get(tab_id, zero_tab_demand)
+        actual = actual_tab_demands.get(tab_id, zero_tab_demand)
+        for field_name in TAB_DEMAND_FIELD_NAMES:
+            if abs(expected[field_name] - actual[field_name]) > \
+                    PRICE_TOLERANCE:
+                drift.append(('%s of tab %d' % (field_name, tab_id),
+                              expected[field_name], actual[field_name]))
+
+    return drift
+
+
+def rebuild_tab_demands(item_tools):
+    """Re-price every live order and replace all TabDemand totals."""
+    with transaction.atomic():
+        live_orders = list(_get_live_orders().select_for_update())
+        tab_demands, order_prices = \
+            compute_tab_demands(item_tools, live_orders)
+
+        # Queryset updates skip Order.save, which would otherwise apply the
+        # price changes to the totals we're about to replace.
+        for order in live_orders:
+            if order.price != order_prices[order.id]:
+                Order.objects.filter(id=order.id).update(
+                    price=order_prices[order.id])
+
+        TabDemand.objects.all().delete()
+        TabDemand.objects.bulk_create([
+            TabDemand(tab_id=tab_id, **field_values)
+            for tab_id, field_values in tab_demands.items()
+        ])
+
+    log.info('Rebuilt demand of %d tabs from %d live orders.'
+             % (len(tab_demands), len(live_orders)))
@@ -160,10 +160,65 @@ class EjectionManager(object):
                       % str(order))
         self._send_ejection_notices_or_eject(order, curr_time)
 
-    def process_orders_time_limits(self):
-        non_closed_orders = Order.objects.filter(
-            status=Order.STATUS_FULFILLED)
+    def get_next_action_time(self, order, curr_time):
+        """Return when processing the order could next do anything.
+
+        Notices are due whenever the time left crosses a delta of the
+        schedule without a notice since, and ejection is due once the time
+        limit is up and the last notice is old enough. Returns None if
+        nothing is ever due, like for orders without an ejection time.
+        """
+        last_ejection_notice_time = order.last_ejection_notice_time
+        if order.maintenance:
+            if not last_ejection_notice_time:
+                return curr_time
+            return last_ejection_notice_time + \
+                MAINTENANCE_ORDER_NOTICE_INTERVAL
+
+        if order.ejection_time is None:
+            return None
+
+        next_action_time = None
+        for delta in reversed(TIME_LEFT_NOTIFICATION_SCHEDULE):
+            notice_time = order.ejection_time - delta
+            if last_ejection_notice_time is None or \
+                    notice_time > last_ejection_notice_time:
+                next_action_time = notice_time
+                break
+
+        if last_ejection_notice_time is not None:
+            ejection_time = max(
+                order.ejection_time,
+                last_ejection_notice_time + MIN_TIME_DELTA_BEFORE_EJECTION)
+            if next_action_time is None or ejection_time < next_action_time:
+                next_action_time = ejection_time
+        return next_action_time
+
+    def _schedule_next_action(self, order):
+        with transaction.atomic():
+            # Reload the order in case it was updated while it was processed.
+            order = Order.objects.select_for_update().get(id=order.id)
+            order.next_action_time = None
+            if order.status == Order.STATUS_FULFILLED:
+                order.next_action_time = self.get_next_action_time(
+                    order, datetime.now(utc))
+            order.save(update_fields=['next_action_time'])
+        log.debug('Next action for %s is due at %s.'
+                  % (order, order.next_action_time))
 
-        for order in non_closed_orders:
+    def process_orders_time_limits(self):
+        """Process the orders whose next action is due and reschedule them.
+
+        Orders are made due by updates changing their times, and scheduled
+        again after being processed, so this only touches orders which are
+        due rather than every fulfilled order.
+        """
+        due_orders = Order.objects.filter(
+            status=Order.STATUS_FULFILLED,
+            next_action_time__lte=datetime.now(utc)).order_by(
+                'next_action_time')
+
+        for order in due_orders:
             curr_time = datetime.now(utc)
             self.process_order_time_limit(order, curr_time)
+            self._schedule_next_action(order)
@@ -0,0 +1,145 @@
+"""Estimate where open orders are in the queue and when they'll be fulfilled.
+
+Estimates are computed once per fulfillment pass from the order priorities
+of the pass and stored on the orders, so clients can read them from a single
+order instead of paging through every open order.
+"""
+import logging
+import statistics
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+from pytz import utc
+
+from .models import Order, OrderUpdate
+
+log = logging.getLogger(__name__)
+
+# Estimates which moved by less than this aren't worth writing again.
+ESTIMATE_UPDATE_THRESHOLD = timedelta(minutes=1)
+# Each order takes five parameters of an UPDATE, so keep batches well below
+# the 2100 parameters allowed by SQL Server.
+ESTIMATE_UPDATE_BATCH_SIZE = 250
+
+
+class QueueEstimator(object):
+    """Estimate the fulfillment times of open orders from recent history.
+
+    An order can't be fulfilled before the orders ahead of it, which are
+    fulfilled at the recent rate of fulfillments, nor before orders for the
+    same items usually are, which is mostly how long the items take to be
+    cleaned up or created. The estimate is the later of the two, where
+    orders for the same items are those with the same items signature.
+    """
+
+    def __init__(self, history_window):
+        """Create an estimator using fulfillments within history_window."""
+        self.history_window = history_window
+        self._wait_seconds_by_signature = None
+        self._typical_wait_seconds = None
+        self._fulfillment_rate = None
+
+    def _load_history(self, now):
+        fulfillment_updates = OrderUpdate.objects.filter(
+            new_status=Order.STATUS_FULFILLED,
+            time_created__gte=now - self.history_window).values_list(
+                'time_created', 'order__time_created',
+                'order__items_signature')
+        wait_seconds_by_signature = defaultdict(list)
+        all_wait_seconds = []
+        for time_fulfilled, time_created, items_signature in \
+                fulfillment_updates:
+            wait_seconds = (time_fulfilled - time_created).total_seconds()
+            wait_seconds_by_signature[items_signature].append(wait_seconds)
+            all_wait_seconds.append(wait_seconds)
+
+        self._wait_seconds_by_signature = {
+            items_signature: statistics.median(wait_seconds)
+            for items_signature, wait_seconds
+            in wait_seconds_by_signature.items()
+        }
+        self._typical_wait_seconds = None
+        if all_wait_seconds:
+            self._typical_wait_seconds = statistics.median(all_wait_seconds)
+        self._fulfillment_rate = \
+            len(all_wait_seconds) / self.history_window.total_seconds()
+
+    def get_estimated_fulfillment_time(self, order, queue_position, now):
+        """Return when an open order is expected to be fulfilled, if known."""
+        if self._wait_seconds_by_signature is None:
+            self._load_history(now)
+        if not self._fulfillment_rate:
+            return None
+
+        wait_seconds = self._wait_seconds_by_signature.get(
+            order.items_signature, self._typical_wait_seconds)
+        history_time = order.time_created + timedelta(seconds=wait_seconds)
+        queue_time = now + timedelta(
+            seconds=queue_position / self._fulfillment_rate)
+        return max(history_time, queue_time, now)
+
+    def _needs_update(self, order, queue_position, estimated_time):
+        if order.queue_position != queue_position:
+            return True
+        if (order.estimated_fulfillment_time is None) != \
+                (estimated_time is None):
+            return True
+        return estimated_time is not None and \
+            abs(order.estimated_fulfillment_time - estimated_time) >= \
+            ESTIMATE_UPDATE_THRESHOLD
+
+    def _update_estimates(self, orders):
+        """Write the estimates of orders with a single UPDATE.
+
+        Queue positions are distinct per order, so rather than an UPDATE per
+        distinct value like order priorities, each column is set per order
+        with a CASE expression.
+        """
+        queue_position = Case(
+            *[When(id=order.id,
+                   then=Value(order.queue_position,
+                              output_field=models.IntegerField()))
+              for order in orders],
+            output_field=models.IntegerField())
+        estimated_fulfillment_time = Case(
+            *[When(id=order.id,
+                   then=Value(order.estimated_fulfillment_time,
+                              output_field=models.DateTimeField()))
+              for order in orders],
+            output_field=models.DateTimeField())
+        # Only update orders which are still open, like priorities.
+        return Order.objects.filter(
+            id__in=[order.id for order in orders],
+            status=Order.STATUS_OPEN).update(
+                queue_position=queue_position,
+                estimated_fulfillment_time=estimated_fulfillment_time)
+
+    def update_estimates(self, sorted_open_orders):
+        """Store the queue position and estimate of open orders.
+
+        The orders are expected in the order the fulfillment pass processes
+        them. Only estimates which changed noticeably are written.
+        """
+        now = datetime.now(utc)
+        changed_orders = []
+        for queue_position, order in enumerate(sorted_open_orders):
+            estimated_time = self.get_estimated_fulfillment_time(
+                order, queue_position, now)
+            if self._needs_update(order, queue_position, estimated_time):
+                order.queue_position = queue_position
+                order.estimated_fulfillment_time = estimated_time
+                changed_orders.append(order)
+
+        num_updated_orders = 0
+        if changed_orders:
+            with transaction.atomic():
+                for index in range(0, len(changed_orders),
+                                   ESTIMATE_UPDATE_BATCH_SIZE):
+                    num_updated_orders += self._update_estimates(
+                        changed_orders[
+                            index:index + ESTIMATE_UPDATE_BATCH_SIZE])
+        log.debug('Updated the queue estimates of %d of %d open orders.'
+                  % (num_updated_orders, len(sorted_open_orders)))
+        return num_updated_orders
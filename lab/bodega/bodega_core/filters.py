@@ -89,7 +89,7 @@ class ItemFilter(SidFromIdFilterSet):
 
     class Meta:
         model = models.Item
-        fields = ['sid', 'state']
+        fields = ['sid', 'specific_type', 'state']
 
 
 class OrderFilter(SidFromIdFilterSet):
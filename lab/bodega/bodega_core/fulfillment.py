@@ -4,26 +4,53 @@ import logging
 import random
 import statistics
 import time
-from collections import Counter
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from datetime import datetime, timedelta
 from math import floor
 from bodega_core.exceptions import bodega_value_error
 from django.conf import settings
-from django.db import transaction
-from instrumentation.utils import instrumentation_context
+from django.db import connections, transaction
+from django.db.models import Q
+from instrumentation.utils import (increment_counter,
+                                   instrumentation_context,
+                                   record_timing)
 from pytz import utc
 from sid_from_id.encoder import get_sid
 
-from .models import Item, ItemFulfillment, Order, OrderUpdate
+from .assignment import OrderAssignmentSolver
+from .estimation import QueueEstimator
+from .inventory import InventorySnapshot
+from .planning import RecipePlanner
+from .models import Item, ItemFulfillment, Order, OrderUpdate, TabDemand
+from .profiling import PassProfiler
+from .requirements import (get_requirements_signature,
+                           load_order_items_json)
+from .sharding import get_fulfillment_shards
 
 log = logging.getLogger(__name__)
 MAX_RECURSION_LIMIT = 10
+# Keep each UPDATE well below the 2100 parameters allowed by SQL Server.
+PRIORITY_UPDATE_BATCH_SIZE = 500
+# Same for orders looked up by id.
+ORDERS_IDS_BATCH_SIZE = 1000
+
+# Items signature of open orders -> requirements signature -> order item, of
+# the distinct items requested by orders with that items signature.
+_order_items_by_items_signature = {}
 
 
 class FulfillmentManager(object):
-    def __init__(self, item_tools):
-        """Initialize FulfillmentManager."""
+    def __init__(self, item_tools, profiler=None):
+        """Initialize FulfillmentManager.
+
+        Passes are broken down into phases with profiler, which only measures
+        time unless the caller enters it to count queries as well.
+        """
         self.item_tools = item_tools
+        if profiler is None:
+            profiler = PassProfiler()
+        self.profiler = profiler
 
     def _expire_order(self, order, order_update_creator):
         comment = ('This order started at %s has gone past its expiration '
@@ -50,67 +77,31 @@ class FulfillmentManager(object):
             return True
         return False
 
-    def _pop_item_from_queryset(self, items_queryset, item):
-        return items_queryset.exclude(id=item.id)
-
-    def _pop_item_from_all_querysets(self, items_querysets, item):
-        """Remove from querysets the given item."""
-        for nickname in items_querysets:
-            item_queryset = items_querysets[nickname]
-            # This is safe if the Item does not exist within the queryset
-            items_querysets[nickname] = self._pop_item_from_queryset(
-                item_queryset, item)
-
-    def _get_item_from_queryset(self, item_queryset):
-        """Return an item from the given queryset.
+    def _choose_item(self, candidate_items):
+        """Return an item from the given candidate items.
 
         We will first attempt to find an item with a held_by of None since
-        the queryset contains a mix of Items which are held by None and
+        the candidates contain a mix of Items which are held by None and
         items which are held by a creator_task.
         """
-        held_by_none_qs = item_queryset.filter(held_by_object_id=None)
-        if held_by_none_qs:
-            return random.choice(list(held_by_none_qs))
+        held_by_none_items = [item for item in candidate_items
+                              if item.held_by_object_id is None]
+        if held_by_none_items:
+            return random.choice(held_by_none_items)
 
-        return random.choice(list(item_queryset))
+        return random.choice(candidate_items)
 
-    def _filter_item_state_for_queryset(self, item_queryset,
-                                        requires_maintenance_items):
-        if requires_maintenance_items:
-            state = Item.STATE_MAINTENANCE
-        else:
-            state = Item.STATE_ACTIVE
-        return item_queryset.filter(state=state)
-
-    def _get_prefiltered_item_queryset(self,
-                                       item_type,
-                                       assigned_items_ids,
-                                       held_by_any,
-                                       requires_maintenance_items):
-        item_queryset = (self.item_tools
-                             .get_queryset_for_item_type(item_type)
-                             .exclude(id__in=assigned_items_ids))
-
-        item_state_filtered_queryset = \
-            self._filter_item_state_for_queryset(
-                item_queryset,
-                requires_maintenance_items)
-
-        if held_by_any:
-            return item_state_filtered_queryset
-
-        held_by_none_queryset = \
-            item_state_filtered_queryset.filter(held_by_object_id=None)
-        item_manager = self.item_tools.item_types[item_type].manager_class()
-        pending_item_queryset = item_manager.get_pending_items_queryset(
-            item_state_filtered_queryset)
-
-        return (pending_item_queryset | held_by_none_queryset)
+    def _is_item_held(self, item):
+        # Only resolve the generic foreign key when there is something to
+        # resolve so that items held by None don't cost a query each.
+        return item.held_by_object_id is not None and item.held_by is not None
 
     def _select_items(self, order_items, assigned_items_ids,
                       held_by_any=False,
                       requires_maintenance_items=False,
-                      ignore_rare=False):
+                      ignore_rare=False,
+                      inventory=None,
+                      candidate_items=None):
         """Assign an eligible item to each nickname in an Order.
 
         Return None if any nickname is un-assignable. Otherwise, return a
@@ -118,50 +109,53 @@ class FulfillmentManager(object):
 
         ignore_rare can be set to True to only select from non-rare items. If
         the order is inherently looking for rare items, selection will fail.
+
+        inventory is the InventorySnapshot of the current fulfillment pass. A
+        fresh one is used if it's not given.
+
+        If candidate_items is given, it's filled with the candidate items of
+        each nickname so identical requests can choose from them again with
+        _choose_items instead of searching the inventory.
         """
         log.debug('Selecting for order items: %s', json.dumps(order_items,
                                                               indent=4,
                                                               sort_keys=True))
+        if inventory is None:
+            inventory = InventorySnapshot(self.item_tools)
+        if candidate_items is None:
+            candidate_items = {}
 
-        prefiltered_items_querysets = {}
+        excluded_items_ids = set(assigned_items_ids)
         for nickname, order_item in order_items.items():
-            item_type = order_item['type']
-            if item_type not in prefiltered_items_querysets:
-                prefiltered_items_querysets[item_type] = \
-                    self._get_prefiltered_item_queryset(
-                        item_type,
-                        assigned_items_ids,
-                        held_by_any,
-                        requires_maintenance_items)
-
-        items_querysets = self.item_tools.find_eligible_items_for_order_items(
-            order_items=order_items,
-            prefiltered_items_querysets=prefiltered_items_querysets)
-
-        if ignore_rare:
-            log.debug('Ignoring rare items in querysets of eligible items')
-            for nickname, queryset in items_querysets.items():
-                item_type = order_items[nickname]['type']
-                non_rare_requirements = self.item_tools \
-                                            .item_types[item_type] \
-                                            .manager_class() \
-                                            .get_non_rare_requirements()
-                items_querysets[nickname] = \
-                    queryset.filter(**non_rare_requirements)
+            candidate_items[nickname] = inventory.get_candidate_items(
+                order_item,
+                excluded_items_ids,
+                held_by_any=held_by_any,
+                requires_maintenance_items=requires_maintenance_items,
+                ignore_rare=ignore_rare)
+        return self._choose_items(order_items, candidate_items,
+                                  excluded_items_ids)
 
+    def _choose_items(self, order_items, candidate_items, excluded_items_ids):
+        """Choose an item for each nickname from its candidate items.
+
+        Items whose ids are in excluded_items_ids are skipped, and a nickname
+        is assigned None if none of its candidates are left.
+        """
+        excluded_items_ids = set(excluded_items_ids)
         selected_items = {}
         for nickname in order_items:
-            if not items_querysets[nickname].exists():
-                log.debug('Did not find item in queryset for %s - '
+            remaining_items = [item for item in candidate_items[nickname]
+                               if item.id not in excluded_items_ids]
+            if not remaining_items:
+                log.debug('Did not find an eligible item for %s - '
                           'assigned None for this nickname'
                           % repr(nickname))
                 selected_items[nickname] = None
                 continue
 
-            selected_item = self._get_item_from_queryset(
-                items_querysets[nickname])
-            self._pop_item_from_all_querysets(items_querysets,
-                                              selected_item)
+            selected_item = self._choose_item(remaining_items)
+            excluded_items_ids.add(selected_item.id)
 
             log.debug('Tentatively selecting item %s to fulfill %s'
                       % (repr(selected_item), repr(nickname)))
@@ -172,13 +166,22 @@ class FulfillmentManager(object):
                                     item_requirements,
                                     item_type,
                                     assigned_items_ids,
-                                    recursion_depth=0):
+                                    recursion_depth=0,
+                                    inventory=None,
+                                    planner=None,
+                                    creator_kwargs=None):
         """Try to create an Item from a recipe.
 
         Returns a set of tasks that creates the item based on the given
         recipe. If a recipe is defined, we will either return a task to
         create the item or recursively check its required ingredients
         for tasks to create those as well if needed.
+
+        planner is the RecipePlanner of the current fulfillment pass. A fresh
+        one is used if it's not given.
+
+        creator_kwargs are extra keyword arguments for every item creator,
+        such as the warm_pool of an ItemCreatorTask.
         """
         if recursion_depth > MAX_RECURSION_LIMIT:
             # If we haven't determined all the ingredients that we need
@@ -191,8 +194,16 @@ class FulfillmentManager(object):
                       % (MAX_RECURSION_LIMIT, item_type))
             return []
 
-        item_manager = self.item_tools.item_types[item_type].manager_class()
-        recipe = item_manager.get_item_recipe(item_requirements)
+        if creator_kwargs is None:
+            creator_kwargs = {}
+        if planner is None:
+            if inventory is None:
+                inventory = InventorySnapshot(self.item_tools)
+            planner = RecipePlanner(self.item_tools, inventory)
+
+        signature = planner.get_signature(item_type, item_requirements)
+        recipe, required_ingredients = planner.get_recipe(
+            signature, item_type, item_requirements)
         if not recipe:
             # The item_type we are processing doesn't have a recipe defined
             # so we cannot create it on the fly.
@@ -201,30 +212,52 @@ class FulfillmentManager(object):
                       % item_type)
             return []
 
-        required_ingredients = recipe.required_ingredients
         if not required_ingredients:
             # The item_type we are processing is a dynamic item and doesn't
             # have any required ingredients. Return the creator_task signature
             # for this item_type so a Celery worker can create this item.
-            item_creator_task = recipe.creator_task(item_requirements)
+            item_creator_task = planner.get_creator_task(
+                signature, recipe, item_requirements)
             log.debug('item_type %s does not have any required ingredients '
                       'so create task signature of type %s.'
                       % (item_type, item_creator_task))
             item_creator = item_creator_task.si(
                 ingredients={},
-                requirements=item_requirements)
+                requirements=item_requirements,
+                **creator_kwargs)
             return [item_creator]
 
-        selected_items = self._select_items(
-            order_items=required_ingredients,
-            assigned_items_ids=assigned_items_ids,
-            held_by_any=False,
-            requires_maintenance_items=False,
-            ignore_rare=False)
-
         unfulfilled_nicknames = \
-            [nickname for nickname, item in selected_items.items()
-             if item is None]
+            planner.get_unfulfilled_ingredient_nicknames(signature)
+        if unfulfilled_nicknames is None:
+            candidate_items = planner.get_ingredient_candidates(signature)
+            if candidate_items is None:
+                candidate_items = {}
+                selected_items = self._select_items(
+                    order_items=required_ingredients,
+                    assigned_items_ids=assigned_items_ids,
+                    held_by_any=False,
+                    requires_maintenance_items=False,
+                    ignore_rare=False,
+                    inventory=planner.inventory,
+                    candidate_items=candidate_items)
+                if None not in selected_items.values():
+                    planner.set_ingredient_candidates(
+                        signature, candidate_items)
+            else:
+                # Items only get assigned during a pass, so the candidates
+                # of an identical request are still the only ones left
+                # once the assigned items are skipped.
+                selected_items = self._choose_items(
+                    required_ingredients, candidate_items,
+                    assigned_items_ids)
+
+            unfulfilled_nicknames = \
+                [nickname for nickname, item in selected_items.items()
+                 if item is None]
+            if unfulfilled_nicknames:
+                planner.set_unfulfilled_ingredient_nicknames(
+                    signature, unfulfilled_nicknames)
 
         if 0 == len(unfulfilled_nicknames):
             # The item_type we are processing has required_ingredients and
@@ -235,7 +268,7 @@ class FulfillmentManager(object):
                 selected_item_sids[nickname] = item.sid
                 assigned_items_ids.append(item.id)
 
-                if item.held_by is not None:
+                if self._is_item_held(item):
                     # We can select items that are held by None or held by
                     # a creator task to fulfill the required ingredients.
                     # In the case of the latter, the item is not yet usable
@@ -252,10 +285,12 @@ class FulfillmentManager(object):
             # All the items we found to satisfy our required_ingredients are
             # usable. Return the creator_task signature for this item_type so
             # a Celery worker can create this item
-            item_creator_task = recipe.creator_task(item_requirements)
+            item_creator_task = planner.get_creator_task(
+                signature, recipe, item_requirements)
             item_creator = item_creator_task.si(
                 ingredients=selected_item_sids,
-                requirements=item_requirements)
+                requirements=item_requirements,
+                **creator_kwargs)
             return [item_creator]
         else:
             # We were unable to find an item to satisfy one or more of our
@@ -274,10 +309,24 @@ class FulfillmentManager(object):
                     item['requirements'],
                     item['type'],
                     assigned_items_ids,
-                    recursion_depth + 1)
+                    recursion_depth + 1,
+                    planner=planner,
+                    creator_kwargs=creator_kwargs)
 
             return item_creators
 
+    def get_item_creators(self, item_type, item_requirements,
+                          assigned_items_ids, creator_kwargs=None):
+        """Return the tasks to create an item outside of any order.
+
+        Ingredients selected for the item are added to assigned_items_ids.
+        The item creators, including those of ingredients, are given
+        creator_kwargs as extra keyword arguments.
+        """
+        return self._get_creator_tasks_for_item(
+            item_requirements, item_type, assigned_items_ids,
+            creator_kwargs=creator_kwargs)
+
     def _compute_order_priorities(self, orders):
         """Compute a dictionary mapping order SIDs to processing priority.
 
@@ -329,22 +378,58 @@ class FulfillmentManager(object):
 
         return order_priorities
 
-    def _get_open_orders_by_price(self):
-        """Get the list of open orders sorted by price-based priority."""
+    def _price_unpriced_live_orders(self):
+        """Price live orders which are missing a price.
+
+        Orders are normally priced when their items are written, so this
+        only catches orders from before prices were tracked and orders
+        which couldn't be priced at the time. Saving the price accounts for
+        the order in its tab's demand.
+        """
+        unpriced_orders = Order.objects.filter(
+            status__in=[Order.STATUS_OPEN, Order.STATUS_FULFILLED],
+            price=None)
+        for order in unpriced_orders:
+            item_prices = \
+                self.item_tools.get_prices_for_items(order.items.items())
+            order.price = sum(item_prices.values())
+            order.save(update_fields=['price'])
+            log.debug('Priced %s at %s.' % (order, order.price))
+
+    def _filter_orders_in_shard(self, orders, shard):
+        """Return the orders belonging to a shard, or all of them if None."""
+        if shard is None:
+            return orders
+        shards = get_fulfillment_shards()
+        return [order for order in orders
+                if shards.get_order_shard(order.items) == shard]
+
+    def _get_open_orders_by_price(self, shard=None):
+        """Get the list of open orders sorted by price-based priority.
+
+        Rather than pricing every live order, this uses the order prices and
+        the TabDemand totals maintained as orders are saved.
+        """
         log.debug("Getting open orders sorted by price-based priority")
+        self._price_unpriced_live_orders()
 
         # time_created ordering will be preserved as the secondary sort key.
-        unprioritized_open_orders = list(Order.objects.filter(
-            status=Order.STATUS_OPEN).order_by('time_created'))
-        fulfilled_orders = list(Order.objects.filter(
-            status=Order.STATUS_FULFILLED))
-
-        sorted_orders_dict = self._sort_open_orders_by_price(
-            unprioritized_open_orders,
-            fulfilled_orders)
+        unprioritized_open_orders = self._filter_orders_in_shard(
+            list(Order.objects.filter(status=Order.STATUS_OPEN)
+                 .select_related('tab')
+                 .order_by('time_created')),
+            shard)
+
+        with self.profiler.phase('priorities'):
+            priorities_stats = \
+                self._compute_order_priorities_stats_from_demand(
+                    unprioritized_open_orders)
+            sorted_orders_dict = self._prioritize_open_orders_by_price(
+                unprioritized_open_orders,
+                priorities_stats)
         return sorted_orders_dict['sorted_open_orders']
 
-    def _get_open_orders_by_time_created(self):
+    def _get_open_orders_by_time_created(self, shard=None):
         """Get an in-memory list of open orders to process.
 
         We work with frozen list instead of a queryset to avoid potential edge
@@ -357,25 +442,49 @@ class FulfillmentManager(object):
             return order_priorities.get(order.sid,
                                         order.time_created.isoformat())
 
-        unprioritized_open_orders = list(Order.objects.filter(
-            status=Order.STATUS_OPEN).order_by('time_created'))
-        order_priorities = self._compute_order_priorities(
-            unprioritized_open_orders)
-        open_orders = sorted(unprioritized_open_orders, key=get_priority)
+        unprioritized_open_orders = self._filter_orders_in_shard(
+            list(Order.objects.filter(status=Order.STATUS_OPEN)
+                 .order_by('time_created')),
+            shard)
+        with self.profiler.phase('priorities'):
+            order_priorities = self._compute_order_priorities(
+                unprioritized_open_orders)
+            open_orders = sorted(unprioritized_open_orders, key=get_priority)
         for order in open_orders:
             log.debug(('%s by user %s at %s has priority %s.' %
                       (order, order.owner, order.time_created.isoformat(),
                        get_priority(order))))
         return open_orders
 
-    def _get_open_orders(self):
-        """Get an ordered list of open orders to process for fulfillment."""
+    def _sort_orders_by_priority(self, orders):
+        """Sort some of the open orders the same way as _get_open_orders.
+
+        The orders are expected to be sorted by time_created and, with
+        ENABLE_ORDER_PRICE_PRIORITY, to have their tabs selected.
+        """
+        if settings.ENABLE_ORDER_PRICE_PRIORITY:
+            priorities_stats = \
+                self._compute_order_priorities_stats_from_demand(orders)
+            return self._prioritize_open_orders_by_price(
+                orders, priorities_stats)['sorted_open_orders']
+
+        order_priorities = self._compute_order_priorities(orders)
+        return sorted(orders,
+                      key=lambda order: order_priorities.get(
+                          order.sid, order.time_created.isoformat()))
+
+    def _get_open_orders(self, shard=None):
+        """Get an ordered list of open orders to process for fulfillment.
+
+        If shard is given, only the open orders belonging to it are included
+        and prioritized.
+        """
         # When using ORDER_PRICE_PRIORITY, the get_priority function has a
         # side-effect of doing a database write for the tab_based_priority
         # field of each open order. More details documented on the function
         if settings.ENABLE_ORDER_PRICE_PRIORITY:
-            return self._get_open_orders_by_price()
-        return self._get_open_orders_by_time_created()
+            return self._get_open_orders_by_price(shard)
+        return self._get_open_orders_by_time_created(shard)
 
     def _sort_open_orders_by_price(self,
                                    open_orders,
@@ -393,16 +502,20 @@ class FulfillmentManager(object):
         """
         priorities_stats = self._compute_order_priorities_stats(
             open_orders + fulfilled_orders)
+        return self._prioritize_open_orders_by_price(open_orders,
+                                                     priorities_stats)
+
+    def _prioritize_open_orders_by_price(self, open_orders, priorities_stats):
+        """Compute each open order's price-based priority from stats.
+
+        Returns the same dictionary as _sort_open_orders_by_price.
+        """
         median_demand, order_prices, tab_limits, total_fulfilled_prices = \
             (priorities_stats['median_demand'],
              priorities_stats['order_prices'],
              priorities_stats['tab_limits'],
              priorities_stats['total_fulfilled_prices'])
 
-        # The get_priority function also does a write to the database to update
-        # tab_based_priority field for each order. This is because we use that
-        # as a cached field to show the user the order's last known priority.
-        # This is a side-effect of the function
         def get_priority(open_order):
             """Compute an open order's price-based priority.
 
@@ -424,9 +537,6 @@ class FulfillmentManager(object):
                     ((order_price + owner_total_fulfilled_price) / tab_limit) /
                     (1.2 * median_demand))
 
-            open_order.tab_based_priority = priority
-            open_order.save(update_fields=['tab_based_priority'])
-
             return priority
 
         order_priorities = {
@@ -435,6 +545,11 @@ class FulfillmentManager(object):
 
         log.debug('Open order price-based priorities: %s' % order_priorities)
 
+        # We also write the tab_based_priority field of each order. This is
+        # because we use that as a cached field to show the user the order's
+        # last known priority.
+        self._save_order_priorities(open_orders, order_priorities)
+
         sorted_open_orders = \
             sorted(open_orders,
                    key=lambda o: order_priorities[o.sid])
@@ -444,6 +559,47 @@ class FulfillmentManager(object):
             'open_order_priorities': order_priorities
         }
 
+    def _update_order_priorities(self, orders_ids, priority):
+        num_updated_orders = 0
+        for index in range(0, len(orders_ids), PRIORITY_UPDATE_BATCH_SIZE):
+            batch_orders_ids = \
+                orders_ids[index:index + PRIORITY_UPDATE_BATCH_SIZE]
+            # Only update orders which are still open so that we never
+            # overwrite the special priority of an order which got
+            # fulfilled or closed in the meantime.
+            num_updated_orders += Order.objects.filter(
+                id__in=batch_orders_ids,
+                status=Order.STATUS_OPEN).update(tab_based_priority=priority)
+        return num_updated_orders
+
+    def _save_order_priorities(self, orders, order_priorities):
+        """Write the tab_based_priority of orders whose priority changed.
+
+        The orders are expected to hold the priorities they were loaded with,
+        so orders whose priority didn't change aren't written at all. The
+        rest are written with one UPDATE per distinct priority (or a few, for
+        large numbers of orders) in a single transaction.
+        """
+        changed_orders_ids = defaultdict(list)
+        for order in orders:
+            priority = order_priorities[order.sid]
+            if order.tab_based_priority != priority:
+                changed_orders_ids[priority].append(order.id)
+                order.tab_based_priority = priority
+
+        num_changed_orders = 0
+        if changed_orders_ids:
+            with transaction.atomic():
+                for priority, orders_ids in changed_orders_ids.items():
+                    num_changed_orders += self._update_order_priorities(
+                        orders_ids, priority)
+
+        log.debug('Updated the priority of %d of %d open orders.'
+                  % (num_changed_orders, len(orders)))
+        increment_counter('order_priorities.changed', num_changed_orders)
+        increment_counter('order_priorities.unchanged',
+                          len(orders) - num_changed_orders)
+
     def _compute_order_priorities_stats(self, orders):
         """Compute the statistics required to calculate order priorities.
 
@@ -493,6 +649,50 @@ class FulfillmentManager(object):
             log.debug('Order %s has a price of %s' % (order, order_price))
             order_prices[order.sid] = order_price
 
+        median_demand = self._compute_median_demand(tab_limits, tab_demands,
+                                                    bool(orders))
+
+        order_priority_stats = {
+            'median_demand': median_demand,
+            'order_prices': order_prices,
+            'tab_limits': tab_limits,
+            'total_fulfilled_prices': dict(total_fulfilled_prices)
+        }
+
+        log.debug('Order priority stats: %s' % order_priority_stats)
+        return order_priority_stats
+
+    def _assign_open_orders(self, open_orders, assigned_items_ids,
+                            inventory):
+        """Match the highest priority open orders to items together.
+
+        Returns a dictionary mapping the sids of the matched orders to their
+        selected items, and adds the ids of those items to
+        assigned_items_ids. Orders which could not be matched are left to
+        process_open_order, which may still find pending items or create
+        items for them.
+        """
+        solver = OrderAssignmentSolver(inventory, assigned_items_ids)
+        orders = [order for order in open_orders if not order.maintenance]
+        for order in orders[:settings.ORDER_ASSIGNMENT_SOLVER_MAX_ORDERS]:
+            try:
+                solver.add_order(order.sid, order.items)
+            except Exception:
+                log.warning('Caught Exception while matching %s. Leaving it '
+                            'to greedy selection.' % order,
+                            exc_info=True)
+
+        order_assignments = solver.get_assignments()
+        for selected_items in order_assignments.values():
+            for item in selected_items.values():
+                assigned_items_ids.append(item.id)
+
+        log.debug('Matched %d of %d open orders to items.'
+                  % (len(order_assignments), len(orders)))
+        return order_assignments
+
+    def _compute_median_demand(self, tab_limits, tab_demands, has_orders):
+        """Compute the median of all tab_demand/tab_limit."""
         total_tab_limit = sum(tab_limits.values())
 
         # Generate a list of tab_demands / tab_limit to compute the median
@@ -506,21 +706,60 @@ class FulfillmentManager(object):
                 log,
                 'Total tab limit is negative: %s' % total_tab_limit)
         elif total_tab_limit == 0:
-            if orders:
+            if has_orders:
                 bodega_value_error(
                     log,
                     ('Total tab limit is 0 for non-empty list of orders. '
                      'This may be due to a race condition in between the time '
                      'we collect the tab ids and fetch their limits.'))
-            median_demand = None
-        else:
-            median_demand = statistics.median(tab_demand_per_limit)
+            return None
+        return statistics.median(tab_demand_per_limit)
+
+    def _compute_order_priorities_stats_from_demand(self, open_orders):
+        """Compute the same statistics as _compute_order_priorities_stats.
+
+        Instead of pricing the given open orders and every fulfilled order,
+        this reads the prices of the open orders and the TabDemand totals of
+        all tabs with live orders.
+        """
+        order_prices = {}
+        for order in open_orders:
+            order_price = 0.0 if order.maintenance else order.price
+            log.debug('Order %s has a price of %s' % (order, order_price))
+            order_prices[order.sid] = order_price
+
+        tab_limits = {}
+        tab_demands = {}
+        total_fulfilled_prices = {}
+        live_tab_demands = TabDemand.objects.filter(
+            Q(open_orders_count__gt=0) | Q(fulfilled_orders_count__gt=0)) \
+            .select_related('tab')
+        for tab_demand in live_tab_demands:
+            tab = tab_demand.tab
+            tab_limits[tab.sid] = tab.limit
+            tab_demands[tab.sid] = tab_demand.live_orders_price
+            if tab_demand.fulfilled_orders_count > 0:
+                total_fulfilled_prices[tab.id] = \
+                    tab_demand.fulfilled_orders_price
+
+        for order in open_orders:
+            if order.maintenance or order.tab.sid in tab_limits:
+                continue
+            # This is only possible if the totals drifted from the orders,
+            # which the check_tab_demands command can detect and repair.
+            log.warning('%s of %s is missing from the tab demands.'
+                        % (order.tab, order))
+            tab_limits[order.tab.sid] = order.tab.limit
+            tab_demands[order.tab.sid] = order.price
+
+        median_demand = self._compute_median_demand(
+            tab_limits, tab_demands, bool(tab_demands))
 
         order_priority_stats = {
             'median_demand': median_demand,
             'order_prices': order_prices,
             'tab_limits': tab_limits,
-            'total_fulfilled_prices': dict(total_fulfilled_prices)
+            'total_fulfilled_prices': total_fulfilled_prices
         }
 
         log.debug('Order priority stats: %s' % order_priority_stats)
@@ -529,7 +768,9 @@ class FulfillmentManager(object):
     def fulfill_open_orders(self, get_order_fulfillers,
                             create_order_fulfiller,
                             create_item_maintenance_setter,
-                            order_update_creator):
+                            order_update_creator,
+                            get_sids_of_orders_with_fulfillers=None,
+                            shard=None):
         """Loop through all OPEN Orders try to fulfill all item requests.
 
         The strategy to fulfill orders will be an all-or-nothing strategy.
@@ -538,11 +779,302 @@ class FulfillmentManager(object):
 
         Fulfillment will prioritize non-rare items, falling back to the full
         set when prioritization is not possible.
+
+        With ENABLE_ORDER_ASSIGNMENT_SOLVER, the highest priority open orders
+        are matched to items together before falling back to selecting items
+        one order at a time.
+
+        If get_sids_of_orders_with_fulfillers is given, it's called once with
+        the SIDs of all open orders to find which of them already have order
+        fulfillers. Otherwise get_order_fulfillers is called for each order.
+
+        If shard is given, only the open orders belonging to that
+        fulfillment shard are processed, so passes over different shards can
+        run concurrently.
+        """
+        with self.profiler.phase('get_open_orders'):
+            open_orders = self._get_open_orders(shard)
+        with self.profiler.phase('queue_estimates'):
+            QueueEstimator(settings.QUEUE_ESTIMATE_HISTORY_WINDOW) \
+                .update_estimates(open_orders)
+        inventory = InventorySnapshot(self.item_tools)
+        planner = RecipePlanner(self.item_tools, inventory)
+        assigned_items_ids = []
+        with self.profiler.phase('maintenance_orders'):
+            signatures = self._process_maintenance_orders(
+                open_orders, create_item_maintenance_setter,
+                order_update_creator, assigned_items_ids, inventory)
+
+        with self.profiler.phase('expiration_checks'):
+            orders_to_process = self._get_orders_to_process(
+                open_orders, get_order_fulfillers, order_update_creator,
+                get_sids_of_orders_with_fulfillers)
+
+        order_assignments = {}
+        if settings.ENABLE_ORDER_ASSIGNMENT_SOLVER:
+            with self.profiler.phase('assignment_solver'):
+                order_assignments = self._assign_open_orders(
+                    orders_to_process, assigned_items_ids, inventory)
+
+        with self.profiler.phase('process_open_orders'):
+            for order in orders_to_process:
+                with self.profiler.order(order, order.items):
+                    signatures += self._process_open_order_in_pass(
+                        order, order_assignments, create_order_fulfiller,
+                        assigned_items_ids, inventory, planner)
+
+        log.debug('Looked up %d recipes and reused %d failed and %d '
+                  'successful ingredient searches in this pass.'
+                  % (planner.num_recipe_lookups,
+                     planner.num_reused_searches,
+                     planner.num_reused_selections))
+        return signatures
+
+    def _get_distinct_order_items(self, orders_ids_by_items_signature):
+        """Return the distinct order items of each items signature.
+
+        Orders with the same items signature request the same items, so the
+        items of a signature are parsed from the items_json of one of its
+        orders the first time it's seen and remembered after that. Only the
+        signatures of the given open orders are kept.
+        """
+        new_items_signatures = [
+            items_signature for items_signature
+            in orders_ids_by_items_signature
+            if items_signature not in _order_items_by_items_signature]
+        for index in range(0, len(new_items_signatures),
+                           ORDERS_IDS_BATCH_SIZE):
+            orders_ids = [
+                orders_ids_by_items_signature[items_signature][0]
+                for items_signature
+                in new_items_signatures[index:index + ORDERS_IDS_BATCH_SIZE]]
+            for items_signature, items_json in Order.objects \
+                    .filter(id__in=orders_ids) \
+                    .values_list('items_signature', 'items_json'):
+                order_items = {}
+                for order_item in \
+                        load_order_items_json(items_json).values():
+                    signature = get_requirements_signature(
+                        order_item['type'], order_item['requirements'])
+                    order_items[signature] = order_item
+                _order_items_by_items_signature[items_signature] = \
+                    order_items
+
+        for items_signature in list(_order_items_by_items_signature):
+            if items_signature not in orders_ids_by_items_signature:
+                del _order_items_by_items_signature[items_signature]
+        return _order_items_by_items_signature
+
+    def _index_open_order_items(self):
+        """Return a reverse index of the items requested by open orders.
+
+        The index maps the requirements signature of each distinct order item
+        to the order item and the set of ids of the open orders which
+        requested it. Only the ids and items signatures of the open orders
+        are read, and items_json only for items signatures which weren't seen
+        before. Maintenance orders are left to full passes.
+        """
+        orders_ids_by_items_signature = defaultdict(list)
+        unsigned_orders_ids = []
+        for order_id, items_signature in Order.objects \
+                .filter(status=Order.STATUS_OPEN, maintenance=False) \
+                .values_list('id', 'items_signature'):
+            if items_signature:
+                orders_ids_by_items_signature[items_signature].append(
+                    order_id)
+            else:
+                unsigned_orders_ids.append(order_id)
+
+        orders_by_requirements = {}
+
+        def add_order_items(order_items, orders_ids):
+            for signature, order_item in order_items.items():
+                if signature not in orders_by_requirements:
+                    orders_by_requirements[signature] = (order_item, set())
+                orders_by_requirements[signature][1].update(orders_ids)
+
+        order_items_by_items_signature = self._get_distinct_order_items(
+            orders_ids_by_items_signature)
+        for items_signature, orders_ids in \
+                orders_ids_by_items_signature.items():
+            # The items of an order may have changed since it was listed, in
+            # which case the next pass picks it up.
+            order_items = order_items_by_items_signature.get(items_signature)
+            if order_items is not None:
+                add_order_items(order_items, orders_ids)
+
+        # Orders which predate items_json have to be merged from their
+        # updates one at a time.
+        for order in Order.objects.filter(id__in=unsigned_orders_ids):
+            add_order_items(
+                {get_requirements_signature(order_item['type'],
+                                            order_item['requirements']):
+                 order_item
+                 for order_item in order.items.values()},
+                [order.id])
+
+        num_open_orders = \
+            sum(len(orders_ids) for orders_ids
+                in orders_ids_by_items_signature.values()) + \
+            len(unsigned_orders_ids)
+        return orders_by_requirements, num_open_orders
+
+    def _get_orders_waiting_for_item(self, item, item_type, planner):
+        """Return the open orders which an item could help fulfill.
+
+        Orders are waiting for the item if they request an item which it
+        satisfies, or an item whose recipe takes it as an ingredient. The
+        latter are returned separately, as a set of order ids, since the item
+        can only help them by creating the item they requested.
+
+        Every distinct requirements of the item type is checked against the
+        item once, no matter how many orders requested it or how many recipes
+        take it. Recipes are looked up through planner. Maintenance orders
+        are left to full passes.
+        """
+        item_queryset = self.item_tools \
+            .get_queryset_for_item_type(item_type) \
+            .filter(id=item.id, state=Item.STATE_ACTIVE)
+        specific_item = item_queryset.first()
+        if specific_item is None:
+            return [], set()
+
+        # Most requirements can be matched against the item in memory. Only
+        # the ones which can't are checked with a query.
+        is_eligible_by_signature = {}
+
+        def is_eligible(order_item):
+            signature = get_requirements_signature(
+                order_item['type'], order_item['requirements'])
+            if signature not in is_eligible_by_signature:
+                compiled_requirements = self.item_tools.compile_requirements(
+                    item_type, order_item['requirements'])
+                eligible = compiled_requirements.matches(specific_item)
+                if eligible is None:
+                    eligible = \
+                        compiled_requirements.filter(item_queryset).exists()
+                is_eligible_by_signature[signature] = eligible
+            return is_eligible_by_signature[signature]
+
+        orders_by_requirements, num_open_orders = \
+            self._index_open_order_items()
+        waiting_orders_ids = set()
+        ingredient_waiting_orders_ids = set()
+        for signature, (order_item, orders_ids) in \
+                orders_by_requirements.items():
+            if order_item['type'] == item_type:
+                if is_eligible(order_item):
+                    waiting_orders_ids.update(orders_ids)
+                continue
+
+            if order_item['type'] not in self.item_tools.item_types:
+                continue
+            _, required_ingredients = planner.get_recipe(
+                signature, order_item['type'], order_item['requirements'])
+            if any(ingredient['type'] == item_type and is_eligible(ingredient)
+                   for ingredient in (required_ingredients or {}).values()):
+                ingredient_waiting_orders_ids.update(orders_ids)
+        ingredient_waiting_orders_ids -= waiting_orders_ids
+
+        orders_ids = list(waiting_orders_ids | ingredient_waiting_orders_ids)
+        waiting_orders = []
+        for index in range(0, len(orders_ids), ORDERS_IDS_BATCH_SIZE):
+            waiting_orders += Order.objects.filter(
+                id__in=orders_ids[index:index + ORDERS_IDS_BATCH_SIZE]) \
+                .select_related('tab')
+        waiting_orders.sort(key=lambda order: order.time_created)
+
+        log.debug('%s could help fulfill %d and create items for %d of %d '
+                  'open orders with %d distinct requested items.'
+                  % (item, len(waiting_orders_ids),
+                     len(ingredient_waiting_orders_ids), num_open_orders,
+                     len(orders_by_requirements)))
+        return waiting_orders, ingredient_waiting_orders_ids
+
+    def fulfill_open_orders_for_item(self, item, get_order_fulfillers,
+                                     create_order_fulfiller,
+                                     order_update_creator,
+                                     get_sids_of_orders_with_fulfillers=None):
+        """Try to fulfill the open orders waiting for a freed or new item.
+
+        This is the incremental counterpart of fulfill_open_orders. Only the
+        open orders with an order item which the item satisfies are
+        considered, in priority order, and processing stops as soon as the
+        item is assigned since the rest of the orders are no better off than
+        they were after the last pass. Orders requesting an item whose recipe
+        takes the item as an ingredient are considered too, and items are
+        created for them like in a full pass. Otherwise, unlike a full pass,
+        no items are created for orders which still can't be fulfilled; full
+        passes keep doing that and catch anything missed here.
+
+        Returns the signatures of the order fulfillers and item creators to
+        publish.
+        """
+        if item.held_by_object_id is not None or \
+                item.state != Item.STATE_ACTIVE:
+            log.debug('%s is not available so there are no orders to '
+                      'fulfill with it.' % item)
+            return []
+
+        item_type = self.item_tools.get_item_type_name(item)
+        if item_type is None:
+            log.warning('%s has no known item type.' % item)
+            return []
+
+        inventory = InventorySnapshot(self.item_tools)
+        planner = RecipePlanner(self.item_tools, inventory)
+        with self.profiler.phase('get_open_orders'):
+            if settings.ENABLE_ORDER_PRICE_PRIORITY:
+                self._price_unpriced_live_orders()
+            waiting_orders, ingredient_waiting_orders_ids = \
+                self._get_orders_waiting_for_item(item, item_type, planner)
+        if not waiting_orders:
+            return []
+
+        with self.profiler.phase('priorities'):
+            waiting_orders = self._sort_orders_by_priority(waiting_orders)
+        with self.profiler.phase('expiration_checks'):
+            orders_to_process = self._get_orders_to_process(
+                waiting_orders, get_order_fulfillers, order_update_creator,
+                get_sids_of_orders_with_fulfillers)
+
+        assigned_items_ids = []
+        signatures = []
+        with self.profiler.phase('process_open_orders'):
+            for order in orders_to_process:
+                with self.profiler.order(order, order.items):
+                    try:
+                        signatures += self.process_open_order(
+                            order, create_order_fulfiller,
+                            assigned_items_ids, inventory=inventory,
+                            planner=planner,
+                            create_items=(
+                                order.id in ingredient_waiting_orders_ids))
+                    except Exception:
+                        log.warning('Caught Exception for %s. Not creating '
+                                    'any tasks for this order.'
+                                    % order,
+                                    exc_info=True)
+                        self.profiler.set_order_outcome('error')
+                if item.id in assigned_items_ids:
+                    break
+
+        increment_counter('item_fulfillment.orders_considered',
+                          len(orders_to_process))
+        increment_counter('item_fulfillment.order_fulfillers',
+                          len(signatures))
+        return signatures
+
+    def _process_maintenance_orders(self, open_orders,
+                                    create_item_maintenance_setter,
+                                    order_update_creator,
+                                    assigned_items_ids, inventory):
+        """Set the items of open maintenance orders to maintenance state.
+
+        Returns the signatures of the tasks to do so.
         """
-        open_orders = self._get_open_orders()
         open_maintenance_orders = [order for order in open_orders
                                    if order.maintenance]
-        assigned_items_ids = []
         signatures = []
 
         for maintenance_order in open_maintenance_orders:
@@ -557,7 +1089,8 @@ class FulfillmentManager(object):
                 order_items=maintenance_order.items,
                 assigned_items_ids=assigned_items_ids,
                 held_by_any=True,
-                requires_maintenance_items=False)
+                requires_maintenance_items=False,
+                inventory=inventory)
             unfulfilled_nicknames = \
                 [nickname for nickname, item in maintenance_items.items()
                  if item is None]
@@ -569,7 +1102,6 @@ class FulfillmentManager(object):
                                       for nickname, item
                                       in sorted(maintenance_items.items())]))
 
-                time.sleep(1)
                 OrderUpdate.objects.create(
                     order=maintenance_order,
                     comment=comment,
@@ -583,6 +1115,24 @@ class FulfillmentManager(object):
 
                 log.info(comment)
 
+        return signatures
+
+    def _get_orders_to_process(self, open_orders, get_order_fulfillers,
+                               order_update_creator,
+                               get_sids_of_orders_with_fulfillers=None):
+        """Return the open orders which still need to be processed.
+
+        Expired orders are closed along the way, and orders which already
+        have order fulfillers are skipped.
+        """
+        sids_of_orders_with_fulfillers = None
+        if get_sids_of_orders_with_fulfillers is not None:
+            sids_of_orders_with_fulfillers = set(
+                str(order_sid) for order_sid in
+                get_sids_of_orders_with_fulfillers(
+                    [order.sid for order in open_orders]))
+
+        orders_to_process = []
         for order in open_orders:
             curr_time = datetime.now(utc)
             if order.maintenance:
@@ -594,59 +1144,90 @@ class FulfillmentManager(object):
                     curr_time):
                 continue
 
-            order_fulfillers = get_order_fulfillers(order.sid)
             # If there is already a fulfiller for this order, we don't want to
             # do anything with it. In particular this avoids creating
             # additional order fulfillers which is potentially wasteful of
             # items not only by assigning extras to the order, but even before
             # that as the extra fulfillers hold items that could have been
             # used to fulfill other orders.
-            if order_fulfillers.exists():
-                log.debug(
-                    ('Will not process %s because it already ' % order) +
-                    ('has order fulfillers: %s' % repr(order_fulfillers)))
-                continue
-
-            try:
-                task_signatures = self.process_open_order(
-                    order, create_order_fulfiller, assigned_items_ids)
-            except Exception:
-                log.warning('Caught Exception for %s. Not creating '
-                            'any tasks for this order.'
-                            % order,
-                            exc_info=True)
+            if sids_of_orders_with_fulfillers is not None:
+                if str(order.sid) in sids_of_orders_with_fulfillers:
+                    log.debug('Will not process %s because it already has '
+                              'order fulfillers.' % order)
+                    continue
             else:
-                signatures += task_signatures
-
-        return signatures
+                order_fulfillers = get_order_fulfillers(order.sid)
+                if order_fulfillers.exists():
+                    log.debug(
+                        ('Will not process %s because it already ' % order) +
+                        ('has order fulfillers: %s' % repr(order_fulfillers)))
+                    continue
+
+            orders_to_process.append(order)
+
+        return orders_to_process
+
+    def _process_open_order_in_pass(self, order, order_assignments,
+                                    create_order_fulfiller,
+                                    assigned_items_ids, inventory, planner):
+        """Return the signatures of the tasks for an order in a pass."""
+        if order.sid in order_assignments:
+            selected_item_sids = {
+                nickname: item.sid
+                for nickname, item in order_assignments[order.sid].items()
+            }
+            log.debug('Able to assign item requests in %s' % order)
+            self.profiler.set_order_outcome('assigned')
+            return [create_order_fulfiller(order.sid, selected_item_sids)]
+
+        try:
+            return self.process_open_order(
+                order, create_order_fulfiller, assigned_items_ids,
+                inventory=inventory, planner=planner)
+        except Exception:
+            log.warning('Caught Exception for %s. Not creating '
+                        'any tasks for this order.'
+                        % order,
+                        exc_info=True)
+            self.profiler.set_order_outcome('error')
+            return []
 
     def process_open_order(self, order, create_order_fulfiller,
-                           assigned_items_ids):
+                           assigned_items_ids, inventory=None, planner=None,
+                           create_items=True):
+        """Return the signatures of the tasks to fulfill an open order.
+
+        If the order can't be fulfilled with existing items, the tasks to
+        create them are returned instead, unless create_items is False.
+        """
         log.debug('Processing OPEN order %s' % order)
         order_items = order.items
         requires_maintenance_items = order.maintenance
 
         selected_items = {}
-        if not requires_maintenance_items:
-            log.debug('Attempting assignment with \'ignore_rare=True\'')
-            selected_items = self._select_items(
-                order_items=order.items,
-                assigned_items_ids=assigned_items_ids,
-                held_by_any=False,
-                requires_maintenance_items=requires_maintenance_items,
-                ignore_rare=True)
+        with self.profiler.phase('select_items'):
+            if not requires_maintenance_items:
+                log.debug('Attempting assignment with \'ignore_rare=True\'')
+                selected_items = self._select_items(
+                    order_items=order_items,
+                    assigned_items_ids=assigned_items_ids,
+                    held_by_any=False,
+                    requires_maintenance_items=requires_maintenance_items,
+                    ignore_rare=True,
+                    inventory=inventory)
 
-        unfulfilled_nicknames = \
-            [nickname for nickname, item in selected_items.items()
-             if item is None]
-        if len(unfulfilled_nicknames) > 0 or order.maintenance:
-            log.debug('Attempting assignment with \'ignore_rare=False\'')
-            selected_items = self._select_items(
-                order_items=order.items,
-                assigned_items_ids=assigned_items_ids,
-                held_by_any=False,
-                requires_maintenance_items=requires_maintenance_items,
-                ignore_rare=False)
+            unfulfilled_nicknames = \
+                [nickname for nickname, item in selected_items.items()
+                 if item is None]
+            if len(unfulfilled_nicknames) > 0 or order.maintenance:
+                log.debug('Attempting assignment with \'ignore_rare=False\'')
+                selected_items = self._select_items(
+                    order_items=order_items,
+                    assigned_items_ids=assigned_items_ids,
+                    held_by_any=False,
+                    requires_maintenance_items=requires_maintenance_items,
+                    ignore_rare=False,
+                    inventory=inventory)
 
         unfulfilled_nicknames = \
             [nickname for nickname, item in selected_items.items()
@@ -660,7 +1241,7 @@ class FulfillmentManager(object):
                 selected_item_sids[nickname] = item.sid
                 assigned_items_ids.append(item.id)
 
-                if item.held_by is not None:
+                if self._is_item_held(item):
                     log.info('%s is currently held by %s so do not use it to '
                              'fulfill any orders.'
                              % (item, item.held_by))
@@ -675,28 +1256,125 @@ class FulfillmentManager(object):
                 log.debug('Selected items for fulfilling all items in %s but '
                           'an item is currently being held so will not '
                           'fulfill this Order.' % order)
+                self.profiler.set_order_outcome('held_items')
                 return []
 
             order_fulfiller = create_order_fulfiller(
                 order.sid, selected_item_sids)
+            self.profiler.set_order_outcome('fulfiller')
             return [order_fulfiller]
         else:
             log.debug('Unable to fulfill item requests for nicknames %s in %s.'
                       ' Will not assign any items to this Order.'
                       % (unfulfilled_nicknames, str(order)))
+            if not create_items:
+                self.profiler.set_order_outcome(
+                    'unfulfilled',
+                    unfulfilled_nicknames=len(unfulfilled_nicknames))
+                return []
 
             item_creators = []
-            for nickname in unfulfilled_nicknames:
-                item = order_items[nickname]
-                item_creators += self._get_creator_tasks_for_item(
-                    item['requirements'],
-                    item['type'],
-                    assigned_items_ids)
+            with self.profiler.phase('recipe_expansion'):
+                for nickname in unfulfilled_nicknames:
+                    item = order_items[nickname]
+                    item_creators += self._get_creator_tasks_for_item(
+                        item['requirements'],
+                        item['type'],
+                        assigned_items_ids,
+                        inventory=inventory,
+                        planner=planner)
 
+            self.profiler.set_order_outcome(
+                'item_creators',
+                unfulfilled_nicknames=len(unfulfilled_nicknames),
+                item_creators=len(item_creators))
             return item_creators
 
         return []
 
+    def _run_taste_test(self, item_type_name, item_manager, specific_item,
+                        requirements):
+        start_time = time.time()
+        try:
+            return item_manager.taste_test(specific_item, requirements)
+        finally:
+            record_timing('taste_test.%s' % item_type_name,
+                          int((time.time() - start_time) * 1000))
+
+    def _run_taste_test_in_thread(self, *args):
+        try:
+            return self._run_taste_test(*args)
+        finally:
+            # Django opens a separate database connection for each thread
+            # which touches the database, so close them before the thread
+            # goes away.
+            connections.close_all()
+
+    def _taste_test_items(self, order, selected_items):
+        """Taste test the items selected for an order.
+
+        Returns a dictionary mapping each nickname to whether its item passed
+        its taste test. Taste tests are often slow I/O such as probing a host
+        over the network, so they run concurrently on up to
+        TASTE_TEST_MAX_WORKERS threads. An item whose taste test hasn't
+        finished within TASTE_TEST_TIMEOUT seconds is considered spoiled.
+        """
+        taste_tests = {}
+        for (nickname, item) in selected_items.items():
+            # Look up everything which needs the database here, so the
+            # taste tests themselves don't have to.
+            specific_item = self.item_tools.get_specific_item(item)
+            manager_class = self.item_tools.get_manager_class(item)
+            item_manager = manager_class()
+            requirements = order.items[nickname]
+            log.debug('Taste testing %s with %s for order %s.' %
+                      (specific_item, item_manager, order))
+            taste_tests[nickname] = (self.item_tools.get_item_type_name(item),
+                                     item_manager,
+                                     specific_item,
+                                     requirements)
+
+        if not taste_tests:
+            return {}
+
+        # Even a single taste test runs on the pool so it can time out.
+        max_workers = max(
+            min(settings.TASTE_TEST_MAX_WORKERS, len(taste_tests)), 1)
+        taste_test_results = {}
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {
+                nickname: executor.submit(self._run_taste_test_in_thread,
+                                          *taste_test)
+                for nickname, taste_test in taste_tests.items()
+            }
+            # Queued taste tests only start once earlier ones finish, so
+            # allow a full timeout for each round of tests the pool runs.
+            num_rounds = -(-len(futures) // max_workers)
+            deadline = time.time() + settings.TASTE_TEST_TIMEOUT * num_rounds
+            for nickname, future in futures.items():
+                try:
+                    taste_test_results[nickname] = future.result(
+                        timeout=max(deadline - time.time(), 0))
+                except TimeoutError:
+                    item_type_name, _, specific_item, _ = \
+                        taste_tests[nickname]
+                    log.warning(
+                        'Taste test of %s for %s did not finish within %d '
+                        'seconds, so considering it spoiled.'
+                        % (specific_item, order,
+                           settings.TASTE_TEST_TIMEOUT))
+                    increment_counter('taste_test.%s.timeouts' %
+                                      item_type_name)
+                    future.cancel()
+                    taste_test_results[nickname] = False
+        finally:
+            # Don't wait for taste tests which timed out, they can't be
+            # interrupted and their results no longer matter.
+            executor.shutdown(wait=False)
+
+        return taste_test_results
+
     def fulfill_order(self, order, selected_items, order_update_creator):
         log.debug('Fulfilling order %s with items %s' %
                   (order, repr(selected_items)))
@@ -709,15 +1387,12 @@ class FulfillmentManager(object):
                 ('Skipping taste tests for order %s ' % str(order)) +
                 ('since it is a maintenance order.'))
         else:
+            taste_test_results = self._taste_test_items(order,
+                                                        selected_items)
             for (nickname, item) in selected_items.items():
                 specific_item = self.item_tools.get_specific_item(item)
-                manager_class = self.item_tools.get_manager_class(item)
-                item_manager = manager_class()
-
                 requirements = order.items[nickname]
-                log.debug('Taste testing %s with %s for order %s.' %
-                          (specific_item, item_manager, order))
-                if item_manager.taste_test(specific_item, requirements):
+                if taste_test_results[nickname]:
                     usable_items.add(specific_item)
                 else:
                     log.debug(
@@ -742,9 +1417,6 @@ class FulfillmentManager(object):
                               (nickname, str(item.name))
                               for nickname, item
                               in sorted(fulfilled_items.items())]))
-        # Ensure that this OrderUpdate does not have the same
-        # timestamp as the initial update.
-        time.sleep(1)
         with transaction.atomic():
             order_update = OrderUpdate.objects.create(
                 order=order,
@@ -0,0 +1,118 @@
+"""In-memory inventory of items considered during a fulfillment pass."""
+import logging
+
+from .models import Item
+from .requirements import dump_canonical_json
+
+log = logging.getLogger(__name__)
+
+
+class InventorySnapshot(object):
+    """Candidate items for a single FulfillmentManager pass.
+
+    Items of each type are loaded at most once per state, and the ids of the
+    items matching each distinct set of requirements are computed at most
+    once, so selecting items for hundreds of open orders does not require
+    building and evaluating a chain of querysets per nickname. Everything
+    else, such as skipping already assigned items and preferring items which
+    are held by nothing, happens in memory.
+
+    The fulfillment pass never changes the state or holder of items itself,
+    it only creates tasks which do so later, so a snapshot stays accurate
+    for the duration of a single pass. Don't keep one around any longer.
+    """
+
+    def __init__(self, item_tools):
+        """Create an empty snapshot which is lazily populated."""
+        self.item_tools = item_tools
+        self._items = {}
+        self._pending_items_ids = {}
+        self._eligible_items_ids = {}
+
+    def _get_state(self, requires_maintenance_items):
+        if requires_maintenance_items:
+            return Item.STATE_MAINTENANCE
+        return Item.STATE_ACTIVE
+
+    def _get_state_queryset(self, item_type, state):
+        return (self.item_tools
+                    .get_queryset_for_item_type(item_type)
+                    .filter(state=state))
+
+    def _get_items(self, item_type, state):
+        """Return a dictionary mapping ids to items of a type and state."""
+        key = (item_type, state)
+        if key not in self._items:
+            self._items[key] = {
+                item.id: item
+                for item in self._get_state_queryset(item_type, state)
+            }
+            log.debug('Loaded %d %s items in state %s into the inventory.'
+                      % (len(self._items[key]), item_type, state))
+        return self._items[key]
+
+    def _get_pending_items_ids(self, item_type, state):
+        key = (item_type, state)
+        if key not in self._pending_items_ids:
+            item_manager = \
+                self.item_tools.item_types[item_type].manager_class()
+            pending_item_queryset = item_manager.get_pending_items_queryset(
+                self._get_state_queryset(item_type, state))
+            self._pending_items_ids[key] = frozenset(
+                pending_item_queryset.values_list('id', flat=True))
+        return self._pending_items_ids[key]
+
+    def _get_eligible_items_ids(self, order_item, state, ignore_rare):
+        item_type = order_item['type']
+        key = (item_type, state, ignore_rare,
+               dump_canonical_json(order_item['requirements']))
+        if key not in self._eligible_items_ids:
+            eligible_items_queryset = \
+                self.item_tools.find_eligible_items_for_requirements(
+                    item_type,
+                    order_item['requirements'],
+                    self._get_state_queryset(item_type, state))
+            if ignore_rare:
+                non_rare_requirements = self.item_tools \
+                                            .item_types[item_type] \
+                                            .manager_class() \
+                                            .get_non_rare_requirements()
+                eligible_items_queryset = \
+                    eligible_items_queryset.filter(**non_rare_requirements)
+            self._eligible_items_ids[key] = frozenset(
+                eligible_items_queryset.values_list('id', flat=True))
+        return self._eligible_items_ids[key]
+
+    def get_candidate_items(self, order_item, excluded_items_ids,
+                            held_by_any=False,
+                            requires_maintenance_items=False,
+                            ignore_rare=False):
+        """Return the items which are eligible for an order item.
+
+        Items whose ids are in excluded_items_ids are skipped. Unless
+        held_by_any is set, only items which are held by nothing or are
+        pending (and so expected to be held by nothing soon) are returned.
+        The items are sorted by id so that the result does not depend on
+        the order in which the database happened to return them.
+        """
+        item_type = order_item['type']
+        state = self._get_state(requires_maintenance_items)
+        items = self._get_items(item_type, state)
+        eligible_items_ids = self._get_eligible_items_ids(
+            order_item, state, ignore_rare)
+        if held_by_any:
+            pending_items_ids = frozenset()
+        else:
+            pending_items_ids = self._get_pending_items_ids(item_type, state)
+
+        candidate_items = []
+        for item_id in sorted(eligible_items_ids):
+            if item_id in excluded_items_ids or item_id not in items:
+                continue
+
+            item = items[item_id]
+            if held_by_any or item.held_by_object_id is None or \
+                    item_id in pending_items_ids:
+                candidate_items.append(item)
+
+        return candidate_items
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-05-21 18:41
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+
+import yaml
+from bodega_core.requirements import (
+    dump_order_items_json, get_order_items_signature)
+from django.db import migrations, models
+
+
+def set_order_items_json(apps, schema_editor):
+    Order = apps.get_model('bodega_core', 'Order')
+    for order in Order.objects.all().iterator():
+        items_delta_order_updates = order.updates.exclude(
+            items_delta="").order_by('time_created')
+
+        items = OrderedDict()
+        for order_update in items_delta_order_updates:
+            items_delta = yaml.safe_load(order_update.items_delta)
+            for key in items_delta:
+                items[key] = items_delta[key]
+
+        if items:
+            Order.objects.filter(id=order.id).update(
+                items_json=dump_order_items_json(items),
+                items_signature=get_order_items_signature(items))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_core', '0013_network'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_json',
+            field=models.TextField(blank=True, default='', help_text='Items of the order in JSON format.'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_signature',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Signature of the items of the order, which is the same for orders requesting the same items.', max_length=40),
+        ),
+        migrations.RunPython(set_order_items_json,
+                             reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-05-23 22:05
+
+"""Migration for order prices and the TabDemand model.
+
+Existing live orders are priced by the fulfiller, which also accounts for
+them in TabDemand as it does so. Run the check_tab_demands command with
+--rebuild to do it all at once instead.
+"""
+
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_core', '0014_order_items_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='price',
+            field=models.FloatField(blank=True, help_text='Total price of the items of the order.', null=True),
+        ),
+        migrations.CreateModel(
+            name='TabDemand',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('open_orders_count', models.IntegerField(default=0)),
+                ('open_orders_price', models.FloatField(default=0.0)),
+                ('fulfilled_orders_count', models.IntegerField(default=0)),
+                ('fulfilled_orders_price', models.FloatField(default=0.0)),
+                ('tab',
+                 models.OneToOneField(on_delete=django.db.models.deletion.CASCADE,
+                                      related_name='demand',
+                                      to='bodega_core.Tab')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
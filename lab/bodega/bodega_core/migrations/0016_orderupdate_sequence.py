@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-05-29 17:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def set_order_update_sequences(apps, schema_editor):
+    Order = apps.get_model('bodega_core', 'Order')
+    OrderUpdate = apps.get_model('bodega_core', 'OrderUpdate')
+    for order in Order.objects.all().iterator():
+        order_updates = OrderUpdate.objects.filter(
+            order=order).order_by('time_created', 'id')
+        for sequence, order_update in enumerate(order_updates, start=1):
+            OrderUpdate.objects.filter(id=order_update.id).update(
+                sequence=sequence)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_core', '0015_tab_demand'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderupdate',
+            name='sequence',
+            field=models.PositiveIntegerField(default=0, help_text='Sequence number of this update within its order.'),
+        ),
+        migrations.RunPython(set_order_update_sequences,
+                             reverse_code=migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='orderupdate',
+            unique_together=set([('order', 'sequence')]),
+        ),
+    ]
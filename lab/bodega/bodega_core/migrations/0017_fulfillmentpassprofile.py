@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-06-01 18:40
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rkelery', '0002_remove_unique_constraint'),
+        ('bodega_core', '0016_orderupdate_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FulfillmentPassProfile',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('time_created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('seconds', models.FloatField()),
+                ('queries', models.IntegerField()),
+                ('orders', models.IntegerField(help_text='Number of open orders processed by the pass.')),
+                ('profile_json', models.TextField(blank=True, default='')),
+                ('task', models.ForeignKey(blank=True, help_text='Task which ran the fulfillment pass.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fulfillment_pass_profiles', to='rkelery.Task')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
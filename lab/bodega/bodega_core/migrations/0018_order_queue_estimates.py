@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-06-05 17:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_core', '0017_fulfillmentpassprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='estimated_fulfillment_time',
+            field=models.DateTimeField(blank=True, help_text='Estimated time the order will be fulfilled as of the last fulfillment pass.', null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='queue_position',
+            field=models.IntegerField(blank=True, help_text='Number of open orders ahead of this one as of the last fulfillment pass.', null=True),
+        ),
+    ]
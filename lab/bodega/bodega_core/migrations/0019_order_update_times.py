@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-06-08 11:27
+from __future__ import unicode_literals
+
+import datetime
+
+from django.db import migrations, models
+
+
+def set_order_update_times(apps, schema_editor):
+    Order = apps.get_model('bodega_core', 'Order')
+    for order in Order.objects.all().iterator():
+        time_limit = datetime.timedelta()
+        expiration_time_limit = datetime.timedelta()
+        fulfillment_time = None
+        number_of_ejection_notices = 0
+        last_ejection_notice_time = None
+        for order_update in order.updates.order_by('sequence'):
+            time_limit += order_update.time_limit_delta
+            expiration_time_limit += order_update.expiration_time_limit_delta
+            if order_update.new_status == 'FULFILLED':
+                fulfillment_time = order_update.time_created
+                number_of_ejection_notices = 0
+            if order_update.time_limit_notice:
+                last_ejection_notice_time = order_update.time_created
+                if fulfillment_time is not None:
+                    number_of_ejection_notices += 1
+
+        ejection_time = None
+        if fulfillment_time is not None:
+            ejection_time = fulfillment_time + time_limit
+        Order.objects.filter(id=order.id).update(
+            time_limit=time_limit,
+            expiration_time_limit=expiration_time_limit,
+            fulfillment_time=fulfillment_time,
+            ejection_time=ejection_time,
+            number_of_ejection_notices=number_of_ejection_notices,
+            last_ejection_notice_time=last_ejection_notice_time)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_core', '0018_order_queue_estimates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='ejection_time',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Time the fulfilled order will be closed automatically.', null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='expiration_time_limit',
+            field=models.DurationField(default=datetime.timedelta(0), help_text='Total time the order may stay open before it expires.'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='fulfillment_time',
+            field=models.DateTimeField(blank=True, help_text='Time the order was last fulfilled.', null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='last_ejection_notice_time',
+            field=models.DateTimeField(blank=True, help_text='Time of the latest ejection notice of the order.', null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='number_of_ejection_notices',
+            field=models.PositiveIntegerField(default=0, help_text='Number of ejection notices since the order was fulfilled.'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='time_limit',
+            field=models.DurationField(default=datetime.timedelta(0), help_text='Total time limit of the order once it is fulfilled.'),
+        ),
+        migrations.RunPython(set_order_update_times,
+                             reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-06-11 15:03
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+from django.db import migrations, models
+from pytz import utc
+
+
+def set_order_next_action_time(apps, schema_editor):
+    # Have the ejection manager schedule every fulfilled order from scratch.
+    Order = apps.get_model('bodega_core', 'Order')
+    Order.objects.filter(status='FULFILLED').update(
+        next_action_time=datetime.now(utc))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_core', '0019_order_update_times'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='next_action_time',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Time the next ejection notice or ejection of the order is due.', null=True),
+        ),
+        migrations.RunPython(set_order_next_action_time,
+                             reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-06-12 10:46
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def set_order_time_last_updated(apps, schema_editor):
+    Order = apps.get_model('bodega_core', 'Order')
+    for order in Order.objects.all().iterator():
+        latest_update = order.updates.order_by('-sequence').first()
+        if latest_update is not None:
+            Order.objects.filter(id=order.id).update(
+                time_last_updated=latest_update.time_created)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_core', '0020_order_next_action_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='time_last_updated',
+            field=models.DateTimeField(blank=True, help_text='Time of the latest update of the order.', null=True),
+        ),
+        migrations.RunPython(set_order_time_last_updated,
+                             reverse_code=migrations.RunPython.noop),
+    ]
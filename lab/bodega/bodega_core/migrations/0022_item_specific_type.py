@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-06-13 16:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def set_item_specific_type(apps, schema_editor):
+    Item = apps.get_model('bodega_core', 'Item')
+    for related_object in Item._meta.related_objects:
+        if not related_object.one_to_one or \
+                not related_object.field.remote_field.parent_link:
+            continue
+        field_name = related_object.name
+        Item.objects.filter(**{'%s__isnull' % field_name: False}).update(
+            specific_type=field_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_core', '0021_order_time_last_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='specific_type',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Name of the field holding the specific item.', max_length=64),
+        ),
+        migrations.RunPython(set_item_specific_type,
+                             reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-06-15 11:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bodega_core', '0022_item_specific_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='time_held_by_object_updated',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, help_text='The last time the holder of this object was updated.'),
+        ),
+    ]
@@ -11,12 +11,14 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import (
     GenericForeignKey, GenericRelation)
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
-from memoize import memoize
+from django.db import models, transaction
 from pytz import utc
 from rkelery.models import Task
 
 from sid_from_id.models import ModelWithSidFromId
+from .pricing import get_order_price
+from .requirements import (
+    dump_order_items_json, get_order_items_signature, load_order_items_json)
 
 log = logging.getLogger(__name__)
 
@@ -73,6 +75,40 @@ class Farm(BaseModel):
         raise NotImplementedError('Child class must implement can_grow')
 
 
+class FulfillmentPassProfile(BaseModel):
+    """A breakdown of where the time and queries of a fulfillment pass went.
+
+    The profile is compact JSON produced by bodega_core.profiling.PassProfiler,
+    with the totals also stored as columns to find slow passes by.
+    """
+
+    task = models.ForeignKey(Task,
+                             on_delete=models.SET_NULL,
+                             null=True,
+                             blank=True,
+                             related_name='fulfillment_pass_profiles',
+                             help_text='Task which ran the fulfillment pass.')
+
+    time_created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    seconds = models.FloatField(null=False)
+
+    queries = models.IntegerField(null=False)
+
+    orders = models.IntegerField(
+        null=False,
+        help_text='Number of open orders processed by the pass.')
+
+    profile_json = models.TextField(null=False, blank=True, default='')
+
+    def __str_additional_info_nvps__(self):
+        """Get additional name-value pairs for the string representation."""
+        return [
+            ('seconds', '%.3f' % self.seconds),
+            ('queries', self.queries)
+        ]
+
+
 class Item(BaseModel):
     """A generic item that can fulfill a part of an order."""
 
@@ -112,8 +148,27 @@ class Item(BaseModel):
         'held_by_content_type', 'held_by_object_id')
     time_held_by_object_updated = models.DateTimeField(
         auto_now_add=True,
+        db_index=True,
         help_text='The last time the holder of this object was updated.')
 
+    # The name of the field holding the specific item of this generic item,
+    # so finding it doesn't require probing every item type. It's set when
+    # a specific item is first saved and never changes.
+    specific_type = models.CharField(
+        blank=True,
+        db_index=True,
+        default='',
+        max_length=64,
+        help_text='Name of the field holding the specific item.')
+
+    def save(self, *args, **kwargs):
+        """Save the item, recording the type of a new specific item."""
+        if not self.specific_type:
+            parent_link = self._meta.parents.get(Item, None)
+            if parent_link is not None:
+                self.specific_type = parent_link.remote_field.name
+        return super(Item, self).save(*args, **kwargs)
+
     # An item should have a name, but rather than store a field for all items
     # each subtype should provide its own property implementation.
     @property
@@ -340,36 +395,150 @@ class Order(BaseModel):
 
     time_created = models.DateTimeField(auto_now_add=True)
 
-    @property
-    def first_few_updates(self):
-        return self.updates.order_by('time_created')[:10]
+    # The items of the order merged from all its updates, so that reading
+    # them doesn't require parsing every items_delta. These are maintained by
+    # OrderUpdate.save and shouldn't be written directly.
+    items_json = models.TextField(
+        blank=True,
+        default="",
+        null=False,
+        help_text='Items of the order in JSON format.')
 
-    @property
-    def earliest_update(self):
-        return self.updates.earliest('time_created')
+    items_signature = models.CharField(
+        blank=True,
+        db_index=True,
+        default="",
+        max_length=40,
+        help_text='Signature of the items of the order, which is the same '
+                  'for orders requesting the same items.')
 
-    @property
-    def latest_update(self):
-        return self.updates.latest('time_created')
+    # The total price of the items of the order, which is maintained along
+    # with items_json. It's null when the order couldn't be priced yet.
+    price = models.FloatField(
+        blank=True,
+        null=True,
+        help_text='Total price of the items of the order.')
 
-    @property
-    def time_last_updated(self):
-        return self.latest_update.time_created
+    # Estimates for open orders, which are refreshed by fulfillment passes.
+    queue_position = models.IntegerField(
+        blank=True,
+        null=True,
+        help_text='Number of open orders ahead of this one as of the last '
+                  'fulfillment pass.')
+
+    estimated_fulfillment_time = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text='Estimated time the order will be fulfilled as of the last '
+                  'fulfillment pass.')
+
+    # The time limits and ejection state of the order accumulated from its
+    # updates, so that reading them doesn't require walking every update.
+    # These are maintained by OrderUpdate.save and shouldn't be written
+    # directly.
+    time_limit = models.DurationField(
+        default=timedelta(),
+        help_text='Total time limit of the order once it is fulfilled.')
+
+    expiration_time_limit = models.DurationField(
+        default=timedelta(),
+        help_text='Total time the order may stay open before it expires.')
+
+    fulfillment_time = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text='Time the order was last fulfilled.')
+
+    ejection_time = models.DateTimeField(
+        blank=True,
+        db_index=True,
+        null=True,
+        help_text='Time the fulfilled order will be closed automatically.')
+
+    number_of_ejection_notices = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of ejection notices since the order was '
+                  'fulfilled.')
+
+    last_ejection_notice_time = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text='Time of the latest ejection notice of the order.')
+
+    # When the ejection manager should next look at the order, which is
+    # reset by updates changing its time limit or status. The ejection
+    # manager schedules it from there, so unlike the fields above it isn't
+    # derived from the updates alone.
+    next_action_time = models.DateTimeField(
+        blank=True,
+        db_index=True,
+        null=True,
+        help_text='Time the next ejection notice or ejection of the order '
+                  'is due.')
+
+    time_last_updated = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text='Time of the latest update of the order.')
+
+    UPDATE_TIME_FIELDS = ('time_limit', 'expiration_time_limit',
+                          'fulfillment_time', 'ejection_time',
+                          'number_of_ejection_notices',
+                          'last_ejection_notice_time', 'time_last_updated')
+
+    # Saving any of these fields may change the demand of the order's tab.
+    TAB_DEMAND_FIELDS = frozenset(['maintenance', 'price', 'status', 'tab',
+                                   'tab_id'])
+
+    def save(self, *args, **kwargs):
+        """Save the order, keeping the TabDemand of its tab up to date.
+
+        Updates which don't touch any field the demand depends on, like the
+        periodic tab_based_priority updates, are saved as usual.
+        """
+        update_fields = kwargs.get('update_fields', None)
+        if update_fields is not None and \
+                not self.TAB_DEMAND_FIELDS.intersection(update_fields):
+            return super(Order, self).save(*args, **kwargs)
+
+        demand_field_names = ['maintenance', 'price', 'status', 'tab_id']
+        with transaction.atomic():
+            previous_values = None
+            if self.pk is not None:
+                previous_values = Order.objects.select_for_update() \
+                    .filter(pk=self.pk) \
+                    .values(*demand_field_names) \
+                    .first()
+
+            super(Order, self).save(*args, **kwargs)
+
+            current_values = {
+                field_name: getattr(self, field_name)
+                for field_name in demand_field_names
+            }
+            if previous_values is not None and update_fields is not None:
+                # Fields which weren't saved keep their previous values in
+                # the database regardless of the values on this instance.
+                for field_name in demand_field_names:
+                    if field_name not in update_fields and \
+                            field_name.replace('_id', '') not in update_fields:
+                        current_values[field_name] = \
+                            previous_values[field_name]
+
+            TabDemand.objects.apply_order_change(previous_values,
+                                                 current_values)
 
     @property
-    def fulfillment_time(self):
-        fulfillment_updates = self.updates.filter(
-            new_status=self.STATUS_FULFILLED)
-        if fulfillment_updates.exists():
-            return fulfillment_updates.latest(
-                'time_created').time_created
+    def first_few_updates(self):
+        return self.updates.order_by('sequence')[:10]
 
-        return None
+    @property
+    def earliest_update(self):
+        return self.updates.earliest('sequence')
 
     @property
-    def number_of_ejection_notices(self):
-        fulfillment_time = self.fulfillment_time
-        return self.number_of_ejection_notices_since_time(fulfillment_time)
+    def latest_update(self):
+        return self.updates.latest('sequence')
 
     def number_of_ejection_notices_since_time(self, time):
         if not time:
@@ -378,112 +547,73 @@ class Order(BaseModel):
             time_created__lt=time).exclude(
                 time_limit_notice=False).count()
 
-    @property
-    def last_ejection_notice_time(self):
-        ejection_notices_order_updates = \
-            self.updates.exclude(time_limit_notice=False)
-
-        if ejection_notices_order_updates.exists():
-            return ejection_notices_order_updates.latest(
-                'time_created').time_created
-        return None
-
     @property
     def last_extension_time(self):
         all_time_limit_updates = self.updates.exclude(
             time_limit_delta=timedelta())
         return all_time_limit_updates.latest('id').time_created
 
-    @memoize(timeout=timedelta(hours=6).total_seconds())
-    def time_limit_as_of_update(self, order_update):
-        """Calculate time_limit as of the specified update.
-
-        This is memoized because it can become expensive if an order
-        accumulates many many updates. By memoizing with a given update as
-        a parameter, we ensure that the time_limit property below will
-        always get a fresh result if there has been a newer update. This is
-        important for driving the timing of ejection, notices, etc.
-
-        Similar to the technique described in rkelery.SynchronizedTask, we
-        use the update ID instead of timestamp because the ID is guaranteed
-        monotonically increasing. This avoids potential bugs / ambiguity of
-        calculating different totals if two updates are very close together.
-
-        Since order updates are immutable, there's no chance of a memoized
-        value becoming incorrect after time passes so we could theoretically
-        keep them in the cache forever. However, we'd rather give the cache
-        better hints about what can expire and be evicted to make room for
-        other entries, especially since all our use cases only really care to
-        get the value as of the latest update.
-
-        Theoreticaly we could also get cute and implement these aggregations
-        recursively to basically achieve dynamic programming. However, that's
-        not expected to be any benefit since all our use cases only care about
-        the value of the latest update, so it's not worth the complexity / risk
-        of a corrupt cache entry that silently makes the computation incorrect.
-        Dynamic programming would also create a lot more entries in the cache
-        which take up space that would be better used for other entries.
-        """
-        all_time_limit_updates = self.updates.exclude(
-            time_limit_delta=timedelta())
-        considered_time_limit_updates = all_time_limit_updates.filter(
-            id__lte=order_update.id)
-
-        log.debug(
-            ('Computing time limit for %s ' % self) +
-            ('up to the point of update %s. ' % order_update) +
-            ('This covers %d updates and may be expensive.' %
-             considered_time_limit_updates.count()))
-        time_limit = timedelta()
-        for update in considered_time_limit_updates:
-            time_limit += update.time_limit_delta
-
-        return time_limit
-
-    @property
-    def time_limit(self):
-        """Get the current time limit (as of the latest update)."""
-        all_time_limit_updates = self.updates.exclude(
-            time_limit_delta=timedelta())
-        return self.time_limit_as_of_update(
-            all_time_limit_updates.latest('id'))
-
-    @property
-    def ejection_time(self):
-        fulfillment_time = self.fulfillment_time
-
-        if fulfillment_time:
-            return self.fulfillment_time + self.time_limit
-        return None
+    def apply_update_times(self, order_update):
+        """Accumulate the time limits and ejection state of a new update.
 
-    @memoize(timeout=timedelta(hours=6).total_seconds())
-    def expiration_time_limit_as_of_update(self, order_update):
-        """Calculate expiration time limit as of the specified update.
-
-        See description in time_limit_as_of_update for the same technique
-        being applied here.
+        This only changes the fields on this instance. Notices only count
+        towards number_of_ejection_notices once the order is fulfilled, and
+        fulfilling the order again starts counting them from scratch.
         """
-        all_expiration_time_limit_updates = self.updates.exclude(
-            expiration_time_limit_delta=timedelta())
-        considered_expiration_time_limit_updates = (
-            all_expiration_time_limit_updates.filter(id__lte=order_update.id))
-
-        log.debug(
-            ('Computing expiration time limit for %s ' % self) +
-            ('up to the point of update %s. ' % order_update) +
-            ('This covers %d updates and may be expensive.' %
-             considered_expiration_time_limit_updates.count()))
-        expiration_time_limit = timedelta()
-        for update in considered_expiration_time_limit_updates:
-            expiration_time_limit += update.expiration_time_limit_delta
-        return expiration_time_limit
-
-    @property
-    def expiration_time_limit(self):
-        all_expiration_time_limit_updates = self.updates.exclude(
-            expiration_time_limit_delta=timedelta())
-        return self.expiration_time_limit_as_of_update(
-            all_expiration_time_limit_updates.latest('id'))
+        self.time_last_updated = order_update.time_created
+        self.time_limit += order_update.time_limit_delta
+        self.expiration_time_limit += order_update.expiration_time_limit_delta
+        if order_update.new_status == self.STATUS_FULFILLED:
+            self.fulfillment_time = order_update.time_created
+            self.number_of_ejection_notices = 0
+        if order_update.time_limit_notice:
+            self.last_ejection_notice_time = order_update.time_created
+            if self.fulfillment_time is not None:
+                self.number_of_ejection_notices += 1
+
+        self.ejection_time = None
+        if self.fulfillment_time is not None:
+            self.ejection_time = self.fulfillment_time + self.time_limit
+
+        if order_update.new_status == self.STATUS_CLOSED:
+            self.next_action_time = None
+        elif order_update.new_status or order_update.time_limit_notice or \
+                order_update.time_limit_delta:
+            # Have the ejection manager reschedule the order from its new
+            # times.
+            self.next_action_time = order_update.time_created
+
+    def get_update_times_from_updates(self):
+        """Compute the time limits and ejection state from every update.
+
+        This walks every update so it's only meant for rebuilding the
+        materialized fields and checking them for drift.
+        """
+        order = Order()
+        for order_update in self.updates.order_by('sequence'):
+            order.apply_update_times(order_update)
+        return {
+            field_name: getattr(order, field_name)
+            for field_name in self.UPDATE_TIME_FIELDS
+        }
+
+    def rebuild_update_times(self):
+        """Recompute and save the time limits and ejection state.
+
+        Orders scheduled by the ejection manager are made due right away so
+        they're rescheduled from the rebuilt times.
+        """
+        with transaction.atomic():
+            list(Order.objects.select_for_update()
+                              .filter(id=self.id)
+                              .values_list('id', flat=True))
+            for field_name, value in \
+                    self.get_update_times_from_updates().items():
+                setattr(self, field_name, value)
+            if self.next_action_time is not None:
+                self.next_action_time = datetime.now(utc)
+            self.save(update_fields=self.UPDATE_TIME_FIELDS +
+                      ('next_action_time',))
 
     @property
     def expiration_time(self):
@@ -491,8 +621,17 @@ class Order(BaseModel):
 
     @property
     def fulfilled_items(self):
-        item_fulfillments = ItemFulfillment.objects.filter(
-            order_update__order=self)
+        # Listings prefetch the updates with item fulfillments into
+        # fulfilling_updates to avoid a query per order.
+        if hasattr(self, 'fulfilling_updates'):
+            item_fulfillments = [
+                item_fulfillment
+                for order_update in self.fulfilling_updates
+                for item_fulfillment in order_update.item_fulfillments.all()
+            ]
+        else:
+            item_fulfillments = ItemFulfillment.objects.filter(
+                order_update__order=self)
         items_dict = OrderedDict()
         for item_fulfillment in sorted(item_fulfillments,
                                        key=attrgetter('nickname')):
@@ -501,13 +640,14 @@ class Order(BaseModel):
 
     # TODO(stefan): This only supports adding items to the order.
     # Needs to be changed when we support deleting items as an update
-    # When (or maybe if) we ever support adding items after an order is placed,
-    # this computation running through all updates may become slow and need
-    # memoization treatment similar to time_limit above.
-    @property
-    def items(self):
+    def merge_items_from_updates(self):
+        """Merge the items of all updates with an items_delta.
+
+        This parses every items_delta so it's only meant for maintaining
+        items_json, and for orders whose items_json hasn't been populated.
+        """
         items_delta_order_updates = self.updates.exclude(
-            items_delta="").order_by('time_created')
+            items_delta="").order_by('sequence')
 
         items_dict = OrderedDict()
         for order_update in items_delta_order_updates:
@@ -517,6 +657,24 @@ class Order(BaseModel):
 
         return items_dict
 
+    def set_items(self, items):
+        """Materialize the given items on this order and save them."""
+        self.items_json = dump_order_items_json(items)
+        self.items_signature = get_order_items_signature(items)
+        try:
+            self.price = get_order_price(items)
+        except Exception:
+            # The fulfiller prices orders which are still missing a price.
+            log.warning('Could not price %s.' % self, exc_info=True)
+            self.price = None
+        self.save(update_fields=['items_json', 'items_signature', 'price'])
+
+    @property
+    def items(self):
+        if self.items_json:
+            return load_order_items_json(self.items_json)
+        return self.merge_items_from_updates()
+
     @property
     def changed_item_state_to_maintenance(self):
         # Items cannot be added to the maintenance order after it is created
@@ -585,6 +743,66 @@ class OrderUpdate(BaseModel):
     # OrderUpdate was used to notify the user of impending ejection
     time_limit_notice = models.BooleanField(default=False)
 
+    # Position of this update among the updates of its order, starting at 1.
+    # Updates are ordered by sequence rather than by time_created, which may
+    # be equal for updates created in quick succession.
+    sequence = models.PositiveIntegerField(
+        default=0,
+        help_text='Sequence number of this update within its order.')
+
+    class Meta:
+        """Metadata for OrderUpdate."""
+
+        unique_together = ('order', 'sequence')
+
+    def _get_next_sequence(self):
+        """Return the sequence number for a new update of the order.
+
+        This must run in a transaction. Locking the order's row until the
+        transaction ends makes concurrent updates of the same order take
+        turns, so they get distinct sequence numbers and accumulate their
+        times onto the latest values. Those are refreshed on the order
+        instance in case it was loaded before the lock.
+        """
+        update_times = Order.objects.select_for_update() \
+            .filter(id=self.order_id) \
+            .values(*Order.UPDATE_TIME_FIELDS) \
+            .get()
+        for field_name, value in update_times.items():
+            setattr(self.order, field_name, value)
+        latest_sequence = OrderUpdate.objects.filter(
+            order_id=self.order_id).aggregate(
+                latest_sequence=models.Max('sequence'))['latest_sequence']
+        return (latest_sequence or 0) + 1
+
+    def save(self, *args, **kwargs):
+        """Save the update, materializing its changes on its order.
+
+        Updates aren't expected to change once created, but if one does then
+        the order's times are rebuilt from all its updates.
+        """
+        if self.pk is not None:
+            with transaction.atomic():
+                super(OrderUpdate, self).save(*args, **kwargs)
+                self.order.rebuild_update_times()
+            return
+
+        with transaction.atomic():
+            self.sequence = self._get_next_sequence()
+            items = None
+            if self.items_delta:
+                items = self.order.items
+                items_delta = yaml.safe_load(self.items_delta)
+                for key in items_delta:
+                    items[key] = items_delta[key]
+
+            super(OrderUpdate, self).save(*args, **kwargs)
+            self.order.apply_update_times(self)
+            self.order.save(update_fields=Order.UPDATE_TIME_FIELDS +
+                            ('next_action_time',))
+            if items is not None:
+                self.order.set_items(items)
+
 
 class Seed(BaseModel):
     """Generic class representing the source for individual Farm Items."""
@@ -607,6 +825,75 @@ class Stockroom(BaseModel):
                                  help_text='Location of the stockroom')
 
 
+class TabDemandManager(models.Manager):
+    def _add_order_values(self, order_values, sign):
+        if order_values is None or order_values['maintenance'] or \
+                order_values['price'] is None:
+            return
+
+        if order_values['status'] == Order.STATUS_OPEN:
+            count_field_name = 'open_orders_count'
+            price_field_name = 'open_orders_price'
+        elif order_values['status'] == Order.STATUS_FULFILLED:
+            count_field_name = 'fulfilled_orders_count'
+            price_field_name = 'fulfilled_orders_price'
+        else:
+            return
+
+        self.get_or_create(tab_id=order_values['tab_id'])
+        self.filter(tab_id=order_values['tab_id']).update(**{
+            count_field_name: models.F(count_field_name) + sign,
+            price_field_name:
+                models.F(price_field_name) + sign * order_values['price']
+        })
+
+    def apply_order_change(self, previous_values, current_values):
+        """Move an order's price between the totals of the tabs.
+
+        previous_values and current_values are dictionaries of the order's
+        maintenance, price, status, and tab_id fields before and after the
+        change. previous_values is None for a new order.
+        """
+        if previous_values == current_values:
+            return
+
+        self._add_order_values(previous_values, -1)
+        self._add_order_values(current_values, 1)
+
+
+class TabDemand(BaseModel):
+    """Running totals of the prices of a tab's live orders.
+
+    Price-based priority needs the total price of each tab's OPEN and
+    FULFILLED orders. Instead of pricing every live order on every pass,
+    these totals are updated whenever an order is saved. Maintenance orders
+    and orders which haven't been priced yet don't count towards them.
+    """
+
+    objects = TabDemandManager()
+
+    tab = models.OneToOneField('Tab',
+                               on_delete=models.CASCADE,
+                               null=False,
+                               related_name='demand')
+
+    open_orders_count = models.IntegerField(default=0, null=False)
+
+    open_orders_price = models.FloatField(default=0.0, null=False)
+
+    fulfilled_orders_count = models.IntegerField(default=0, null=False)
+
+    fulfilled_orders_price = models.FloatField(default=0.0, null=False)
+
+    @property
+    def live_orders_count(self):
+        return self.open_orders_count + self.fulfilled_orders_count
+
+    @property
+    def live_orders_price(self):
+        return self.open_orders_price + self.fulfilled_orders_price
+
+
 class Tab(BaseModel):
     """A Tab belonging to a User used to calculate fulfillment priority."""
 
@@ -0,0 +1,98 @@
+"""Plan how to create items from recipes during a fulfillment pass."""
+import logging
+
+from .requirements import get_requirements_signature
+
+log = logging.getLogger(__name__)
+
+
+class RecipePlanner(object):
+    """Remember recipe lookups and ingredient searches for a single pass.
+
+    Many open orders often ask for items with identical requirements, such
+    as the orders of a release pipeline run. Without a planner, each of them
+    looks up the same recipe and searches for the same ingredients from
+    scratch. Plans are keyed by the signature of the item type and its
+    requirements so each distinct request is worked out once per pass.
+
+    Items are only ever assigned, never returned, during a pass, so once a
+    search for the ingredients of a request came up short it would come up at
+    least as short for every identical request after it. Such failures are
+    remembered and the nicknames which couldn't be satisfied are reused
+    instead of searching again. For the same reason, the candidates found by
+    a successful search are still the only candidates for identical requests
+    once the items assigned since are skipped, so they're remembered and
+    chosen from again. Creator tasks are decided once per request as well,
+    though each request still gets a task signature of its own.
+    """
+
+    def __init__(self, item_tools, inventory):
+        """Create an empty planner for the pass using the given inventory."""
+        self.item_tools = item_tools
+        self.inventory = inventory
+        self._recipes = {}
+        self._unfulfilled_ingredient_nicknames = {}
+        self._ingredient_candidates = {}
+        self._creator_tasks = {}
+        self.num_recipe_lookups = 0
+        self.num_reused_searches = 0
+        self.num_reused_selections = 0
+
+    def get_signature(self, item_type, item_requirements):
+        return get_requirements_signature(item_type, item_requirements)
+
+    def get_recipe(self, signature, item_type, item_requirements):
+        """Return the recipe and its required ingredients for a request.
+
+        The recipe is None if the item type can't be created on the fly. The
+        required ingredients are looked up once since recipes may compute
+        them on every access.
+        """
+        if signature not in self._recipes:
+            self.num_recipe_lookups += 1
+            item_manager = \
+                self.item_tools.item_types[item_type].manager_class()
+            recipe = item_manager.get_item_recipe(item_requirements)
+            required_ingredients = None
+            if recipe:
+                required_ingredients = recipe.required_ingredients
+            self._recipes[signature] = (recipe, required_ingredients)
+        return self._recipes[signature]
+
+    def get_unfulfilled_ingredient_nicknames(self, signature):
+        """Return the ingredients a previous search couldn't satisfy.
+
+        Returns None if no search for the request has failed yet.
+        """
+        unfulfilled_nicknames = \
+            self._unfulfilled_ingredient_nicknames.get(signature, None)
+        if unfulfilled_nicknames is not None:
+            self.num_reused_searches += 1
+        return unfulfilled_nicknames
+
+    def set_unfulfilled_ingredient_nicknames(self, signature,
+                                             unfulfilled_nicknames):
+        self._unfulfilled_ingredient_nicknames[signature] = \
+            list(unfulfilled_nicknames)
+
+    def get_ingredient_candidates(self, signature):
+        """Return the candidate ingredients found by a previous search.
+
+        Returns None if no search for the request has succeeded yet. The
+        candidates include items which have been assigned since, which the
+        caller needs to skip.
+        """
+        candidate_items = self._ingredient_candidates.get(signature, None)
+        if candidate_items is not None:
+            self.num_reused_selections += 1
+        return candidate_items
+
+    def set_ingredient_candidates(self, signature, candidate_items):
+        self._ingredient_candidates[signature] = dict(candidate_items)
+
+    def get_creator_task(self, signature, recipe, item_requirements):
+        """Return the task which creates the item of a request."""
+        if signature not in self._creator_tasks:
+            self._creator_tasks[signature] = \
+                recipe.creator_task(item_requirements)
+        return self._creator_tasks[signature]
@@ -0,0 +1,100 @@
+"""Price items and orders wherever an ItemTools instance isn't at hand.
+
+Models need to price orders when their items are written, but the item types
+are only defined by the apps building on bodega_core. Every ItemTools
+registers its item types here when it's created.
+
+Prices are asked for every live order on every fulfillment pass and every
+time an order or tab is rendered, while they only change with the price
+constants of the item managers and, for some item types, with the items in
+inventory. Each item type gets a single manager, and prices are remembered
+per signature of the item type and its requirements. Remembered prices are
+dropped when items are created or deleted in this process, when their item
+type is registered with a different manager class, and after
+ITEM_PRICE_CACHE_TIMEOUT to catch inventory changes made by other processes.
+Call invalidate_item_prices to drop them explicitly.
+"""
+import logging
+import time
+
+from django.conf import settings
+
+from .exceptions import bodega_value_error
+from .requirements import get_requirements_signature
+
+log = logging.getLogger(__name__)
+
+_item_types = {}
+_item_managers = {}
+# Item type name -> requirements signature -> (price, time it was computed).
+_item_prices = {}
+
+
+def register_item_types(item_types):
+    for item_type in item_types:
+        registered_item_type = _item_types.get(item_type.name, None)
+        if registered_item_type is not None and \
+                registered_item_type.manager_class is not \
+                item_type.manager_class:
+            _item_managers.pop(item_type.name, None)
+            invalidate_item_prices(item_type.name)
+        _item_types[item_type.name] = item_type
+
+
+def invalidate_item_prices(item_type_name=None):
+    """Forget the prices of an item type, or of every item type if None."""
+    if item_type_name is None:
+        _item_prices.clear()
+    else:
+        _item_prices.pop(item_type_name, None)
+
+
+def _get_item_manager(item_type_name):
+    if item_type_name not in _item_managers:
+        _item_managers[item_type_name] = \
+            _item_types[item_type_name].manager_class()
+    return _item_managers[item_type_name]
+
+
+def get_item_price(item_type_name, requirements):
+    """Return the price of an item of a type with the given requirements."""
+    if item_type_name not in _item_types:
+        bodega_value_error(
+            log,
+            'Cannot price item_type=%s because it was not registered.'
+            % repr(item_type_name))
+
+    item_type_prices = _item_prices.setdefault(item_type_name, {})
+    signature = get_requirements_signature(item_type_name, requirements)
+    now = time.time()
+    if signature in item_type_prices:
+        price, time_computed = item_type_prices[signature]
+        if now - time_computed < \
+                settings.ITEM_PRICE_CACHE_TIMEOUT.total_seconds():
+            return price
+
+    price = _get_item_manager(item_type_name).get_item_price(requirements)
+    item_type_prices[signature] = (price, now)
+    return price
+
+
+def get_item_prices(order_items):
+    """Return a dictionary of the price of each item of an order by nickname.
+
+    order_items is an iterable of (nickname, order item) tuples.
+    """
+    item_prices = {}
+    for nickname, order_item in order_items:
+        if order_item['type'] not in _item_types:
+            bodega_value_error(
+                log,
+                'Cannot price %s because item_type=%s was not registered.'
+                % (repr(nickname), repr(order_item['type'])))
+        item_prices[nickname] = \
+            get_item_price(order_item['type'], order_item['requirements'])
+    return item_prices
+
+
+def get_order_price(order_items):
+    """Return the total price of all the items of an order."""
+    return sum(get_item_prices(order_items.items()).values(), 0.0)
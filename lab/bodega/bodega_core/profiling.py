@@ -0,0 +1,223 @@
+"""Break down where the time and queries of a fulfillment pass go."""
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.db import connection
+from instrumentation.utils import increment_counter, record_timing
+from pytz import utc
+
+from .models import FulfillmentPassProfile
+from .requirements import dump_canonical_json
+
+log = logging.getLogger(__name__)
+
+STAT_PREFIX = 'fulfillment_pass'
+# How many of the slowest orders to keep in a profile.
+NUM_SLOWEST_ORDERS = 10
+
+
+class _CountingCursor(object):
+    """A cursor wrapper which counts the queries executed through it."""
+
+    def __init__(self, cursor, profiler):
+        """Wrap cursor, counting its queries on profiler."""
+        self.cursor = cursor
+        self.profiler = profiler
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_trace):
+        self.close()
+
+    def callproc(self, *args, **kwargs):
+        self.profiler._num_queries += 1
+        return self.cursor.callproc(*args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        self.profiler._num_queries += 1
+        return self.cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self.profiler._num_queries += 1
+        return self.cursor.executemany(*args, **kwargs)
+
+
+# The methods a connection wraps its cursors with, depending on whether it
+# logs queries.
+_CURSOR_FACTORY_NAMES = ('make_cursor', 'make_debug_cursor')
+
+
+class PassProfiler(object):
+    """Accumulate the time and queries of the phases of one pass.
+
+    Phases may nest, and a phase which is entered several times accumulates
+    across all of them. Queries are only counted while the profiler itself is
+    entered as a context manager, which wraps the cursors of the connection
+    to count queries without logging them. Otherwise only time is measured,
+    which costs next to nothing, so a FulfillmentManager can always have a
+    profiler.
+    """
+
+    def __init__(self, num_slowest_orders=NUM_SLOWEST_ORDERS):
+        """Create an empty profile."""
+        self.num_slowest_orders = num_slowest_orders
+        self.phases = defaultdict(lambda: {'seconds': 0.0, 'queries': 0})
+        self.item_types = defaultdict(
+            lambda: {'orders': 0, 'seconds': 0.0, 'queries': 0})
+        self.orders = []
+        self._current_order_record = None
+        self.seconds = 0.0
+        self.queries = 0
+        self._num_queries = 0
+        self._is_counting_queries = False
+        self._start_time = None
+
+    def _get_num_queries(self):
+        if not self._is_counting_queries:
+            return 0
+        return self._num_queries
+
+    def _wrap_cursor_factory(self, make_cursor):
+        def make_counting_cursor(cursor):
+            return _CountingCursor(make_cursor(cursor), self)
+        return make_counting_cursor
+
+    def __enter__(self):
+        self._num_queries = 0
+        for name in _CURSOR_FACTORY_NAMES:
+            setattr(connection, name,
+                    self._wrap_cursor_factory(getattr(connection, name)))
+        self._is_counting_queries = True
+        self._start_time = time.time()
+        return self
+
+    def __exit__(self, exception_type, exception_value, exception_trace):
+        try:
+            self.seconds = time.time() - self._start_time
+            self.queries = self._get_num_queries()
+        finally:
+            self._is_counting_queries = False
+            # Drop the wrappers set on the connection so its own methods
+            # are used again.
+            for name in _CURSOR_FACTORY_NAMES:
+                delattr(connection, name)
+        return False
+
+    @contextmanager
+    def phase(self, name):
+        """Measure a named phase of the pass."""
+        start_time = time.time()
+        start_queries = self._get_num_queries()
+        try:
+            yield
+        finally:
+            seconds = time.time() - start_time
+            phase = self.phases[name]
+            phase['seconds'] += seconds
+            phase['queries'] += self._get_num_queries() - start_queries
+            if self._current_order_record is not None:
+                order_phases = self._current_order_record['phases']
+                order_phases[name] = order_phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def order(self, order, order_items):
+        """Measure processing a single order.
+
+        The time of phases measured while processing the order is also
+        broken down per order, and set_order_outcome records what came of it,
+        so the slowest orders show why they were slow.
+        """
+        start_time = time.time()
+        start_queries = self._get_num_queries()
+        record = {
+            'order': str(order.sid),
+            'item_types': sorted(set(order_item['type'] for order_item
+                                     in order_items.values())),
+            'nicknames': len(order_items),
+            'outcome': 'unknown',
+            'phases': {}
+        }
+        self._current_order_record = record
+        try:
+            yield
+        except Exception:
+            record['outcome'] = 'error'
+            raise
+        finally:
+            self._current_order_record = None
+            record['seconds'] = time.time() - start_time
+            record['queries'] = self._get_num_queries() - start_queries
+            self.orders.append(record)
+            for item_type in record['item_types']:
+                item_type_stats = self.item_types[item_type]
+                item_type_stats['orders'] += 1
+                item_type_stats['seconds'] += record['seconds']
+                item_type_stats['queries'] += record['queries']
+
+    def set_order_outcome(self, outcome, **details):
+        """Record what came of processing the current order, if any."""
+        if self._current_order_record is not None:
+            self._current_order_record['outcome'] = outcome
+            self._current_order_record.update(details)
+
+    def get_slowest_orders(self):
+        return sorted(self.orders,
+                      key=lambda record: record['seconds'],
+                      reverse=True)[:self.num_slowest_orders]
+
+    def get_profile(self):
+        """Return the profile as a dictionary which can be dumped to JSON."""
+        outcomes = defaultdict(int)
+        for record in self.orders:
+            outcomes[record['outcome']] += 1
+        return {
+            'seconds': self.seconds,
+            'queries': self.queries,
+            'phases': dict(self.phases),
+            'item_types': dict(self.item_types),
+            'orders': len(self.orders),
+            'outcomes': dict(outcomes),
+            'slowest_orders': self.get_slowest_orders()
+        }
+
+    def dump_profile_json(self):
+        return dump_canonical_json(self.get_profile())
+
+    def publish(self):
+        """Publish the breakdown of the pass to statsd."""
+        increment_counter('%s.executed' % STAT_PREFIX)
+        record_timing(STAT_PREFIX, int(self.seconds * 1000))
+        increment_counter('%s.queries' % STAT_PREFIX, self.queries)
+        for name, phase in self.phases.items():
+            record_timing('%s.phases.%s' % (STAT_PREFIX, name),
+                          int(phase['seconds'] * 1000))
+            increment_counter('%s.phases.%s.queries' % (STAT_PREFIX, name),
+                              phase['queries'])
+        for item_type, item_type_stats in self.item_types.items():
+            record_timing('%s.item_types.%s' % (STAT_PREFIX, item_type),
+                          int(item_type_stats['seconds'] * 1000))
+            increment_counter(
+                '%s.item_types.%s.queries' % (STAT_PREFIX, item_type),
+                item_type_stats['queries'])
+
+    def save(self, task, retention):
+        """Store the profile for task and forget profiles past retention."""
+        profile = FulfillmentPassProfile.objects.create(
+            task=task,
+            seconds=self.seconds,
+            queries=self.queries,
+            orders=len(self.orders),
+            profile_json=self.dump_profile_json())
+        FulfillmentPassProfile.objects.filter(
+            time_created__lt=datetime.now(utc) - retention).delete()
+        return profile
@@ -0,0 +1,112 @@
+"""Compile item requirements into reusable filters.
+
+Item eligibility is defined by the django-filter FilterSet of each item type,
+but building a FilterSet validates the requirements and introspects its
+filters every time. Requirements are instead compiled once per item type and
+requirements signature into a Q for the filters which are plain field
+lookups, plus the remaining filters with their cleaned values, which apply
+to any queryset without rebuilding anything.
+
+Compiled requirements can also match an item in memory when all of their
+filters are exact lookups of the item's own fields. Strings are compared
+case-insensitively like the default SQL Server collation, so a match in
+memory is never stricter than the database.
+"""
+import logging
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils.six import string_types
+from django_filters.filters import (
+    EMPTY_VALUES, ChoiceFilter, Filter, Lookup)
+
+log = logging.getLogger(__name__)
+
+# The types of cleaned values which can be compared in memory.
+MATCHABLE_VALUE_TYPES = string_types + (bool, int, float, Decimal)
+
+
+def _is_lookup_filter(filter_):
+    """Return whether a filter is a plain lookup on its field.
+
+    Filters with a method or their own filter implementation, like the SID
+    filter, may do anything with the queryset. Choice filters only add a
+    value standing for null.
+    """
+    return filter_.method is None and \
+        type(filter_).filter in (Filter.filter, ChoiceFilter.filter) and \
+        'filter' not in vars(filter_)
+
+
+class CompiledRequirements(object):
+    def __init__(self, filter_class, requirements, queryset):
+        """Compile requirements with the filter class of an item type."""
+        self.filter_class = filter_class
+        self.requirements = requirements
+        self._filterset = filter_class(requirements, queryset)
+        self.is_valid = self._filterset.form.is_valid()
+        self.q = Q()
+        self.distinct = False
+        self._custom_filters = []
+        self._matchers = []
+        self.is_matchable = self.is_valid
+        if not self.is_valid:
+            return
+
+        cleaned_data = self._filterset.form.cleaned_data
+        for name, filter_ in sorted(self._filterset.filters.items()):
+            value = cleaned_data.get(name)
+            is_null_choice = isinstance(filter_, ChoiceFilter) and \
+                value == filter_.null_value
+            if value in EMPTY_VALUES and not is_null_choice:
+                # Like the FilterSet, ignore filters without a value, which
+                # are all the ones left out of the requirements.
+                continue
+            if not _is_lookup_filter(filter_) or isinstance(value, Lookup):
+                self._custom_filters.append((filter_, value))
+                self.is_matchable = False
+                continue
+            if is_null_choice:
+                value = None
+
+            lookup = {'%s__%s' % (filter_.name, filter_.lookup_expr): value}
+            self.q &= ~Q(**lookup) if filter_.exclude else Q(**lookup)
+            self.distinct = self.distinct or filter_.distinct
+            if filter_.lookup_expr == 'exact' and not filter_.exclude and \
+                    '__' not in filter_.name and \
+                    isinstance(value, MATCHABLE_VALUE_TYPES):
+                self._matchers.append((filter_.name, value))
+            else:
+                self.is_matchable = False
+
+    def filter(self, queryset):
+        """Return the items of queryset which satisfy the requirements."""
+        if not self.is_valid:
+            # Leave it to the FilterSet to decide what invalid requirements
+            # return.
+            return self.filter_class(self.requirements, queryset).qs
+
+        if self.distinct:
+            queryset = queryset.distinct()
+        queryset = queryset.filter(self.q)
+        for filter_, value in self._custom_filters:
+            queryset = filter_.filter(queryset, value)
+        return queryset
+
+    def matches(self, item):
+        """Return whether an item satisfies the requirements.
+
+        Returns None if that can't be told without querying the database.
+        """
+        if not self.is_matchable:
+            return None
+
+        for name, value in self._matchers:
+            item_value = getattr(item, name, None)
+            if isinstance(value, string_types) and \
+                    isinstance(item_value, string_types):
+                if item_value.lower() != value.lower():
+                    return False
+            elif item_value != value:
+                return False
+        return True
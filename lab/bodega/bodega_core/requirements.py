@@ -0,0 +1,50 @@
+"""Canonical forms of item requirements.
+
+Two order items with the same type and requirements, regardless of how their
+keys happened to be ordered when they were submitted, have the same signature.
+Signatures are used as cache and index keys wherever we want to treat equal
+requirements the same way without comparing dictionaries.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+
+
+def dump_canonical_json(value):
+    """Return compact JSON for value with keys in a canonical order."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+
+def dump_order_items_json(order_items):
+    """Return compact JSON for order items, keeping the nickname order."""
+    return json.dumps(order_items, separators=(',', ':'))
+
+
+def load_order_items_json(order_items_json):
+    """Return the order items stored by dump_order_items_json."""
+    return json.loads(order_items_json, object_pairs_hook=OrderedDict)
+
+
+def _get_signature(value):
+    return hashlib.sha1(
+        dump_canonical_json(value).encode('utf-8')).hexdigest()
+
+
+def get_requirements_signature(item_type, requirements):
+    """Return the signature of an item type with its requirements."""
+    return _get_signature({
+        'type': item_type,
+        'requirements': requirements
+    })
+
+
+def get_order_items_signature(order_items):
+    """Return the signature of everything requested by an order.
+
+    Nicknames don't matter, so two orders requesting the same items under
+    different nicknames have the same signature.
+    """
+    return _get_signature(sorted(
+        get_requirements_signature(order_item['type'],
+                                   order_item['requirements'])
+        for order_item in order_items.values()))
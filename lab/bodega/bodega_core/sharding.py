@@ -0,0 +1,96 @@
+"""Split fulfillment into shards which can run concurrently.
+
+Shards are configured with FULFILLMENT_SHARDS, which maps the name of each
+shard to the item types and/or locations it covers, for example:
+
+    FULFILLMENT_SHARDS = {
+        'colo': {'item_types': ['rktest_yml'], 'locations': ['COLO']},
+        'hq': {'item_types': ['rktest_yml'], 'locations': ['HQ']},
+        'cdm': {'item_types': ['cdm_node', 'cdm_cluster']}
+    }
+
+An order belongs to a shard if every one of its order items does, which for
+locations means the item requires one of the shard's locations by name.
+Orders which don't belong to any single shard are only processed by passes
+over all open orders.
+
+No two shards may cover the same items, so their item types or their
+locations must be disjoint. Each shard should also cover the ingredients of
+the recipes of its items, since a shard pass selects those as well.
+"""
+import logging
+
+from bodega_core.exceptions import bodega_value_error
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+
+def _overlap(values, other_values):
+    """Return whether two optional collections have a value in common.
+
+    A missing collection stands for every value.
+    """
+    if values is None or other_values is None:
+        return True
+    return bool(set(values).intersection(other_values))
+
+
+class FulfillmentShards(object):
+    def __init__(self, shard_specs):
+        """Validate and remember the specs of the configured shards."""
+        self.shard_specs = shard_specs
+        shard_names = sorted(shard_specs.keys())
+        for index, shard_name in enumerate(shard_names):
+            shard_spec = shard_specs[shard_name]
+            if not shard_spec.get('item_types', None) and \
+                    not shard_spec.get('locations', None):
+                bodega_value_error(
+                    log,
+                    'Fulfillment shard %s covers every item. It needs item '
+                    'types or locations.' % repr(shard_name))
+            for other_shard_name in shard_names[index + 1:]:
+                other_shard_spec = shard_specs[other_shard_name]
+                if _overlap(shard_spec.get('item_types', None),
+                            other_shard_spec.get('item_types', None)) and \
+                        _overlap(shard_spec.get('locations', None),
+                                 other_shard_spec.get('locations', None)):
+                    bodega_value_error(
+                        log,
+                        'Fulfillment shards %s and %s cover some of the '
+                        'same items.'
+                        % (repr(shard_name), repr(other_shard_name)))
+
+    def get_names(self):
+        return sorted(self.shard_specs.keys())
+
+    def _covers(self, shard_spec, order_item):
+        item_types = shard_spec.get('item_types', None)
+        if item_types is not None and order_item['type'] not in item_types:
+            return False
+
+        locations = shard_spec.get('locations', None)
+        if locations is not None and \
+                order_item['requirements'].get('location', None) \
+                not in locations:
+            return False
+        return True
+
+    def get_order_item_shard(self, order_item):
+        """Return the name of the shard of an order item, if any."""
+        for shard_name, shard_spec in self.shard_specs.items():
+            if self._covers(shard_spec, order_item):
+                return shard_name
+        return None
+
+    def get_order_shard(self, order_items):
+        """Return the name of the shard of all the order items, if any."""
+        shard_names = set(self.get_order_item_shard(order_item)
+                          for order_item in order_items.values())
+        if len(shard_names) != 1:
+            return None
+        return shard_names.pop()
+
+
+def get_fulfillment_shards():
+    return FulfillmentShards(settings.FULFILLMENT_SHARDS)
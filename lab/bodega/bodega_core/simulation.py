@@ -0,0 +1,282 @@
+"""Replay a stream of events against the fulfillment code offline.
+
+A simulation advances a simulated clock in steps of one fulfillment pass.
+Before each pass it applies the events which happened since the previous one:
+
+    {"time": 0, "type": "create", "item_type": "rktest_yml", "fields": {...}}
+    {"time": 5, "type": "order", "id": "o1", "owner": "alice",
+     "items": {"pod": {"type": "rktest_yml", "requirements": {...}}},
+     "hold": 3600}
+    {"time": 90, "type": "free", "order": "o1"}
+
+Times are in simulated seconds. Creating items is up to the caller since the
+fields of each item type differ. An order is closed and its items are freed
+either by an explicit free event or, with "hold", that many simulated seconds
+after it was fulfilled.
+
+Each pass calls FulfillmentManager.fulfill_open_orders, and the order
+fulfillers it asks for are run eagerly in-process with fulfill_order, as
+FulfillOrderTask would. Taste tests are stubbed out since they reach out to
+the items. Item creators are only counted, without running their recipes, so
+the only items are the ones from create events. Nothing here manages
+transactions or signals, so callers should run a simulation inside a
+transaction they roll back, with task triggers disconnected.
+"""
+import heapq
+import logging
+import time
+from datetime import timedelta
+from math import ceil
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rkelery.models import Task
+
+from .exceptions import bodega_value_error
+from .fulfillment import FulfillmentManager
+from .models import Item, Order, OrderUpdate
+from .requirements import dump_order_items_json
+
+log = logging.getLogger(__name__)
+
+EVENT_TYPE_CREATE = 'create'
+EVENT_TYPE_FREE = 'free'
+EVENT_TYPE_ORDER = 'order'
+EVENT_TYPES = [EVENT_TYPE_CREATE, EVENT_TYPE_FREE, EVENT_TYPE_ORDER]
+# Orders are created in real time as the simulation runs, so this only needs
+# to outlast the simulation itself.
+ORDER_EXPIRATION_TIME_LIMIT = timedelta(days=7)
+
+
+def get_percentile(sorted_values, percentile):
+    """Return a percentile of sorted values by the nearest-rank method."""
+    if not sorted_values:
+        return None
+
+    rank = int(ceil(percentile / 100.0 * len(sorted_values)))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class _SimulatedFulfillmentManager(FulfillmentManager):
+    def __init__(self, item_tools):
+        super(_SimulatedFulfillmentManager, self).__init__(item_tools)
+        self.num_item_creators = 0
+
+    def _get_creator_tasks_for_item(self, item_requirements, item_type,
+                                    *args, **kwargs):
+        # Getting a recipe's creator task may already create the item, so
+        # leave creating items to the create events.
+        self.num_item_creators += 1
+        return []
+
+    def _run_taste_test(self, item_type_name, item_manager, specific_item,
+                        requirements):
+        return True
+
+
+class FulfillmentSimulator(object):
+    """Replay events against FulfillmentManager on a simulated clock."""
+
+    def __init__(self, item_tools, events, create_item,
+                 order_update_creator, pass_interval=60, max_passes=1000):
+        """Prepare a simulation of the given events.
+
+        create_item is called with each create event and should create the
+        item it describes.
+        """
+        for event in events:
+            if event.get('type', None) not in EVENT_TYPES:
+                bodega_value_error(
+                    log,
+                    'Event %s does not have a type in %s.'
+                    % (repr(event), repr(EVENT_TYPES)))
+
+        self.fulfillment_manager = _SimulatedFulfillmentManager(item_tools)
+        self.events = sorted(events, key=lambda event: event['time'])
+        self.create_item = create_item
+        self.order_update_creator = order_update_creator
+        self.pass_interval = pass_interval
+        self.max_passes = max_passes
+
+        self.now = 0
+        self.orders = {}
+        self.order_ids = {}
+        self.arrival_times = {}
+        self.fulfillment_times = {}
+        self.hold_times = {}
+        self.scheduled_frees = []
+        self.passes = []
+
+    def _apply_event(self, event):
+        if event['type'] == EVENT_TYPE_CREATE:
+            self.create_item(event)
+        elif event['type'] == EVENT_TYPE_ORDER:
+            self._place_order(event)
+        else:
+            self._free_order(event['order'])
+
+    def _place_order(self, event):
+        owner, _ = User.objects.get_or_create(
+            username=event.get('owner', 'simulated_owner'))
+        order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=owner,
+            tab=owner.tabs.get(),
+            maintenance=event.get('maintenance', False))
+        OrderUpdate.objects.create(
+            items_delta=dump_order_items_json(event['items']),
+            order=order,
+            creator=owner,
+            expiration_time_limit_delta=ORDER_EXPIRATION_TIME_LIMIT)
+
+        self.orders[event['id']] = order
+        self.order_ids[order.sid] = event['id']
+        self.arrival_times[event['id']] = event['time']
+        if 'hold' in event:
+            self.hold_times[event['id']] = event['hold']
+
+    def _free_order(self, event_order_id):
+        order = self.orders.get(event_order_id, None)
+        if order is None:
+            log.warning('Cannot free unknown order %s.'
+                        % repr(event_order_id))
+            return
+
+        order.refresh_from_db()
+        if order.status == Order.STATUS_CLOSED:
+            return
+
+        OrderUpdate.objects.create(
+            order=order,
+            comment='Closed by the simulation.',
+            creator=self.order_update_creator,
+            new_status=Order.STATUS_CLOSED)
+        order.status = Order.STATUS_CLOSED
+        order.save()
+
+        # The cleanup which would free the items for real is not simulated.
+        Item.objects.filter(
+            held_by_content_type=ContentType.objects.get_for_model(Order),
+            held_by_object_id=order.id).update(held_by_object_id=None,
+                                               held_by_content_type=None)
+
+    def _run_order_fulfiller(self, order_sid, selected_item_sids):
+        selected_items = {nickname: Item.objects.get(sid=item_sid)
+                          for (nickname, item_sid)
+                          in selected_item_sids.items()}
+        if any(item.held_by_object_id is not None
+               for item in selected_items.values()):
+            # The real task would wait for these items, but the next pass
+            # will select other items anyway.
+            return False
+
+        order = Order.objects.get(sid=order_sid)
+        usable_items = self.fulfillment_manager.fulfill_order(
+            order, selected_items, self.order_update_creator)
+        for item in usable_items:
+            item.held_by = None
+            item.save()
+        return len(usable_items) == 0
+
+    def _run_pass(self):
+        order_fulfillers = []
+
+        def create_order_fulfiller(order_sid, selected_item_sids):
+            order_fulfillers.append((order_sid, selected_item_sids))
+
+        self.fulfillment_manager.num_item_creators = 0
+        with CaptureQueriesContext(connection) as queries:
+            start_time = time.time()
+            self.fulfillment_manager.fulfill_open_orders(
+                get_order_fulfillers=lambda order_sid: Task.objects.none(),
+                create_order_fulfiller=create_order_fulfiller,
+                create_item_maintenance_setter=lambda item_sid: None,
+                order_update_creator=self.order_update_creator)
+            elapsed_time = time.time() - start_time
+
+        num_fulfilled_orders = 0
+        for order_sid, selected_item_sids in order_fulfillers:
+            if not self._run_order_fulfiller(order_sid, selected_item_sids):
+                continue
+
+            num_fulfilled_orders += 1
+            event_order_id = self.order_ids[order_sid]
+            self.fulfillment_times[event_order_id] = self.now
+            if event_order_id in self.hold_times:
+                heapq.heappush(
+                    self.scheduled_frees,
+                    (self.now + self.hold_times[event_order_id],
+                     event_order_id))
+
+        self.passes.append({
+            'time': self.now,
+            'seconds': elapsed_time,
+            'queries': len(queries),
+            'fulfillers': len(order_fulfillers),
+            'creators': self.fulfillment_manager.num_item_creators,
+            'fulfilled': num_fulfilled_orders
+        })
+        return num_fulfilled_orders
+
+    def _has_open_orders(self):
+        return any(event_order_id not in self.fulfillment_times
+                   for event_order_id in self.orders)
+
+    def run(self):
+        """Run the simulation and return its results."""
+        event_index = 0
+        while len(self.passes) < self.max_passes:
+            while event_index < len(self.events) and \
+                    self.events[event_index]['time'] <= self.now:
+                self._apply_event(self.events[event_index])
+                event_index += 1
+            while self.scheduled_frees and \
+                    self.scheduled_frees[0][0] <= self.now:
+                _, event_order_id = heapq.heappop(self.scheduled_frees)
+                self._free_order(event_order_id)
+
+            made_progress = self._run_pass() > 0
+            next_times = []
+            if event_index < len(self.events):
+                next_times.append(self.events[event_index]['time'])
+            if self.scheduled_frees:
+                next_times.append(self.scheduled_frees[0][0])
+            if made_progress and self._has_open_orders():
+                next_times.append(self.now + self.pass_interval)
+            if not next_times:
+                break
+
+            # Skip the passes which would have nothing new to work with.
+            num_intervals = -(-(min(next_times) - self.now) //
+                              self.pass_interval)
+            self.now += max(num_intervals, 1) * self.pass_interval
+
+        return self.get_results()
+
+    def get_results(self):
+        """Summarize the latencies and passes simulated so far."""
+        latencies = sorted(
+            self.fulfillment_times[event_order_id] -
+            self.arrival_times[event_order_id]
+            for event_order_id in self.fulfillment_times)
+        pass_seconds = sorted(sim_pass['seconds'] for sim_pass in self.passes)
+        num_passes = len(self.passes)
+        return {
+            'orders': len(self.orders),
+            'fulfilled': len(latencies),
+            'latency_p50': get_percentile(latencies, 50),
+            'latency_p90': get_percentile(latencies, 90),
+            'latency_p99': get_percentile(latencies, 99),
+            'latency_max': latencies[-1] if latencies else None,
+            'passes': num_passes,
+            'fulfilled_per_pass':
+                float(len(latencies)) / num_passes if num_passes else 0.0,
+            'creators': sum(sim_pass['creators'] for sim_pass in self.passes),
+            'pass_seconds_p50': get_percentile(pass_seconds, 50),
+            'pass_seconds_max': pass_seconds[-1] if pass_seconds else None,
+            'queries_per_pass':
+                float(sum(sim_pass['queries'] for sim_pass in self.passes)) /
+                num_passes if num_passes else 0.0
+        }
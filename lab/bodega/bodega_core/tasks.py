@@ -1,7 +1,10 @@
 """Bodega core tasks."""
-from django.db.models import Q
 from rkelery import _get_models, SynchronizedTask, Task
-from rkelery.utils import json_dump
+
+# The name of the task links to the items a task works on.
+ITEM_LINK_NAME = 'item'
+# The name of the task links to the warm pools item creators fill.
+WARM_POOL_LINK_NAME = 'warm_pool'
 
 
 class GlobalTask(SynchronizedTask):
@@ -10,10 +13,86 @@ class GlobalTask(SynchronizedTask):
 
 
 class SingleItemTask(SynchronizedTask):
+    """Task working on the item whose SID is its first argument.
+
+    It competes with every task linked to the item, including
+    MultipleItemsTasks.
+    """
+
+    @classmethod
+    def get_links(cls, item_sid, *args, **kwargs):
+        return [(ITEM_LINK_NAME, item_sid)]
+
     def find_competitors(self, tasks, item_sid, *args, **kwargs):
+        return tasks.filter(links__name=ITEM_LINK_NAME,
+                            links__sid=str(item_sid))
+
+
+class MultipleItemsTask(SynchronizedTask):
+    """Task working on a list of items given as its first argument.
+
+    It competes with every task linked to any of the items, including
+    SingleItemTasks.
+    """
+
+    @classmethod
+    def get_links(cls, item_sids, *args, **kwargs):
+        return [(ITEM_LINK_NAME, item_sid) for item_sid in item_sids]
+
+    def find_competitors(self, tasks, item_sids, *args, **kwargs):
         return tasks.filter(
-            Q(args_json__contains=json_dump(item_sid)) |
-            Q(kwargs_json__contains=json_dump(item_sid)))
+            links__name=ITEM_LINK_NAME,
+            links__sid__in=[str(item_sid) for item_sid in item_sids]) \
+            .distinct()
+
+
+class ItemCreatorTask(Task):
+    """Task creating an item, typically from a recipe.
+
+    Creators published to fill a warm pool are given the name of the pool as
+    a warm_pool keyword argument. It's declared as a link to the pool when
+    the task is published and is otherwise hidden from the task, so
+    implementations don't need to accept it.
+    """
+
+    @staticmethod
+    def _pop_warm_pool(task_kwargs):
+        task_kwargs = dict(task_kwargs)
+        warm_pool = task_kwargs.pop('warm_pool', None)
+        return (warm_pool, task_kwargs)
+
+    def __init__(self, celery_task, task_args, task_kwargs):
+        """Instantiate the task without its warm_pool keyword argument."""
+        (_, task_kwargs) = self._pop_warm_pool(task_kwargs)
+        super(ItemCreatorTask, self).__init__(
+            celery_task, task_args, task_kwargs)
+
+    @classmethod
+    def get_task_summary(cls, task_args, task_kwargs):
+        (_, task_kwargs) = cls._pop_warm_pool(task_kwargs)
+        return super(ItemCreatorTask, cls).get_task_summary(
+            task_args, task_kwargs)
+
+    @classmethod
+    def get_task_links(cls, task_args, task_kwargs):
+        (warm_pool, task_kwargs) = cls._pop_warm_pool(task_kwargs)
+        links = list(super(ItemCreatorTask, cls).get_task_links(
+            task_args, task_kwargs))
+        if warm_pool is not None:
+            links.append((WARM_POOL_LINK_NAME, warm_pool))
+        return links
+
+    @classmethod
+    def get_task_timeout(cls, task_args, task_kwargs):
+        (_, task_kwargs) = cls._pop_warm_pool(task_kwargs)
+        return super(ItemCreatorTask, cls).get_task_timeout(
+            task_args, task_kwargs)
+
+    @classmethod
+    def get_task_soft_timeout(cls, task_args, task_kwargs):
+        (_, task_kwargs) = cls._pop_warm_pool(task_kwargs)
+        return super(ItemCreatorTask, cls).get_task_soft_timeout(
+            task_args, task_kwargs)
 
 
 class ThrottledTask(Task):
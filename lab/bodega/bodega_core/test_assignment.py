@@ -0,0 +1,83 @@
+"""Test matching open orders to items together."""
+import json
+from datetime import timedelta
+
+from bodega_test_items.item_types import item_tools
+from django.test import override_settings
+from .assignment import OrderAssignmentSolver
+from .inventory import InventorySnapshot
+from .models import Order, OrderUpdate
+from .test_fulfillment import FulfillmentTestCase
+
+
+def _basic_item(**requirements):
+    return {
+        'type': 'basic_item',
+        'requirements': requirements
+    }
+
+
+class OrderAssignmentSolverTestCase(FulfillmentTestCase):
+    def test_moves_earlier_orders_to_interchangeable_items(self):
+        solver = OrderAssignmentSolver(InventorySnapshot(item_tools), [])
+
+        self.assertTrue(solver.add_order(
+            'order1', {'item1': _basic_item(boolean=False)}))
+        self.assertTrue(solver.add_order(
+            'order2', {'item1': _basic_item(choice='B')}))
+        # The first order can't be moved off item1 again for a later order.
+        self.assertFalse(solver.add_order(
+            'order3', {'item1': _basic_item(choice='A')}))
+
+        assignments = solver.get_assignments()
+        self.assertEqual(sorted(assignments.keys()), ['order1', 'order2'])
+        self.assertEqual(assignments['order1']['item1'].id, self.item1.id)
+        self.assertEqual(assignments['order2']['item1'].id, self.item2.id)
+
+    def test_orders_are_matched_all_or_nothing(self):
+        solver = OrderAssignmentSolver(InventorySnapshot(item_tools),
+                                       [self.item3.id])
+
+        self.assertTrue(solver.add_order(
+            'order1', {'item1': _basic_item(), 'item2': _basic_item()}))
+        self.assertFalse(solver.add_order(
+            'order2', {'item1': _basic_item(choice='A')}))
+
+        assignments = solver.get_assignments()
+        self.assertEqual(list(assignments.keys()), ['order1'])
+        self.assertEqual(
+            sorted(item.id for item in assignments['order1'].values()),
+            [self.item1.id, self.item2.id])
+
+
+@override_settings(ENABLE_ORDER_ASSIGNMENT_SOLVER=True,
+                   ENABLE_ORDER_PRICE_PRIORITY=False)
+class AssignmentFulfillmentTestCase(FulfillmentTestCase):
+    def create_order(self, items):
+        order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=self.user,
+            tab=self.tab)
+        OrderUpdate.objects.create(
+            items_delta=json.dumps(items),
+            order=order,
+            creator=self.user,
+            expiration_time_limit_delta=timedelta(minutes=60))
+        return order
+
+    def test_constrained_later_order_is_fulfilled(self):
+        # Greedy selection could give either item1 or item2 to the first
+        # order, in which case the second order could not be fulfilled.
+        order1 = self.create_order({'item1': _basic_item(boolean=False)})
+        order2 = self.create_order({'item1': _basic_item(choice='B')})
+
+        self.fulfill_open_orders()
+
+        self.assertEqual(
+            self.get_selected_item(
+                self.get_order_fulfiller(order1.sid), 'item1').id,
+            self.item1.id)
+        self.assertEqual(
+            self.get_selected_item(
+                self.get_order_fulfiller(order2.sid), 'item1').id,
+            self.item2.id)
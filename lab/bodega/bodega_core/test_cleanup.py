@@ -0,0 +1,140 @@
+"""Test finding the items which need cleanup."""
+from datetime import datetime, timedelta
+
+from bodega_test_items.item_managers import BasicItemManager
+from bodega_test_items.item_types import item_tools
+from bodega_test_items.models import BasicItem, ComplexItem
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from pytz import utc
+from rkelery import states
+from rkelery.models import Task
+from sid_from_id.encoder import SidEncoder
+from .cleanup import CLEANUP_BATCH_SIZE, CleanupManager
+from .models import Item, Order
+
+CREATE_BASIC_ITEM_TASK = 'CreateBasicItem'
+
+
+class FailingBasicItemManager(BasicItemManager):
+    def handle_cleanup(self, basic_item):
+        if basic_item.string == 'bad':
+            raise RuntimeError('Failed to clean up %s' % basic_item)
+        super(FailingBasicItemManager, self).handle_cleanup(basic_item)
+
+
+class CleanupManagerTestCase(TestCase):
+    def setUp(self):
+        self.cleanup_manager = CleanupManager(item_tools)
+        self.user = User.objects.create_user(username='Foo')
+        self.tab = self.user.tabs.get()
+
+    def create_order(self, status):
+        return Order.objects.create(status=status,
+                                    owner=self.user,
+                                    tab=self.tab)
+
+    def create_task(self, status):
+        task = Task.objects.create(task=CREATE_BASIC_ITEM_TASK,
+                                   args=[],
+                                   kwargs={})
+        task_result = task.task_result
+        task_result.status = status
+        task_result.save()
+        return task
+
+    def create_item(self, held_by=None, time_held_by_updated=None):
+        item = BasicItem.objects.create(
+            boolean=False,
+            string='foo',
+            choice=BasicItem.CHOICE_A,
+            held_by=held_by)
+        if time_held_by_updated is not None:
+            Item.objects.filter(id=item.id).update(
+                time_held_by_object_updated=time_held_by_updated)
+        return item
+
+    def create_untouched_items(self):
+        """Create items which don't need any cleanup."""
+        self.create_item(held_by=self.create_order(Order.STATUS_FULFILLED))
+        self.create_item(held_by=self.create_task(states.RUNNING))
+        self.create_item()
+
+    def process_items_cleanup(self):
+        with CaptureQueriesContext(connection) as context:
+            batches = self.cleanup_manager.process_items_cleanup(
+                lambda item_sids: item_sids)
+        return (len(context.captured_queries),
+                set(item_sid for batch in batches for item_sid in batch))
+
+    def test_process_items_cleanup(self):
+        expired_time = datetime.now(utc) - timedelta(hours=2)
+        items_to_clean_up = [
+            self.create_item(held_by=self.create_order(Order.STATUS_CLOSED)),
+            self.create_item(held_by=self.create_task(states.FAILURE)),
+            self.create_item(time_held_by_updated=expired_time)
+        ]
+        self.create_untouched_items()
+        destroyed_item = self.create_item(time_held_by_updated=expired_time)
+        destroyed_item.state = Item.STATE_DESTROYED
+        destroyed_item.save()
+
+        (num_queries, item_sids) = self.process_items_cleanup()
+        self.assertEqual(set(item.sid for item in items_to_clean_up),
+                         item_sids)
+
+        # Items which don't need cleanup aren't looked at one by one.
+        for _ in range(5):
+            self.create_untouched_items()
+        (num_more_queries, more_item_sids) = self.process_items_cleanup()
+        self.assertEqual(item_sids, more_item_sids)
+        self.assertEqual(num_queries, num_more_queries)
+
+    def test_maintenance_item_is_freed(self):
+        order = self.create_order(Order.STATUS_CLOSED)
+        item = self.create_item(held_by=order)
+        item.state = Item.STATE_MAINTENANCE
+        item.save()
+
+        (_, item_sids) = self.process_items_cleanup()
+        self.assertEqual(set(), item_sids)
+        item.refresh_from_db()
+        self.assertIsNone(item.held_by)
+
+    def test_items_are_cleaned_up_in_batches(self):
+        order = self.create_order(Order.STATUS_CLOSED)
+        items = [self.create_item(held_by=order)
+                 for _ in range(CLEANUP_BATCH_SIZE + 1)]
+        complex_item = ComplexItem.objects.create(number=1, held_by=order)
+
+        batches = self.cleanup_manager.process_items_cleanup(
+            lambda item_sids: item_sids)
+        self.assertEqual(
+            [[item.sid for item in items[:CLEANUP_BATCH_SIZE]],
+             [items[CLEANUP_BATCH_SIZE].sid],
+             [complex_item.sid]],
+            sorted(batches, key=len, reverse=True))
+
+        encoder = SidEncoder(Item)
+        for batch in batches:
+            self.cleanup_manager.handle_items_cleanup(
+                Item.objects.filter(
+                    id__in=[encoder.decode(item_sid) for item_sid in batch]))
+        self.assertFalse(
+            Item.objects.filter(held_by_object_id=order.id).exists())
+
+    def test_failed_item_doesnt_stop_its_batch(self):
+        order = self.create_order(Order.STATUS_CLOSED)
+        items = [self.create_item(held_by=order) for _ in range(3)]
+        bad_item = items[1]
+        bad_item.string = 'bad'
+        bad_item.save()
+
+        FailingBasicItemManager().handle_items_cleanup(
+            BasicItem.objects.filter(id__in=[item.id for item in items]))
+        self.assertEqual(
+            [bad_item.id],
+            list(Item.objects.filter(held_by_object_id=order.id)
+                 .values_list('id', flat=True)))
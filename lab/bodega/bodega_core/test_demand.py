@@ -0,0 +1,113 @@
+"""Test the incrementally maintained tab demands."""
+import json
+from datetime import timedelta
+
+from bodega_test_items.item_types import item_tools
+from django.contrib.auth.models import User
+from django.test import TestCase
+from .demand import find_tab_demand_drift, rebuild_tab_demands
+from .fulfillment import FulfillmentManager
+from .models import Order, OrderUpdate, TabDemand
+
+
+class TabDemandTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='User1')
+        self.user2 = User.objects.create_user(username='User2')
+        self.tab1 = self.user1.tabs.get()
+        self.tab2 = self.user2.tabs.get()
+
+    def create_order(self, user, num_items=1, maintenance=False):
+        items_delta = json.dumps({
+            'item%d' % item_num: {
+                'type': 'basic_item',
+                'requirements': {
+                    'boolean': False
+                }
+            } for item_num in range(num_items)
+        })
+
+        order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=user,
+            maintenance=maintenance,
+            tab=user.tabs.get())
+        OrderUpdate.objects.create(
+            items_delta=items_delta,
+            order=order,
+            creator=user,
+            expiration_time_limit_delta=timedelta(hours=24))
+        return order
+
+    def assert_tab_demand(self, tab, open_orders_count, open_orders_price,
+                          fulfilled_orders_count, fulfilled_orders_price):
+        tab_demand, _ = TabDemand.objects.get_or_create(tab=tab)
+        self.assertEqual(tab_demand.open_orders_count, open_orders_count)
+        self.assertAlmostEqual(tab_demand.open_orders_price,
+                               open_orders_price)
+        self.assertEqual(tab_demand.fulfilled_orders_count,
+                         fulfilled_orders_count)
+        self.assertAlmostEqual(tab_demand.fulfilled_orders_price,
+                               fulfilled_orders_price)
+
+    def test_order_lifecycle(self):
+        order = self.create_order(self.user1, num_items=2)
+        self.assertEqual(order.price, 2.0)
+        self.assert_tab_demand(self.tab1, 1, 2.0, 0, 0.0)
+
+        order.status = Order.STATUS_FULFILLED
+        order.tab_based_priority = Order.PRIORITY_FULFILLED
+        order.save(update_fields=['status', 'tab_based_priority'])
+        self.assert_tab_demand(self.tab1, 0, 0.0, 1, 2.0)
+
+        order.tab = self.tab2
+        order.save()
+        self.assert_tab_demand(self.tab1, 0, 0.0, 0, 0.0)
+        self.assert_tab_demand(self.tab2, 0, 0.0, 1, 2.0)
+
+        order.status = Order.STATUS_CLOSED
+        order.save()
+        self.assert_tab_demand(self.tab2, 0, 0.0, 0, 0.0)
+
+    def test_maintenance_orders_are_not_counted(self):
+        self.create_order(self.user1, num_items=3, maintenance=True)
+        self.assert_tab_demand(self.tab1, 0, 0.0, 0, 0.0)
+
+    def test_stats_match_computation_from_scratch(self):
+        self.create_order(self.user1, num_items=2)
+        self.create_order(self.user1, num_items=1, maintenance=True)
+        self.create_order(self.user2, num_items=1)
+        fulfilled_order = self.create_order(self.user2, num_items=3)
+        fulfilled_order.status = Order.STATUS_FULFILLED
+        fulfilled_order.save()
+
+        manager = FulfillmentManager(item_tools)
+        open_orders = list(Order.objects.filter(status=Order.STATUS_OPEN)
+                           .select_related('tab'))
+        fulfilled_orders = list(
+            Order.objects.filter(status=Order.STATUS_FULFILLED))
+
+        with self.assertNumQueries(1):
+            stats = manager._compute_order_priorities_stats_from_demand(
+                open_orders)
+        expected_stats = manager._compute_order_priorities_stats(
+            open_orders + fulfilled_orders)
+        for stat_name in ['median_demand', 'tab_limits',
+                          'total_fulfilled_prices']:
+            self.assertEqual(stats[stat_name], expected_stats[stat_name])
+        for order in open_orders:
+            self.assertEqual(stats['order_prices'][order.sid],
+                             expected_stats['order_prices'][order.sid])
+
+    def test_drift_is_detected_and_repaired(self):
+        order = self.create_order(self.user1, num_items=2)
+        self.assertEqual(find_tab_demand_drift(item_tools), [])
+
+        TabDemand.objects.filter(tab=self.tab1).update(open_orders_price=5.0)
+        Order.objects.filter(id=order.id).update(price=None)
+        drift = find_tab_demand_drift(item_tools)
+        self.assertEqual(len(drift), 2)
+
+        rebuild_tab_demands(item_tools)
+        self.assertEqual(find_tab_demand_drift(item_tools), [])
+        self.assert_tab_demand(self.tab1, 1, 2.0, 0, 0.0)
@@ -222,3 +222,42 @@ class EjectionTestCase(TestCase):
                                          curr_time + timedelta(minutes=257))
         self.assertEqual(self.order.number_of_ejection_notices, 1)
         self.assertEqual(self.order.status, Order.STATUS_CLOSED)
+
+    def test_only_due_orders_are_processed(self):
+        manager = EjectionManager(self.user)
+        self.order.refresh_from_db()
+        ejection_time = self.order.ejection_time
+        self.assertLessEqual(self.order.next_action_time,
+                             datetime.now(utc))
+        self.assertEqual(
+            manager.get_next_action_time(self.order, datetime.now(utc)),
+            ejection_time - timedelta(days=30))
+
+        manager.process_orders_time_limits()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.number_of_ejection_notices, 1)
+        self.assertEqual(self.order.next_action_time,
+                         ejection_time - timedelta(hours=2))
+
+        # The order isn't due again until the next notice in the schedule.
+        manager.process_orders_time_limits()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.number_of_ejection_notices, 1)
+
+        # Extending the order makes it due so it's rescheduled.
+        OrderUpdate.objects.create(
+            order=self.order,
+            creator=self.user,
+            time_limit_delta=timedelta(minutes=240))
+        manager.process_orders_time_limits()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.number_of_ejection_notices, 1)
+        self.assertEqual(self.order.next_action_time, ejection_time)
+
+    def test_closed_orders_are_unscheduled(self):
+        OrderUpdate.objects.create(
+            order=self.order,
+            creator=self.user,
+            new_status=Order.STATUS_CLOSED)
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.next_action_time)
@@ -0,0 +1,94 @@
+"""Test estimating queue positions and fulfillment times of open orders."""
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from .estimation import QueueEstimator
+from .models import Order, OrderUpdate
+
+HISTORY_WINDOW = timedelta(days=7)
+
+
+class QueueEstimatorTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Foo')
+
+    def create_order(self, choice):
+        order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=self.user,
+            tab=self.user.tabs.get())
+        OrderUpdate.objects.create(
+            items_delta=json.dumps({
+                'item1': {
+                    'type': 'basic_item',
+                    'requirements': {
+                        'choice': choice
+                    }
+                }
+            }),
+            order=order,
+            creator=self.user,
+            expiration_time_limit_delta=timedelta(minutes=60))
+        return Order.objects.get(id=order.id)
+
+    def fulfill_order(self, order, wait_time):
+        fulfillment_update = OrderUpdate.objects.create(
+            order=order,
+            creator=self.user,
+            new_status=Order.STATUS_FULFILLED)
+        OrderUpdate.objects.filter(id=fulfillment_update.id).update(
+            time_created=order.time_created + wait_time)
+
+    def test_estimates(self):
+        self.fulfill_order(self.create_order('A'), timedelta(hours=1))
+        first_order = self.create_order('A')
+        second_order = self.create_order('B')
+
+        estimator = QueueEstimator(HISTORY_WINDOW)
+        self.assertEqual(
+            estimator.update_estimates([first_order, second_order]), 2)
+
+        first_order = Order.objects.get(id=first_order.id)
+        self.assertEqual(first_order.queue_position, 0)
+        self.assertEqual(first_order.estimated_fulfillment_time,
+                         first_order.time_created + timedelta(hours=1))
+        # One fulfillment per history window means a window per order ahead.
+        second_order = Order.objects.get(id=second_order.id)
+        self.assertEqual(second_order.queue_position, 1)
+        self.assertGreater(second_order.estimated_fulfillment_time,
+                           second_order.time_created + HISTORY_WINDOW -
+                           timedelta(minutes=1))
+
+        self.assertEqual(
+            QueueEstimator(HISTORY_WINDOW).update_estimates(
+                [first_order, second_order]),
+            0)
+
+    def test_no_history(self):
+        order = self.create_order('A')
+        QueueEstimator(HISTORY_WINDOW).update_estimates([order])
+
+        order = Order.objects.get(id=order.id)
+        self.assertEqual(order.queue_position, 0)
+        self.assertIsNone(order.estimated_fulfillment_time)
+
+    def test_estimates_are_written_together(self):
+        self.fulfill_order(self.create_order('A'), timedelta(hours=1))
+        orders = [self.create_order('A') for _ in range(3)]
+        orders.append(self.create_order('B'))
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(
+                QueueEstimator(HISTORY_WINDOW).update_estimates(orders), 4)
+        updates = [query for query in context.captured_queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+        for queue_position, order in enumerate(orders):
+            order = Order.objects.get(id=order.id)
+            self.assertEqual(order.queue_position, queue_position)
+            self.assertIsNotNone(order.estimated_fulfillment_time)
@@ -1,19 +1,22 @@
 """Test order fulfillment."""
 import json
 import logging
+import threading
 from datetime import datetime, timedelta
 
 from bodega_test_items.item_types import item_tools
 from bodega_test_items.models import BasicItem
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from pytz import utc
 from rkelery import states
 from rkelery.models import Task
 from rkelery.utils import json_dump
 from .fulfillment import FulfillmentManager
+from .inventory import InventorySnapshot
 from .models import Item, Order, OrderUpdate
+from .planning import RecipePlanner
 
 log = logging.getLogger(__name__)
 
@@ -23,6 +26,20 @@ ORDER_FULFILLER_TASK = 'FulfillOrder'
 SET_ITEM_TO_MAINTENANCE_TASK = 'SetItemToMaintenance'
 
 
+class SlowTasteTestFulfillmentManager(FulfillmentManager):
+    def __init__(self, item_tools, slow_items_ids):
+        super(SlowTasteTestFulfillmentManager, self).__init__(item_tools)
+        self.slow_items_ids = slow_items_ids
+        self.slow_taste_tests_released = threading.Event()
+
+    def _run_taste_test(self, item_type_name, item_manager, specific_item,
+                        requirements):
+        if specific_item.id in self.slow_items_ids:
+            self.slow_taste_tests_released.wait()
+        return super(SlowTasteTestFulfillmentManager, self)._run_taste_test(
+            item_type_name, item_manager, specific_item, requirements)
+
+
 class FulfillmentTestCase(TestCase):
     def setUp(self):
         self.order_update_creator = User.objects.get(id=1)
@@ -159,6 +176,39 @@ class OneFulfillmentTestCase(FulfillmentTestCase):
         self.fulfill_open_orders()
         self.assert_selected_item()
 
+    def test_order_fulfillers_looked_up_in_batch(self):
+        manager = FulfillmentManager(item_tools)
+        looked_up_order_sids = []
+
+        def get_sids_of_orders_with_fulfillers(order_sids):
+            looked_up_order_sids.append(order_sids)
+            return set([self.order.sid])
+
+        manager.fulfill_open_orders(
+            self.get_order_fulfillers, self.create_order_fulfiller,
+            self.create_item_maintenance_setter, self.order_update_creator,
+            get_sids_of_orders_with_fulfillers)
+        self.assertEqual(looked_up_order_sids, [[self.order.sid]])
+        self.assertFalse(self.get_order_fulfillers(self.order.sid).exists())
+
+    @override_settings(FULFILLMENT_SHARDS={
+        'basic': {'item_types': ['basic_item']},
+        'complex': {'item_types': ['complex_item']}
+    })
+    def test_shards(self):
+        manager = FulfillmentManager(item_tools)
+        manager.fulfill_open_orders(
+            self.get_order_fulfillers, self.create_order_fulfiller,
+            self.create_item_maintenance_setter, self.order_update_creator,
+            shard='complex')
+        self.assertFalse(self.get_order_fulfillers(self.order.sid).exists())
+
+        manager.fulfill_open_orders(
+            self.get_order_fulfillers, self.create_order_fulfiller,
+            self.create_item_maintenance_setter, self.order_update_creator,
+            shard='basic')
+        self.assert_selected_item()
+
 
 class CreateItemFulfillmentTestCase(FulfillmentTestCase):
     def setUp(self):
@@ -275,6 +325,56 @@ class CreateItemFulfillmentTestCase(FulfillmentTestCase):
         self.assert_item_creator_count(3)
         self.assert_complex_item_creator_count(1)
 
+    def test_identical_requests_are_planned_once(self):
+        manager = FulfillmentManager(item_tools)
+        planner = RecipePlanner(item_tools, InventorySnapshot(item_tools))
+        assigned_items_ids = []
+        for _ in range(3):
+            item_creators = manager._get_creator_tasks_for_item(
+                {'number': 1}, 'complex_item', assigned_items_ids,
+                planner=planner)
+            self.assertEqual(len(item_creators), 2)
+
+        # Creator tasks are decided once for each of the two ingredients.
+        self.assert_item_creator_count(2)
+        self.assertEqual(assigned_items_ids, [])
+        self.assertEqual(planner.num_recipe_lookups, 3)
+        self.assertEqual(planner.num_reused_searches, 2)
+
+    def test_identical_requests_select_ingredients_once(self):
+        for choice in [BasicItem.CHOICE_A, BasicItem.CHOICE_B] * 3:
+            BasicItem.objects.create(boolean=False, string='ingredient',
+                                     choice=choice)
+        manager = FulfillmentManager(item_tools)
+        select_items = manager._select_items
+        select_items_calls = []
+
+        def count_select_items(*args, **kwargs):
+            select_items_calls.append(args)
+            return select_items(*args, **kwargs)
+        manager._select_items = count_select_items
+
+        planner = RecipePlanner(item_tools, InventorySnapshot(item_tools))
+        assigned_items_ids = []
+        for _ in range(3):
+            item_creators = manager._get_creator_tasks_for_item(
+                {'number': 1}, 'complex_item', assigned_items_ids,
+                planner=planner)
+            self.assertEqual(len(item_creators), 1)
+
+        self.assertEqual(len(select_items_calls), 1)
+        self.assertEqual(planner.num_reused_selections, 2)
+        # Every request got ingredients of its own.
+        self.assertEqual(len(assigned_items_ids), 6)
+        self.assertEqual(len(set(assigned_items_ids)), 6)
+
+        # Once the candidates run out, identical requests create them.
+        item_creators = manager._get_creator_tasks_for_item(
+            {'number': 1}, 'complex_item', assigned_items_ids,
+            planner=planner)
+        self.assertEqual(len(item_creators), 2)
+        self.assertEqual(len(select_items_calls), 1)
+
     def test_prioritize_items_held_by_none(self):
         items_delta = json.dumps({
             'item1': {
@@ -337,6 +437,157 @@ class CreateItemFulfillmentTestCase(FulfillmentTestCase):
         self.assert_complex_item_creator_count(1)
 
 
+class ItemFulfillmentTestCase(FulfillmentTestCase):
+    def create_order(self, choice):
+        order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=self.user,
+            tab=self.tab)
+        OrderUpdate.objects.create(
+            items_delta=json.dumps({
+                'item1': {
+                    'type': 'basic_item',
+                    'requirements': {
+                        'choice': choice
+                    }
+                }
+            }),
+            order=order,
+            creator=self.user,
+            expiration_time_limit_delta=timedelta(minutes=60))
+        return order
+
+    def fulfill_open_orders_for_item(self, item):
+        manager = FulfillmentManager(item_tools)
+        return manager.fulfill_open_orders_for_item(
+            Item.objects.get(id=item.id), self.get_order_fulfillers,
+            self.create_order_fulfiller, self.order_update_creator)
+
+    def test_only_waiting_orders_are_considered(self):
+        first_order = self.create_order(BasicItem.CHOICE_A)
+        other_order = self.create_order(BasicItem.CHOICE_B)
+        second_order = self.create_order(BasicItem.CHOICE_A)
+        unfulfillable_order = self.create_order(BasicItem.CHOICE_D)
+
+        order_fulfillers = self.fulfill_open_orders_for_item(self.item1)
+        self.assertEqual(len(order_fulfillers), 1)
+        order_fulfiller = self.get_order_fulfiller(first_order.sid)
+        self.assert_order_fulfiller_args(order_fulfiller, first_order.sid,
+                                         ['item1'])
+        self.assertEqual(self.get_selected_item(order_fulfiller, 'item1'),
+                         self.item1)
+        for order in [other_order, second_order, unfulfillable_order]:
+            self.assertFalse(self.get_order_fulfillers(order.sid).exists())
+        self.assertFalse(self.get_item_creators().exists())
+
+    def test_held_item(self):
+        fulfilled_order = self.create_order(BasicItem.CHOICE_A)
+        self.create_order(BasicItem.CHOICE_A)
+        self.item1.held_by = fulfilled_order
+        self.item1.save()
+
+        self.assertEqual(self.fulfill_open_orders_for_item(self.item1), [])
+
+    def test_orders_waiting_for_ingredient(self):
+        complex_order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=self.user,
+            tab=self.tab)
+        OrderUpdate.objects.create(
+            items_delta=json.dumps({
+                'item1': {
+                    'type': 'complex_item',
+                    'requirements': {
+                        'number': 1
+                    }
+                }
+            }),
+            order=complex_order,
+            creator=self.user,
+            expiration_time_limit_delta=timedelta(minutes=60))
+
+        # item3 isn't an ingredient of the complex item.
+        self.assertEqual(self.fulfill_open_orders_for_item(self.item3), [])
+        self.assertFalse(self.get_complex_item_creators().exists())
+
+        # item2 is, so the complex item is created from it and item1.
+        self.assertEqual(
+            len(self.fulfill_open_orders_for_item(self.item2)), 1)
+        self.assertEqual(self.get_complex_item_creators().count(), 1)
+        self.assertFalse(
+            self.get_order_fulfillers(complex_order.sid).exists())
+
+
+class FulfillOrderTestCase(FulfillmentTestCase):
+    def setUp(self):
+        super(FulfillOrderTestCase, self).setUp()
+
+        items_delta = json.dumps({
+            'item1': {
+                'type': 'basic_item',
+                'requirements': {
+                    'boolean': False
+                }
+            },
+            'item2': {
+                'type': 'basic_item',
+                'requirements': {
+                    'boolean': False
+                }
+            }
+        })
+
+        self.order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=self.user,
+            tab=self.tab)
+        OrderUpdate.objects.create(
+            items_delta=items_delta,
+            order=self.order,
+            creator=self.user,
+            expiration_time_limit_delta=timedelta(minutes=60))
+
+    def fulfill_order(self):
+        manager = FulfillmentManager(item_tools)
+        selected_items = {
+            'item1': Item.objects.get(id=self.item1.id),
+            'item2': Item.objects.get(id=self.item2.id)
+        }
+        usable_items = manager.fulfill_order(self.order, selected_items,
+                                             self.order_update_creator)
+        self.assertEqual(usable_items, set())
+
+        order = Order.objects.get(id=self.order.id)
+        self.assertEqual(order.status, Order.STATUS_FULFILLED)
+        self.assertEqual(order.latest_update.new_status,
+                         Order.STATUS_FULFILLED)
+        for item in [self.item1, self.item2]:
+            self.assertEqual(Item.objects.get(id=item.id).held_by, order)
+
+    def test_concurrent_taste_tests(self):
+        self.fulfill_order()
+
+    @override_settings(TASTE_TEST_MAX_WORKERS=1)
+    def test_sequential_taste_tests(self):
+        self.fulfill_order()
+
+    @override_settings(TASTE_TEST_TIMEOUT=1)
+    def test_taste_test_timeout(self):
+        manager = SlowTasteTestFulfillmentManager(item_tools, [self.item1.id])
+        self.addCleanup(manager.slow_taste_tests_released.set)
+        item1 = Item.objects.get(id=self.item1.id)
+        item2 = Item.objects.get(id=self.item2.id)
+
+        # A lone taste test times out too, not only concurrent ones.
+        self.assertEqual(
+            manager._taste_test_items(self.order, {'item1': item1}),
+            {'item1': False})
+        self.assertEqual(
+            manager._taste_test_items(self.order,
+                                      {'item1': item1, 'item2': item2}),
+            {'item1': False, 'item2': True})
+
+
 class ExpirationTestCase(TestCase):
     def setUp(self):
         items_delta = json.dumps({
@@ -1176,3 +1427,31 @@ class OrderPrioritizationTestCase(TestCase):
             expected_sorted_orders=expected_sorted_orders,
             expected_priorities=expected_priorities)
         self.assertEquals(manager._get_open_orders(), expected_sorted_orders)
+
+    def test_only_changed_priorities_are_written(self):
+        settings.ENABLE_ORDER_PRICE_PRIORITY = True
+        pipeline_user = User.objects.create_user(username='pipeline')
+        individual_user = User.objects.create_user(username='individual')
+        manager = FulfillmentManager(item_tools)
+
+        time_created = datetime.now(utc)
+        for i in range(0, 5):
+            self.create_order(time_created, pipeline_user, num_items=3,
+                              order_status=Order.STATUS_FULFILLED)
+        pipeline_order = self.create_order(time_created, pipeline_user,
+                                           num_items=3)
+        individual_order = self.create_order(time_created, individual_user)
+
+        open_orders = manager._get_open_orders()
+        for order in open_orders:
+            order.refresh_from_db()
+        priorities = {order.sid: order.tab_based_priority
+                      for order in open_orders}
+        # floor(((3.0 + 15.0) / 1.0) / (1.2 * 9.5)) for the pipeline order
+        # and floor((1.0 / 1.0) / (1.2 * 9.5)) for the individual order.
+        self.assertEqual(priorities, {pipeline_order.sid: 1,
+                                      individual_order.sid: 0})
+
+        # Nothing changed since the last pass, so nothing is written.
+        with self.assertNumQueries(0):
+            manager._save_order_priorities(open_orders, priorities)
@@ -0,0 +1,127 @@
+"""Test the in-memory inventory used by order fulfillment."""
+from bodega_test_items.item_types import item_tools
+from bodega_test_items.models import BasicItem
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rkelery import states
+from rkelery.models import Task
+from .fulfillment import FulfillmentManager
+from .inventory import InventorySnapshot
+from .models import Item, Order
+
+CREATE_BASIC_ITEM_TASK = 'CreateBasicItem'
+
+
+class InventorySnapshotTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Foo')
+        self.tab = self.user.tabs.get()
+        self.fulfilled_order = Order.objects.create(
+            status=Order.STATUS_FULFILLED,
+            owner=self.user,
+            tab=self.tab)
+
+        self.task = Task.objects.create(task=CREATE_BASIC_ITEM_TASK,
+                                        args=[],
+                                        kwargs={})
+        task_result = self.task.task_result
+        task_result.status = states.RUNNING
+        task_result.save()
+
+        self.free_item = BasicItem.objects.create(
+            boolean=False,
+            string='free',
+            choice=BasicItem.CHOICE_A)
+        self.pending_item = BasicItem.objects.create(
+            boolean=False,
+            string='pending',
+            choice=BasicItem.CHOICE_A,
+            held_by=self.task)
+        self.held_item = BasicItem.objects.create(
+            boolean=False,
+            string='held',
+            choice=BasicItem.CHOICE_A,
+            held_by=self.fulfilled_order)
+        self.other_item = BasicItem.objects.create(
+            boolean=True,
+            string='other',
+            choice=BasicItem.CHOICE_B)
+        self.maintenance_item = BasicItem.objects.create(
+            boolean=False,
+            string='maintenance',
+            choice=BasicItem.CHOICE_A,
+            state=Item.STATE_MAINTENANCE)
+
+        self.order_item = {
+            'type': 'basic_item',
+            'requirements': {
+                'boolean': False
+            }
+        }
+
+    def get_candidate_ids(self, inventory, **kwargs):
+        excluded_items_ids = kwargs.pop('excluded_items_ids', set())
+        return [item.id for item in inventory.get_candidate_items(
+            self.order_item, excluded_items_ids, **kwargs)]
+
+    def test_candidate_items(self):
+        inventory = InventorySnapshot(item_tools)
+
+        self.assertEqual(
+            self.get_candidate_ids(inventory),
+            [self.free_item.id, self.pending_item.id])
+        self.assertEqual(
+            self.get_candidate_ids(inventory, held_by_any=True),
+            [self.free_item.id, self.pending_item.id, self.held_item.id])
+        self.assertEqual(
+            self.get_candidate_ids(inventory,
+                                   excluded_items_ids={self.free_item.id}),
+            [self.pending_item.id])
+        self.assertEqual(
+            self.get_candidate_ids(inventory,
+                                   requires_maintenance_items=True),
+            [self.maintenance_item.id])
+
+    def test_candidate_items_are_cached(self):
+        inventory = InventorySnapshot(item_tools)
+        self.get_candidate_ids(inventory)
+
+        with self.assertNumQueries(0):
+            self.get_candidate_ids(inventory)
+            self.get_candidate_ids(inventory,
+                                   excluded_items_ids={self.free_item.id})
+
+    def test_select_items_with_shared_inventory(self):
+        manager = FulfillmentManager(item_tools)
+        inventory = InventorySnapshot(item_tools)
+        order_items = {
+            'item1': self.order_item,
+            'item2': self.order_item,
+            'item3': self.order_item
+        }
+
+        selected_items = manager._select_items(
+            order_items=order_items,
+            assigned_items_ids=[],
+            inventory=inventory)
+
+        # The same item is never selected for two nicknames.
+        selected_items_ids = [item.id for item in selected_items.values()
+                              if item is not None]
+        self.assertEqual(sorted(selected_items_ids),
+                         [self.free_item.id, self.pending_item.id])
+
+        with self.assertNumQueries(0):
+            selected_items = manager._select_items(
+                order_items={'item1': self.order_item},
+                assigned_items_ids=[],
+                inventory=inventory)
+        # Items held by None are preferred over pending ones.
+        self.assertEqual(selected_items['item1'].id, self.free_item.id)
+
+        with self.assertNumQueries(0):
+            selected_items = manager._select_items(
+                order_items={'item1': self.order_item},
+                assigned_items_ids=[self.free_item.id],
+                inventory=inventory)
+        self.assertEqual(selected_items['item1'].id, self.pending_item.id)
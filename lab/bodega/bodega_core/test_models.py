@@ -1,12 +1,15 @@
 """Test models."""
+import json
 import logging
+from datetime import timedelta
 
-from bodega_test_items.models import BasicItem
+from bodega_test_items.item_types import item_tools
+from bodega_test_items.models import BasicItem, ComplexItem
 from django.contrib.auth.models import User
 from django.test import TestCase
 from rkelery import states
 from rkelery.models import Task
-from .models import Order
+from .models import Item, Order, OrderUpdate
 
 log = logging.getLogger(__name__)
 
@@ -71,3 +74,158 @@ class ItemTestCase(TestCase):
         # order, which is a final state.
         final_item = BasicItem.objects.get(sid=item.sid)
         self.assertTrue(final_item.held_by_object_in_final_state)
+
+
+class SpecificItemTestCase(TestCase):
+    def test_specific_items(self):
+        basic_item = BasicItem.objects.create(choice='A')
+        complex_item = ComplexItem.objects.create(number=1)
+        other_basic_item = BasicItem.objects.create(choice='B')
+        generic_items = list(Item.objects.filter(
+            id__in=[basic_item.id, complex_item.id, other_basic_item.id])
+            .order_by('id'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [item_tools.get_item_type_name(generic_item)
+                 for generic_item in generic_items],
+                ['basic_item', 'complex_item', 'basic_item'])
+
+        # One query for each item type rather than for each item.
+        with self.assertNumQueries(2):
+            specific_items = item_tools.get_specific_items(generic_items)
+        self.assertEqual(specific_items,
+                         [basic_item, complex_item, other_basic_item])
+        self.assertIsInstance(specific_items[1], ComplexItem)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(item_tools.get_specific_item(generic_items[0]),
+                             basic_item)
+
+
+class OrderItemsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='User')
+        self.tab = self.user.tabs.get()
+
+    def create_order(self, *items_deltas):
+        order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=self.user,
+            tab=self.tab)
+        for items_delta in items_deltas:
+            OrderUpdate.objects.create(
+                items_delta=json.dumps(items_delta),
+                order=order,
+                creator=self.user)
+        return order
+
+    def test_items_are_materialized(self):
+        item1 = {'type': 'basic_item', 'requirements': {'boolean': True}}
+        item2 = {'type': 'basic_item', 'requirements': {'choice': 'A'}}
+        order = self.create_order({'item1': item1}, {'item2': item2})
+
+        order = Order.objects.get(id=order.id)
+        with self.assertNumQueries(0):
+            items = order.items
+        self.assertEqual(list(items.keys()), ['item1', 'item2'])
+        self.assertEqual(items['item1'], item1)
+        self.assertEqual(items['item2'], item2)
+        self.assertEqual(items, order.merge_items_from_updates())
+
+    def test_items_signature(self):
+        item1 = {'type': 'basic_item',
+                 'requirements': {'boolean': True, 'choice': 'A'}}
+        item2 = {'type': 'basic_item',
+                 'requirements': {'choice': 'A', 'boolean': True}}
+        order1 = self.create_order({'item1': item1})
+        order2 = self.create_order({'renamed': item2})
+        order3 = self.create_order({'item1': item1, 'item2': item2})
+
+        self.assertNotEqual(order1.items_signature, '')
+        self.assertEqual(order1.items_signature, order2.items_signature)
+        self.assertNotEqual(order1.items_signature, order3.items_signature)
+        self.assertEqual(
+            Order.objects.filter(
+                items_signature=order1.items_signature).count(),
+            2)
+
+    def test_updates_are_sequenced(self):
+        item1 = {'type': 'basic_item', 'requirements': {'boolean': True}}
+        item2 = {'type': 'basic_item', 'requirements': {'boolean': False}}
+        order = self.create_order({'pod': item1}, {'pod': item2})
+        fulfilled_update = OrderUpdate.objects.create(
+            order=order,
+            creator=self.user,
+            new_status=Order.STATUS_FULFILLED)
+        OrderUpdate.objects.create(
+            order=order,
+            creator=self.user,
+            comment='Extending')
+
+        # All of these updates were likely created within the same second,
+        # so only their sequence numbers determine their order.
+        self.assertEqual(
+            list(order.updates.order_by('sequence')
+                 .values_list('sequence', flat=True)),
+            [1, 2, 3, 4])
+        self.assertEqual(order.items['pod'], item2)
+        self.assertEqual(order.latest_update.comment, 'Extending')
+        self.assertEqual(order.fulfillment_time,
+                         fulfilled_update.time_created)
+
+
+class OrderTimesTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='User')
+        self.tab = self.user.tabs.get()
+        self.order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=self.user,
+            tab=self.tab)
+
+    def create_update(self, **kwargs):
+        # Load the order separately like another process would.
+        return OrderUpdate.objects.create(
+            order=Order.objects.get(id=self.order.id),
+            creator=self.user,
+            **kwargs)
+
+    def test_times_are_materialized(self):
+        self.create_update(expiration_time_limit_delta=timedelta(hours=1),
+                           time_limit_delta=timedelta(hours=2))
+        self.create_update(time_limit_notice=True)
+        fulfilled_update = self.create_update(
+            new_status=Order.STATUS_FULFILLED)
+        self.create_update(time_limit_delta=timedelta(hours=1))
+        notice_update = self.create_update(time_limit_notice=True)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.time_limit, timedelta(hours=3))
+        self.assertEqual(self.order.expiration_time_limit, timedelta(hours=1))
+        self.assertEqual(self.order.expiration_time,
+                         self.order.time_created + timedelta(hours=1))
+        self.assertEqual(self.order.fulfillment_time,
+                         fulfilled_update.time_created)
+        self.assertEqual(self.order.ejection_time,
+                         fulfilled_update.time_created + timedelta(hours=3))
+        self.assertEqual(self.order.number_of_ejection_notices, 1)
+        self.assertEqual(self.order.last_ejection_notice_time,
+                         notice_update.time_created)
+
+    def test_rebuild_update_times(self):
+        self.create_update(time_limit_delta=timedelta(hours=2))
+        fulfilled_update = self.create_update(
+            new_status=Order.STATUS_FULFILLED)
+        expected_times = self.order.get_update_times_from_updates()
+        Order.objects.filter(id=self.order.id).update(
+            time_limit=timedelta(), ejection_time=None)
+
+        self.order.refresh_from_db()
+        self.order.rebuild_update_times()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.time_limit, timedelta(hours=2))
+        self.assertEqual(self.order.ejection_time,
+                         fulfilled_update.time_created + timedelta(hours=2))
+        self.assertEqual(self.order.get_update_times_from_updates(),
+                         expected_times)
@@ -0,0 +1,110 @@
+"""Test profiling fulfillment passes."""
+import json
+from datetime import timedelta
+
+from bodega_test_items.item_types import item_tools
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .fulfillment import FulfillmentManager
+from .models import FulfillmentPassProfile, Order, OrderUpdate
+from .profiling import PassProfiler
+from .test_fulfillment import FulfillmentTestCase
+
+
+class PassProfilerTestCase(FulfillmentTestCase):
+    def create_order(self, requirements):
+        order = Order.objects.create(
+            status=Order.STATUS_OPEN,
+            owner=self.user,
+            tab=self.tab)
+        OrderUpdate.objects.create(
+            items_delta=json.dumps({
+                'item1': {
+                    'type': 'basic_item',
+                    'requirements': requirements
+                }
+            }),
+            order=order,
+            creator=self.user,
+            expiration_time_limit_delta=timedelta(minutes=60))
+        return order
+
+    def run_pass(self, profiler):
+        manager = FulfillmentManager(item_tools, profiler=profiler)
+        with profiler:
+            manager.fulfill_open_orders(
+                self.get_order_fulfillers, self.create_order_fulfiller,
+                self.create_item_maintenance_setter,
+                self.order_update_creator)
+
+    def test_pass_breakdown(self):
+        fulfillable_order = self.create_order({'choice': 'A'})
+        unfulfillable_order = self.create_order({'choice': 'D'})
+        profiler = PassProfiler(num_slowest_orders=1)
+        self.run_pass(profiler)
+
+        profile = profiler.get_profile()
+        self.assertGreater(profile['queries'], 0)
+        for name in ['get_open_orders', 'priorities', 'maintenance_orders',
+                     'expiration_checks', 'process_open_orders',
+                     'select_items', 'recipe_expansion']:
+            self.assertIn(name, profile['phases'])
+        self.assertGreater(profile['phases']['get_open_orders']['queries'], 0)
+        self.assertLessEqual(
+            profile['phases']['process_open_orders']['queries'],
+            profile['queries'])
+
+        self.assertEqual(profile['orders'], 2)
+        self.assertEqual(profile['outcomes'],
+                         {'fulfiller': 1, 'item_creators': 1})
+        self.assertEqual(profile['item_types']['basic_item']['orders'], 2)
+        records = {record['order']: record for record in profiler.orders}
+        self.assertEqual(records[fulfillable_order.sid]['outcome'],
+                         'fulfiller')
+        self.assertEqual(records[unfulfillable_order.sid]['item_creators'], 1)
+        self.assertIn('recipe_expansion',
+                      records[unfulfillable_order.sid]['phases'])
+        self.assertEqual(len(profile['slowest_orders']), 1)
+
+    def test_queries_are_not_counted_outside_profiler(self):
+        self.create_order({'choice': 'A'})
+        profiler = PassProfiler()
+        manager = FulfillmentManager(item_tools, profiler=profiler)
+        manager.fulfill_open_orders(
+            self.get_order_fulfillers, self.create_order_fulfiller,
+            self.create_item_maintenance_setter, self.order_update_creator)
+
+        self.assertEqual(profiler.queries, 0)
+        self.assertEqual(profiler.get_profile()['outcomes'], {'fulfiller': 1})
+
+    def test_queries_are_counted_without_logging(self):
+        self.create_order({'choice': 'A'})
+        force_debug_cursor = connection.force_debug_cursor
+        profiler = PassProfiler()
+        self.run_pass(profiler)
+        self.assertGreater(profiler.queries, 0)
+        self.assertEqual(connection.force_debug_cursor, force_debug_cursor)
+
+        # Queries are still counted while something else logs them.
+        self.create_order({'choice': 'A'})
+        profiler = PassProfiler()
+        with CaptureQueriesContext(connection) as context:
+            self.run_pass(profiler)
+        self.assertEqual(profiler.queries, len(context.captured_queries))
+        self.assertEqual(connection.force_debug_cursor, force_debug_cursor)
+
+    def test_save(self):
+        self.create_order({'choice': 'A'})
+        old_profile = FulfillmentPassProfile.objects.create(
+            seconds=1.0, queries=1, orders=0)
+        FulfillmentPassProfile.objects.filter(id=old_profile.id).update(
+            time_created=old_profile.time_created - timedelta(days=8))
+
+        profiler = PassProfiler()
+        self.run_pass(profiler)
+        profile = profiler.save(None, timedelta(days=7))
+
+        self.assertEqual(list(FulfillmentPassProfile.objects.all()),
+                         [profile])
+        self.assertEqual(profile.queries, profiler.queries)
+        self.assertEqual(json.loads(profile.profile_json)['orders'], 1)
@@ -0,0 +1,56 @@
+"""Test compiling item requirements into filters."""
+from bodega_test_items.filters import BasicItemFilter
+from bodega_test_items.item_types import item_tools
+from bodega_test_items.models import BasicItem
+from django.test import TestCase
+
+
+class CompiledRequirementsTestCase(TestCase):
+    def setUp(self):
+        self.item_a = BasicItem.objects.create(
+            choice=BasicItem.CHOICE_A, string='Foo', boolean=True)
+        self.item_b = BasicItem.objects.create(
+            choice=BasicItem.CHOICE_B, string='bar')
+
+    def assert_same_as_filterset(self, requirements):
+        queryset = BasicItem.objects.all()
+        compiled_requirements = item_tools.compile_requirements(
+            'basic_item', requirements)
+        self.assertEqual(
+            set(compiled_requirements.filter(queryset)),
+            set(BasicItemFilter(requirements, queryset).qs))
+        return compiled_requirements
+
+    def test_filter(self):
+        for requirements in [{},
+                             {'choice': 'A'},
+                             {'boolean': True, 'string': 'bar'},
+                             {'boolean': 'false'},
+                             {'choice': 'not a choice'},
+                             {'sid': self.item_b.sid},
+                             {'notafield': 'A'}]:
+            self.assert_same_as_filterset(requirements)
+
+    def test_matches(self):
+        compiled_requirements = self.assert_same_as_filterset(
+            {'choice': 'A', 'boolean': True})
+        self.assertTrue(compiled_requirements.matches(self.item_a))
+        self.assertFalse(compiled_requirements.matches(self.item_b))
+
+        # Strings match regardless of case, like the database collation.
+        compiled_requirements = self.assert_same_as_filterset(
+            {'string': 'BAR'})
+        self.assertTrue(compiled_requirements.matches(self.item_b))
+
+        # Filters which aren't plain lookups need the database.
+        compiled_requirements = self.assert_same_as_filterset(
+            {'sid': self.item_a.sid})
+        self.assertIsNone(compiled_requirements.matches(self.item_a))
+
+    def test_cached(self):
+        compiled_requirements = item_tools.compile_requirements(
+            'basic_item', {'choice': 'A', 'string': 'Foo'})
+        self.assertIs(
+            item_tools.compile_requirements(
+                'basic_item', {'string': 'Foo', 'choice': 'A'}),
+            compiled_requirements)
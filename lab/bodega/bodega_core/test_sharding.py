@@ -0,0 +1,49 @@
+"""Test splitting fulfillment into shards."""
+from django.test import TestCase
+from .exceptions import BodegaValueError
+from .sharding import FulfillmentShards
+
+
+def create_order_item(item_type, location=None):
+    requirements = {}
+    if location is not None:
+        requirements['location'] = location
+    return {'type': item_type, 'requirements': requirements}
+
+
+class FulfillmentShardsTestCase(TestCase):
+    def setUp(self):
+        self.shards = FulfillmentShards({
+            'colo': {'item_types': ['rktest_yml'], 'locations': ['COLO']},
+            'hq': {'item_types': ['rktest_yml'], 'locations': ['HQ']},
+            'basic': {'item_types': ['basic_item']}
+        })
+
+    def test_order_shard(self):
+        self.assertEqual(self.shards.get_names(), ['basic', 'colo', 'hq'])
+        self.assertEqual(
+            self.shards.get_order_shard({
+                'pod1': create_order_item('rktest_yml', 'COLO'),
+                'pod2': create_order_item('rktest_yml', 'COLO')
+            }),
+            'colo')
+        self.assertEqual(
+            self.shards.get_order_shard({
+                'pod': create_order_item('rktest_yml', 'HQ'),
+                'item': create_order_item('basic_item')
+            }),
+            None)
+        self.assertEqual(
+            self.shards.get_order_shard({
+                'pod': create_order_item('rktest_yml')
+            }),
+            None)
+
+    def test_overlapping_shards(self):
+        with self.assertRaises(BodegaValueError):
+            FulfillmentShards({
+                'colo': {'locations': ['COLO']},
+                'pods': {'item_types': ['rktest_yml']}
+            })
+        with self.assertRaises(BodegaValueError):
+            FulfillmentShards({'all': {}})
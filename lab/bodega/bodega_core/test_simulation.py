@@ -0,0 +1,77 @@
+"""Test the offline fulfillment simulation."""
+from bodega_test_items.item_types import item_tools
+from bodega_test_items.models import BasicItem
+from django.contrib.auth.models import User
+from django.test import TestCase
+from .models import Order
+from .simulation import FulfillmentSimulator, get_percentile
+
+
+def create_basic_item(event):
+    BasicItem.objects.create(**event['fields'])
+
+
+def create_events(num_items, num_orders, hold):
+    events = [{
+        'time': 0,
+        'type': 'create',
+        'item_type': 'basic_item',
+        'fields': {
+            'boolean': False,
+            'string': 'string%d' % index,
+            'choice': BasicItem.CHOICE_A
+        }
+    } for index in range(num_items)]
+    events.extend({
+        'time': 0,
+        'type': 'order',
+        'id': 'order%d' % index,
+        'owner': 'Owner%d' % index,
+        'items': {
+            'item1': {
+                'type': 'basic_item',
+                'requirements': {
+                    'boolean': False
+                }
+            }
+        },
+        'hold': hold
+    } for index in range(num_orders))
+    return events
+
+
+class FulfillmentSimulatorTestCase(TestCase):
+    def setUp(self):
+        self.order_update_creator = User.objects.get(id=1)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(get_percentile(values, 50), 50)
+        self.assertEqual(get_percentile(values, 99), 99)
+        self.assertEqual(get_percentile(values, 100), 100)
+        self.assertEqual(get_percentile([7], 90), 7)
+        self.assertIsNone(get_percentile([], 50))
+
+    def test_orders_wait_for_freed_items(self):
+        simulator = FulfillmentSimulator(
+            item_tools, create_events(num_items=2, num_orders=3, hold=120),
+            create_basic_item, self.order_update_creator, pass_interval=60)
+        results = simulator.run()
+
+        self.assertEqual(results['orders'], 3)
+        self.assertEqual(results['fulfilled'], 3)
+        self.assertEqual(results['latency_p50'], 0)
+        self.assertEqual(results['latency_max'], 120)
+        self.assertEqual([sim_pass['time'] for sim_pass in simulator.passes],
+                         [0, 60, 120, 240])
+        self.assertEqual(
+            [sim_pass['fulfilled'] for sim_pass in simulator.passes],
+            [2, 0, 1, 0])
+        # The order left waiting asks for an item creator every pass, but
+        # no items are created outside of the create events.
+        self.assertEqual(
+            [sim_pass['creators'] for sim_pass in simulator.passes],
+            [1, 1, 0, 0])
+        self.assertEqual(BasicItem.objects.count(), 2)
+        self.assertEqual(
+            Order.objects.filter(status=Order.STATUS_CLOSED).count(), 3)
@@ -0,0 +1,83 @@
+"""Test keeping warm pools of items created ahead of demand."""
+import json
+from datetime import timedelta
+
+from bodega_test_items.item_types import item_tools
+from bodega_test_items.models import BasicItem
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from .fulfillment import FulfillmentManager
+from .models import Order, OrderUpdate
+from .warm_pools import WarmPoolManager
+
+POOL_REQUIREMENTS = {'choice': BasicItem.CHOICE_D}
+WARM_POOLS = {
+    'basic_d': {
+        'type': 'basic_item',
+        'requirements': POOL_REQUIREMENTS,
+        'min_items': 1,
+        'max_items': 5,
+        # A quarter more than the demand window, so the target is a quarter
+        # more than the demand, rounded up.
+        'creation_latency': timedelta(days=8.75).total_seconds()
+    }
+}
+
+
+def get_num_pending_creators(pool_name):
+    return 0
+
+
+def get_creator_wall_times(task_name, start_time):
+    return []
+
+
+@override_settings(WARM_POOLS=WARM_POOLS,
+                   WARM_POOL_DEMAND_WINDOW=timedelta(days=7))
+class WarmPoolManagerTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='Foo')
+        for requirements in [POOL_REQUIREMENTS, POOL_REQUIREMENTS,
+                             {'choice': BasicItem.CHOICE_A}]:
+            order = Order.objects.create(
+                status=Order.STATUS_OPEN,
+                owner=user,
+                tab=user.tabs.get())
+            OrderUpdate.objects.create(
+                items_delta=json.dumps({
+                    'item1': {
+                        'type': 'basic_item',
+                        'requirements': requirements
+                    }
+                }),
+                order=order,
+                creator=user,
+                expiration_time_limit_delta=timedelta(minutes=60))
+        self.manager = WarmPoolManager(item_tools,
+                                       FulfillmentManager(item_tools))
+
+    def get_pool_status(self):
+        return self.manager.get_pool_status(
+            'basic_d', WARM_POOLS['basic_d'], get_num_pending_creators,
+            get_creator_wall_times)
+
+    def test_pool_is_replenished_up_to_target(self):
+        status = self.get_pool_status()
+        self.assertEqual(status['demand'], 2)
+        self.assertEqual(status['target'], 3)
+        self.assertEqual(status['idle_items'], 0)
+
+        pool_creators = self.manager.replenish_pools(
+            get_num_pending_creators, get_creator_wall_times)
+        self.assertEqual(len(pool_creators), 3)
+        self.assertEqual(set(pool_name for pool_name, _ in pool_creators),
+                         set(['basic_d']))
+
+        # Creator tasks of test recipes create their items right away.
+        status = self.get_pool_status()
+        self.assertEqual(status['idle_items'], 3)
+        self.assertEqual(status['idle_cost'], 3.0)
+        self.assertEqual(
+            self.manager.replenish_pools(get_num_pending_creators,
+                                         get_creator_wall_times),
+            [])
@@ -1,7 +1,18 @@
 """Lower level Bodega utilities."""
+from collections import defaultdict
+
 from bodega_core.models import Item
 from rest_framework import serializers
 from . import exceptions
+from .pricing import get_item_prices, register_item_types
+from .requirement_filters import CompiledRequirements
+from .requirements import get_requirements_signature
+
+# Keep each query well below the 2100 parameters allowed by SQL Server.
+ITEM_IDS_BATCH_SIZE = 1000
+# Distinct requirements seen by a long-running worker are bounded in
+# practice, but start over rather than grow without bound if they aren't.
+MAX_COMPILED_REQUIREMENTS = 10000
 
 
 def get_remote_field_name(item_type):
@@ -52,9 +63,11 @@ def create_item_view_set_class(base_class, item_type, item_serializer_class):
 class ItemTools(object):
     def __init__(self, item_types, base_serializer_class, base_view_set_class):
         """Create item tools."""
+        register_item_types(item_types)
         self.item_types = {
             item_type.name: item_type for item_type in item_types
         }
+        self._compiled_requirements = {}
         self.item_types_by_field_name = {
             get_remote_field_name(item_type): item_type
             for item_type in item_types
@@ -130,18 +143,51 @@ class ItemTools(object):
         if prefiltered_items_queryset is None:
             prefiltered_items_queryset = item_type_def.queryset.all()
 
-        return item_type_def.filter_class(item_requirements,
-                                          prefiltered_items_queryset).qs
+        compiled_requirements = self.compile_requirements(item_type,
+                                                          item_requirements)
+        return compiled_requirements.filter(prefiltered_items_queryset)
+
+    def compile_requirements(self, item_type, item_requirements):
+        """Return the compiled filter for requirements of an item type.
+
+        Compiled requirements are cached by their signature for the lifetime
+        of the item tools, since they only depend on the filter class.
+        """
+        signature = get_requirements_signature(item_type, item_requirements)
+        compiled_requirements = self._compiled_requirements.get(signature,
+                                                                None)
+        if compiled_requirements is None:
+            item_type_def = self.item_types.get(item_type, None)
+            if item_type_def is None:
+                raise exceptions.BodegaValueError(
+                    'item_type=%s was not recognized. Expecting one of: %s' %
+                    (repr(item_type), repr(self.item_types.keys())))
+            if len(self._compiled_requirements) >= \
+                    MAX_COMPILED_REQUIREMENTS:
+                self._compiled_requirements.clear()
+            compiled_requirements = CompiledRequirements(
+                item_type_def.filter_class, item_requirements,
+                item_type_def.queryset)
+            self._compiled_requirements[signature] = compiled_requirements
+        return compiled_requirements
 
     def get_generic_queryset_for_all_item_types(self):
-        generic_item_qs = Item.objects.none()
-        for item_type in self.item_types.keys():
-            specific_item_qs = self.get_queryset_for_item_type(item_type)
-            item_ids = [item.id for item in specific_item_qs]
-            generic_item_qs = \
-                generic_item_qs | Item.objects.filter(id__in=item_ids)
+        """Return the generic items of all the registered item types.
 
-        return generic_item_qs
+        Items are told apart by their specific_type so this stays a single
+        query regardless of how many items there are.
+        """
+        return Item.objects.filter(
+            specific_type__in=sorted(self.item_types_by_field_name.keys()))
+
+    def select_specific_items(self, generic_item_queryset):
+        """Join the specific items of generic items in the same query.
+
+        Otherwise finding the specific item of each generic item takes a
+        query per item type.
+        """
+        return generic_item_queryset.select_related(
+            *self.item_types_by_field_name.keys())
 
     def get_queryset_for_item_type(self, item_type):
         item_type_def = self.item_types.get(item_type, None)
@@ -152,6 +198,11 @@ class ItemTools(object):
         return item_type_def.queryset.all()
 
     def get_specific_item_field_name(self, generic_item):
+        if generic_item.specific_type in self.item_types_by_field_name:
+            return generic_item.specific_type
+
+        # Items which haven't been saved since specific_type was introduced
+        # can only be told apart by probing each item type.
         for field_name in self.item_types_by_field_name.keys():
             if hasattr(generic_item, field_name):
                 return field_name
@@ -163,8 +214,41 @@ class ItemTools(object):
         if field_name is None:
             return None
 
+        item_type = self.item_types_by_field_name[field_name]
+        if isinstance(generic_item, item_type.model):
+            return generic_item
         return getattr(generic_item, field_name)
 
+    def get_specific_items(self, generic_items):
+        """Return the specific items of a list of generic items.
+
+        The specific items are loaded with one query per item type rather
+        than one per item. Items without a known item type map to None.
+        """
+        generic_items = list(generic_items)
+        ids_by_field_name = defaultdict(list)
+        for generic_item in generic_items:
+            field_name = self.get_specific_item_field_name(generic_item)
+            if field_name is not None:
+                ids_by_field_name[field_name].append(generic_item.id)
+
+        specific_items_by_id = {}
+        for field_name, ids in ids_by_field_name.items():
+            model = self.item_types_by_field_name[field_name].model
+            for start in range(0, len(ids), ITEM_IDS_BATCH_SIZE):
+                specific_items_by_id.update(model.objects.in_bulk(
+                    ids[start:start + ITEM_IDS_BATCH_SIZE]))
+
+        return [specific_items_by_id.get(generic_item.id, None)
+                for generic_item in generic_items]
+
+    def get_item_type_name(self, generic_item):
+        field_name = self.get_specific_item_field_name(generic_item)
+        if field_name is None:
+            return None
+
+        return self.item_types_by_field_name[field_name].name
+
     def get_manager_class(self, generic_item):
         field_name = self.get_specific_item_field_name(generic_item)
         if field_name is None:
@@ -182,14 +266,4 @@ class ItemTools(object):
 
     # Return a dictionary of price per item in the list of items passed
     def get_prices_for_items(self, items):
-        item_prices = {}
-        for (nickname, item) in items:
-            item_type = item['type']
-            item_requirements = item['requirements']
-            item_manager = \
-                self.item_types[item_type].manager_class()
-            item_price = \
-                item_manager.get_item_price(item_requirements)
-            item_prices[nickname] = item_price
-
-        return item_prices
+        return get_item_prices(items)
@@ -0,0 +1,251 @@
+"""Keep warm pools of dynamic items created ahead of demand.
+
+Dynamic items such as cdm_node or ubuntu_machine take many minutes to
+create, and normally creation only starts once an order asks for one. A warm
+pool keeps some unheld items with the same type and requirements around so
+that orders for them can be fulfilled right away. Pools are configured with
+WARM_POOLS, which maps the name of each pool to its spec:
+
+    WARM_POOLS = {
+        'ubuntu_colo': {
+            'type': 'ubuntu_machine',
+            'requirements': {'location': 'COLO', 'model': 'aws-m4.large'},
+            'min_items': 0,
+            'max_items': 5
+        }
+    }
+
+The location of a pool is part of its requirements. The target size of a
+pool follows from Little's law: the rate at which order items with exactly
+the pool's requirements were placed over WARM_POOL_DEMAND_WINDOW, times how
+long it takes to create an item, clamped between min_items and max_items.
+Creation latency is measured from recent creator tasks unless the spec sets
+creation_latency in seconds.
+
+The orders placed and fulfilled over the window are read once by each
+WarmPoolManager and counted by the signature of their items, so a manager
+should be created for every run over the pools.
+
+Items of a pool aren't reserved for anything. They're fulfilled and cleaned
+up like any other items, so unused ones are eventually destroyed once past
+their shelf life and the pool is replenished again.
+"""
+import logging
+import statistics
+from collections import Counter, defaultdict
+from datetime import datetime
+from math import ceil
+
+from bodega_core.exceptions import bodega_value_error
+from django.conf import settings
+from pytz import utc
+
+from .models import Item, Order, OrderUpdate
+from .pricing import get_item_price
+from .requirements import (get_requirements_signature,
+                           load_order_items_json)
+
+log = logging.getLogger(__name__)
+
+
+class WarmPoolManager(object):
+    def __init__(self, item_tools, fulfillment_manager):
+        """Initialize WarmPoolManager.
+
+        Item creators are found with fulfillment_manager the same way as for
+        orders, so pools of items with ingredients work as well.
+        """
+        self.item_tools = item_tools
+        self.fulfillment_manager = fulfillment_manager
+        self._window_start_time = None
+        self._signatures_by_items_signature = {}
+        self._demand = None
+        self._wait_seconds = None
+
+    def _validate_spec(self, pool_name, pool_spec):
+        if pool_spec.get('type', None) not in self.item_tools.item_types:
+            bodega_value_error(
+                log,
+                'Warm pool %s has an unknown item type %s.'
+                % (repr(pool_name), repr(pool_spec.get('type', None))))
+        if pool_spec.get('min_items', 0) > pool_spec.get('max_items', 0):
+            bodega_value_error(
+                log,
+                'Warm pool %s has a min_items greater than its max_items.'
+                % repr(pool_name))
+
+    def _get_window_start_time(self):
+        if self._window_start_time is None:
+            self._window_start_time = \
+                datetime.now(utc) - settings.WARM_POOL_DEMAND_WINDOW
+        return self._window_start_time
+
+    def _count_signatures(self, items_signature, items_json):
+        """Return how many order items of an order have each signature.
+
+        Orders with the same items signature request the same items, so
+        their items are only parsed once.
+        """
+        if not items_signature:
+            return self._count_order_items_signatures(
+                load_order_items_json(items_json) if items_json else {})
+        if items_signature not in self._signatures_by_items_signature:
+            self._signatures_by_items_signature[items_signature] = \
+                self._count_order_items_signatures(
+                    load_order_items_json(items_json))
+        return self._signatures_by_items_signature[items_signature]
+
+    def _count_order_items_signatures(self, order_items):
+        return Counter(
+            get_requirements_signature(order_item['type'],
+                                       order_item['requirements'])
+            for order_item in order_items.values())
+
+    def _get_demand(self, signature):
+        """Return how many order items matched a pool over the window."""
+        if self._demand is None:
+            self._demand = Counter()
+            for items_signature, items_json in Order.objects \
+                    .filter(time_created__gte=self._get_window_start_time()) \
+                    .values_list('items_signature', 'items_json'):
+                self._demand.update(
+                    self._count_signatures(items_signature, items_json))
+        return self._demand[signature]
+
+    def _get_creation_latency(self, pool_spec, window_start_time,
+                              get_creator_wall_times):
+        """Return how many seconds it takes to create an item of a pool."""
+        if 'creation_latency' in pool_spec:
+            return float(pool_spec['creation_latency'])
+
+        item_type = pool_spec['type']
+        item_manager = self.item_tools.item_types[item_type].manager_class()
+        recipe = item_manager.get_item_recipe(pool_spec['requirements'])
+        if not recipe:
+            return None
+
+        creator_task = recipe.creator_task(pool_spec['requirements'])
+        wall_times = get_creator_wall_times(creator_task.name,
+                                            window_start_time)
+        if not wall_times:
+            return None
+        return statistics.median(wall_time.total_seconds()
+                                 for wall_time in wall_times)
+
+    def _get_idle_items(self, pool_spec):
+        item_type = pool_spec['type']
+        unheld_items = self.item_tools \
+            .get_queryset_for_item_type(item_type) \
+            .filter(state=Item.STATE_ACTIVE, held_by_object_id=None)
+        return self.item_tools.find_eligible_items_for_requirements(
+            item_type, pool_spec['requirements'], unheld_items)
+
+    def _get_hit_rate(self, signature, creation_latency):
+        """Return the fraction of fulfilled matching orders that didn't wait.
+
+        Orders waiting for an item to be created wait at least the creation
+        latency, so orders fulfilled faster than that count as hits.
+        """
+        if creation_latency is None:
+            return None
+
+        if self._wait_seconds is None:
+            self._wait_seconds = defaultdict(list)
+            for time_fulfilled, time_created, items_signature, items_json \
+                    in OrderUpdate.objects.filter(
+                        new_status=Order.STATUS_FULFILLED,
+                        time_created__gte=self._get_window_start_time()) \
+                    .values_list('time_created', 'order__time_created',
+                                 'order__items_signature',
+                                 'order__items_json'):
+                wait_seconds = (time_fulfilled - time_created).total_seconds()
+                for order_item_signature in \
+                        self._count_signatures(items_signature, items_json):
+                    self._wait_seconds[order_item_signature].append(
+                        wait_seconds)
+
+        wait_seconds = self._wait_seconds.get(signature, [])
+        if not wait_seconds:
+            return None
+        num_hits = len([seconds for seconds in wait_seconds
+                        if seconds < creation_latency])
+        return float(num_hits) / len(wait_seconds)
+
+    def get_pool_status(self, pool_name, pool_spec, get_num_pending_creators,
+                        get_creator_wall_times, include_hit_rate=False):
+        """Return the demand, target and supply of a warm pool.
+
+        get_num_pending_creators(pool_name) returns how many item creators
+        published for the pool haven't finished yet, and
+        get_creator_wall_times(task_name, start_time) returns the wall times
+        of the successful creator tasks of a name since the start time.
+        """
+        self._validate_spec(pool_name, pool_spec)
+        item_type = pool_spec['type']
+        requirements = pool_spec['requirements']
+        signature = get_requirements_signature(item_type, requirements)
+        demand_window = settings.WARM_POOL_DEMAND_WINDOW
+
+        demand = self._get_demand(signature)
+        creation_latency = self._get_creation_latency(
+            pool_spec, self._get_window_start_time(), get_creator_wall_times)
+        target = pool_spec.get('min_items', 0)
+        if creation_latency is not None:
+            arrival_rate = demand / demand_window.total_seconds()
+            target = max(target, int(ceil(arrival_rate * creation_latency)))
+        target = min(target, pool_spec.get('max_items', 0))
+
+        num_idle_items = self._get_idle_items(pool_spec).count()
+        item_price = get_item_price(item_type, requirements)
+        status = {
+            'pool': pool_name,
+            'type': item_type,
+            'requirements': requirements,
+            'demand': demand,
+            'creation_latency': creation_latency,
+            'target': target,
+            'idle_items': num_idle_items,
+            'pending_creators': get_num_pending_creators(pool_name),
+            'idle_cost': num_idle_items * item_price
+        }
+        if include_hit_rate:
+            status['hit_rate'] = self._get_hit_rate(
+                signature, creation_latency)
+        return status
+
+    def replenish_pools(self, get_num_pending_creators,
+                        get_creator_wall_times):
+        """Return the item creators needed to bring pools up to target.
+
+        Returns a list of (pool name, signature) tuples. The creators are
+        ItemCreatorTasks given the name of their pool, so they're linked to
+        it once published.
+        """
+        pool_creators = []
+        assigned_items_ids = []
+        for pool_name, pool_spec in sorted(settings.WARM_POOLS.items()):
+            try:
+                status = self.get_pool_status(
+                    pool_name, pool_spec, get_num_pending_creators,
+                    get_creator_wall_times)
+            except Exception:
+                log.warning('Caught Exception while checking warm pool %s. '
+                            'Not replenishing it.' % repr(pool_name),
+                            exc_info=True)
+                continue
+
+            num_missing_items = status['target'] - status['idle_items'] - \
+                status['pending_creators']
+            log.debug('Warm pool %s: %s' % (repr(pool_name), status))
+            for _ in range(num_missing_items):
+                item_creators = self.fulfillment_manager.get_item_creators(
+                    pool_spec['type'], pool_spec['requirements'],
+                    assigned_items_ids,
+                    creator_kwargs={'warm_pool': pool_name})
+                if not item_creators:
+                    log.info('Could not find a way to create items for warm '
+                             'pool %s.' % repr(pool_name))
+                    break
+                pool_creators += [(pool_name, item_creator)
+                                  for item_creator in item_creators]
+        return pool_creators
@@ -2,6 +2,7 @@
 import logging
 from datetime import timedelta
 
+from bodega_aws.tasks import handle_ec2_ingredients_cleanup
 from bodega_core import ItemManager
 from bodega_core.exceptions import bodega_validation_error
 from bodega_core.models import Item
@@ -78,6 +79,9 @@ class CockroachDBDepsMachineManager(ItemManager):
             deps_machine.state = Item.STATE_DESTROYED
             deps_machine.save()
 
+    def handle_items_cleanup(self, deps_machines):
+        handle_ec2_ingredients_cleanup(deps_machines, self.handle_cleanup)
+
     def taste_test(self, crdb_item, requirements):
         return True
 
@@ -6,7 +6,7 @@ from bodega_aws.utils import (create_ec2_instance_on_aws,
                               get_ec2_instance_type_for_model,
                               get_or_create_aws_network)
 from bodega_core.models import Location, Network
-from bodega_core.tasks import ThrottledTask
+from bodega_core.tasks import ItemCreatorTask, ThrottledTask
 from bodega_generic_items.utils import change_hostname_on_ubuntu_machine
 from rkelery import register_task
 
@@ -15,7 +15,7 @@ from .utils import get_ami_id_for_cockroachdb_deps_machine
 
 
 @register_task
-class CreateCockroachDBDepsMachineFromAwsTask(ThrottledTask):
+class CreateCockroachDBDepsMachineFromAwsTask(ItemCreatorTask, ThrottledTask):
 
     @classmethod
     def get_summary(cls, ingredients, requirements):
@@ -3,6 +3,7 @@ import logging
 import subprocess
 from datetime import timedelta
 
+from bodega_aws.tasks import handle_ec2_ingredients_cleanup
 from bodega_core import ItemManager
 from bodega_core.exceptions import bodega_validation_error
 from bodega_core.models import Item
@@ -80,6 +81,9 @@ class MssqlServerManager(ItemManager):
             mssql_server.state = Item.STATE_DESTROYED
             mssql_server.save()
 
+    def handle_items_cleanup(self, mssql_servers):
+        handle_ec2_ingredients_cleanup(mssql_servers, self.handle_cleanup)
+
     def taste_test(self, mssql_server, requirements):
         return True
 
@@ -164,6 +168,9 @@ class UbuntuMachineManager(ItemManager):
             ubuntu_machine.state = Item.STATE_DESTROYED
             ubuntu_machine.save()
 
+    def handle_items_cleanup(self, ubuntu_machines):
+        handle_ec2_ingredients_cleanup(ubuntu_machines, self.handle_cleanup)
+
     def taste_test(self, ubuntu_item, requirements):
         return True
 
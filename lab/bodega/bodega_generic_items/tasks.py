@@ -7,7 +7,7 @@ from bodega_aws.utils import (create_ec2_instance_on_aws,
                               get_ec2_instance_type_for_model,
                               get_or_create_aws_network)
 from bodega_core.models import Location, Network
-from bodega_core.tasks import ThrottledTask
+from bodega_core.tasks import ItemCreatorTask, ThrottledTask
 from bodega_vsphere.models import VSphereVirtualMachine
 from bodega_vsphere.utils import (create_virtual_machine_on_vsphere,
                                   get_esx_host,
@@ -27,7 +27,7 @@ log = logging.getLogger(__name__)
 
 
 @register_task
-class CreateMssqlServerFromAwsTask(ThrottledTask):
+class CreateMssqlServerFromAwsTask(ItemCreatorTask, ThrottledTask):
 
     @classmethod
     def get_summary(cls, ingredients, requirements):
@@ -80,7 +80,7 @@ class CreateMssqlServerFromAwsTask(ThrottledTask):
 
 
 @register_task
-class CreateUbuntuMachineFromAwsTask(ThrottledTask):
+class CreateUbuntuMachineFromAwsTask(ItemCreatorTask, ThrottledTask):
 
     @classmethod
     def get_summary(cls, ingredients, requirements):
@@ -147,7 +147,7 @@ class CreateUbuntuMachineFromAwsTask(ThrottledTask):
 
 
 @register_task
-class CreateUbuntuMachineFromVSphereTask(ThrottledTask):
+class CreateUbuntuMachineFromVSphereTask(ItemCreatorTask, ThrottledTask):
 
     @classmethod
     def get_summary(cls, ingredients, requirements):
@@ -17,6 +17,7 @@ from bodega_core.exceptions import (bodega_type_error,
                                     bodega_validation_error,
                                     bodega_value_error)
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from pytz import utc
 from .filters import RktestYmlFilter
 from .models import Item, JenkinsTask, RktestYml
@@ -247,6 +248,11 @@ class RktestYmlManager(ItemManager):
             return False
         return True
 
+    def get_managed_items_queryset(self, item_queryset):
+        return item_queryset.filter(
+            held_by_content_type=ContentType.objects.get_for_model(
+                JenkinsTask))
+
     def get_item_recipe(self, requirements):
         return None
 
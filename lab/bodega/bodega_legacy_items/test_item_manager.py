@@ -1,9 +1,12 @@
 """Test Bodega Legacy Items' item_manager."""
 from bodega_core.models import Location, Network
+from bodega_core.pricing import (get_order_price, invalidate_item_prices,
+                                 register_item_types)
 from django.test import TestCase
 from .item_managers import (get_item_price_by_platform,
                             PLATFORM_TO_ITEM_PRICE,
                             UNKNOWN_PLATFORM_DEFAULT_PRICE)
+from .item_types import definitions
 from .models import RktestYml
 
 
@@ -54,3 +57,47 @@ class ItemManagerTestCase(TestCase):
         price = get_item_price_by_platform(requirements)
 
         self.assertEqual(self.prod_brik_price, price)
+
+
+class ItemPriceCacheTestCase(TestCase):
+    def setUp(self):
+        register_item_types(definitions)
+        invalidate_item_prices()
+        self.location = Location.objects.get(name='HQ')
+        self.network = Network.objects.get(location=self.location)
+        self.order_items = {
+            'item1': {
+                'type': 'rktest_yml',
+                'requirements': {'filename': 'Item1.yml'}
+            },
+            'item2': {
+                'type': 'rktest_yml',
+                'requirements': {'platform': 'DYNAPOD'}
+            }
+        }
+
+    def test_prices_are_cached(self):
+        """Test that a priced order costs no queries after warm-up.
+
+        Prices depending on the inventory are computed again once an item
+        is created.
+        """
+        with self.assertNumQueries(1):
+            price = get_order_price(self.order_items)
+        self.assertEqual(UNKNOWN_PLATFORM_DEFAULT_PRICE +
+                         PLATFORM_TO_ITEM_PRICE['DYNAPOD'], price)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(price, get_order_price(self.order_items))
+
+        RktestYml.objects.create(filename='Item1.yml',
+                                 location=self.location,
+                                 network=self.network,
+                                 platform=RktestYml.PLATFORM_AWS)
+        with self.assertNumQueries(1):
+            price = get_order_price(self.order_items)
+        self.assertEqual(PLATFORM_TO_ITEM_PRICE[RktestYml.PLATFORM_AWS] +
+                         PLATFORM_TO_ITEM_PRICE['DYNAPOD'], price)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(price, get_order_price(self.order_items))
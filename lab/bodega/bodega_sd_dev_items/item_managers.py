@@ -5,6 +5,7 @@ from datetime import timedelta
 from django.contrib.contenttypes.models import ContentType
 
 # flake8: noqa I100 # Turn off broken import ordering check as flake8 have bug
+from bodega_aws.tasks import handle_ec2_ingredients_cleanup
 from bodega_core import ItemManager
 from bodega_core.exceptions import bodega_validation_error
 from bodega_core.models import Item
@@ -77,6 +78,11 @@ class SdDevMachineManager(ItemManager):
             sd_dev_machine.state = Item.STATE_DESTROYED
             sd_dev_machine.save()
 
+    def handle_items_cleanup(self, sd_dev_machines):
+        # Machines made from KubernetesPods are still destroyed one at a time
+        # by handle_cleanup.
+        handle_ec2_ingredients_cleanup(sd_dev_machines, self.handle_cleanup)
+
     def taste_test(self, sd_dev_machine, requirements):
         log.debug('Taste testing %s on IP %s to make sure SSH is usable.'
                   % (sd_dev_machine, sd_dev_machine.ip_address))
@@ -16,11 +16,11 @@ from bodega_aws.utils import search_for_ami_id_by_name
 from bodega_core.exceptions import bodega_error
 from bodega_core.exceptions import bodega_value_error
 from bodega_core.models import Location, Network
+from bodega_core.tasks import ItemCreatorTask
 from bodega_kubernetes.models import KubernetesPod
 from bodega_kubernetes.utils import get_kubernetes_client
 from bodega_kubernetes.utils import get_kubernetes_farm_for_location
 from bodega_utils.ssh import check_ssh_availability
-from rkelery import Task
 from rkelery import register_task
 from .models import SdDevMachine
 from .utils import get_v1_pod_configuration
@@ -30,7 +30,7 @@ PHASE_RUNNING = 'Running'
 
 
 @register_task
-class CreateSdDevMachineFromKubernetesTask(Task):
+class CreateSdDevMachineFromKubernetesTask(ItemCreatorTask):
     """Get Dev Machine from Kubernetes with a namespace and version hash.
 
     This task will request an image from the registry with a specified
@@ -109,7 +109,7 @@ class CreateSdDevMachineFromKubernetesTask(Task):
 
 
 @register_task
-class CreateSdDevMachineFromAwsTask(Task):
+class CreateSdDevMachineFromAwsTask(ItemCreatorTask):
     @classmethod
     def get_summary(cls, ingredients, requirements):
         return (
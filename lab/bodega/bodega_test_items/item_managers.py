@@ -52,7 +52,7 @@ class BasicItemManager(ItemManager):
         basic_item.held_by = None
         basic_item.save()
 
-    def taste_test(self, basic_item):
+    def taste_test(self, basic_item, requirements):
         return True
 
     def validate_item_requirements(self, item_requirements, user_sid,
@@ -103,7 +103,7 @@ class ComplexItemManager(ItemManager):
         complex_item.held_by = None
         complex_item.save()
 
-    def taste_test(self, complex_item):
+    def taste_test(self, complex_item, requirements):
         return True
 
     def validate_item_requirements(self, item_requirements, user_sid,
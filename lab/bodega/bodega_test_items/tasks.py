@@ -1,12 +1,13 @@
 """Tasks for Bodega CdmNode items."""
 import logging
-from rkelery import register_task, Task
+from bodega_core.tasks import ItemCreatorTask
+from rkelery import register_task
 
 log = logging.getLogger(__name__)
 
 
 @register_task
-class CreateBasicItemTask(Task):
+class CreateBasicItemTask(ItemCreatorTask):
     @classmethod
     def get_summary(cls, requirements):
         pass
@@ -16,7 +17,7 @@ class CreateBasicItemTask(Task):
 
 
 @register_task
-class CreateComplexItemTask(Task):
+class CreateComplexItemTask(ItemCreatorTask):
     @classmethod
     def get_summary(cls, requirements):
         pass
@@ -115,10 +115,14 @@ class BodegaCommands(object):
                 mins_since_creation = int(
                     (current_time - order_creation_time).total_seconds() / 60)
 
-                tab_based_priority = order_details['tab_based_priority']
-                queue_length = \
-                    self._get_order_queue_length(order_creation_time,
-                                                 tab_based_priority)
+                # Servers estimating queue positions themselves save us
+                # from counting the orders ahead through another request.
+                queue_length = order_details.get('queue_position', None)
+                if queue_length is None:
+                    tab_based_priority = order_details['tab_based_priority']
+                    queue_length = \
+                        self._get_order_queue_length(order_creation_time,
+                                                     tab_based_priority)
 
                 if queue_length != prev_queue_length or \
                         mins_since_creation != prev_mins_since_creation:
@@ -126,6 +130,11 @@ class BodegaCommands(object):
                     print """It has been %sm since creation of %s and there are
                             at most %s orders ahead in queue"""\
                           % (mins_since_creation, order_sid, queue_length)
+                    estimated_fulfillment_time = \
+                        order_details.get('estimated_fulfillment_time', None)
+                    if estimated_fulfillment_time:
+                        print 'It is estimated to be fulfilled by %s' \
+                              % estimated_fulfillment_time
 
                     prev_queue_length = queue_length
                     prev_mins_since_creation = mins_since_creation
@@ -11,6 +11,24 @@ def instrumentation_context(context):
     return _InstrumentationContextManager(context)
 
 
+def increment_counter(stat_name, count=1):
+    """Increment a statsd counter, never raising if publishing fails."""
+    try:
+        _InstrumentationContextManager._get_stats_client().incr(
+            stat_name, count)
+    except Exception:
+        log.error("Could not publish metrics", exc_info=1)
+
+
+def record_timing(stat_name, milliseconds):
+    """Record a statsd timing, never raising if publishing fails."""
+    try:
+        _InstrumentationContextManager._get_stats_client().timing(
+            stat_name, milliseconds)
+    except Exception:
+        log.error("Could not publish metrics", exc_info=1)
+
+
 class _InstrumentationContextManager(object):
     """Context manager class to support instrumentation_context().
 
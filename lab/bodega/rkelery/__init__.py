@@ -136,6 +136,28 @@ class Task(object):
         """
         return '%s(%s)' % (cls.get_task_name(), arguments_string(args, kwargs))
 
+    @classmethod
+    def get_task_links(cls, task_args, task_kwargs):
+        """Get the domain objects a task instance acts on.
+
+        These are saved as TaskLink models when the task is published so
+        that the tasks acting on an object can be found with an indexed
+        query. The default implementation calls `get_links` which is often
+        more convenient for subclasses to implement.
+        """
+        return cls.get_links(*task_args, **task_kwargs)
+
+    @classmethod
+    def get_links(cls, *args, **kwargs):
+        """Get the domain objects a task instance acts on.
+
+        Returns a list of (name, sid) tuples, where the name identifies the
+        kind of object such as "order" and the sid identifies the object.
+        The default implementation assumes a task acts on no objects in
+        particular, so it returns an empty list.
+        """
+        return []
+
     @classmethod
     def get_task_timeout(cls, task_args, task_kwargs):
         """Get the timeout value for a task instance."""
@@ -0,0 +1,40 @@
+"""Create the TaskLinks of tasks published before links were tracked.
+
+Only tasks which haven't finished yet are backfilled by default since they're
+the only ones anything looks up by their links. Use --all to backfill the
+whole task history.
+"""
+
+import logging
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rkelery import states
+from rkelery.models import Task
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Create the TaskLinks of tasks published without them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Backfill finished tasks as well.')
+
+    def handle(self, *args, **options):
+        tasks = Task.objects.filter(links=None)
+        if not options['all']:
+            tasks = tasks.filter(task_result__status__in=states.UNREADY_STATES)
+        tasks_ids = list(tasks.values_list('id', flat=True))
+        log.info('%d tasks found without links.' % len(tasks_ids))
+
+        num_links = 0
+        for start in range(0, len(tasks_ids), BATCH_SIZE):
+            batch_ids = tasks_ids[start:start + BATCH_SIZE]
+            with transaction.atomic():
+                for task in Task.objects.filter(id__in=batch_ids):
+                    num_links += len(task.create_links())
+        log.info('Created %d links for %d tasks.'
+                 % (num_links, len(tasks_ids)))
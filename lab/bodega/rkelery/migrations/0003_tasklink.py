@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.4 on 2018-06-04 21:15
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rkelery', '0002_remove_unique_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskLink',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=64)),
+                ('sid', models.CharField(max_length=255)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='links', to='rkelery.Task')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='tasklink',
+            index_together=set([('name', 'sid')]),
+        ),
+    ]
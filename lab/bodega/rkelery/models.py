@@ -175,6 +175,14 @@ class Task(models.Model):
     def task_class(self):
         return get_task_class(self.task)
 
+    def create_links(self):
+        """Create the TaskLinks declared by the concrete task class."""
+        links = self.task_class.get_task_links(self.args, self.kwargs)
+        return TaskLink.objects.bulk_create([
+            TaskLink(task=self, name=name, sid=str(sid))
+            for (name, sid) in links
+        ])
+
     def simulate_run(self):
         """Simulate running the task using the current process as the worker.
 
@@ -204,3 +212,29 @@ class Task(models.Model):
 
         self.task_result.save()
         return ret
+
+
+class TaskLink(models.Model):
+    """A domain object which a task instance acts on.
+
+    Objects are referenced by a name for their kind and their SID rather than
+    a foreign key so that RKelery doesn't need to know about the models of
+    the apps using it. Finding the tasks acting on an object this way uses an
+    index, unlike searching the JSON arguments of every task ever published.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, null=False, blank=False,
+        related_name='links')
+    name = models.CharField(max_length=64, null=False, blank=False)
+    sid = models.CharField(max_length=255, null=False, blank=False)
+
+    class Meta:
+        """Metadata for TaskLink."""
+
+        index_together = [('name', 'sid')]
+
+    def __str__(self):
+        """Loggable string representation of this task link."""
+        return '%s %s=%s' % (self.task_id, self.name, self.sid)
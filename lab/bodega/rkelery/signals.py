@@ -77,4 +77,5 @@ def track_task_publish(sender=None, headers=None, body=None, **kwargs):
             args=task_args,
             kwargs=task_kwargs,
             embed_json=json_dump(embed))
+        task.create_links()
         log.debug('Publishing task %s.' % str(task))
@@ -76,13 +76,19 @@ RKELERY_BEAT_SCHEDULE = {
             'expires': timedelta(minutes=3).total_seconds()
         }
     },
+    'ReplenishWarmPools': {
+        'task': 'bodega_all.ReplenishWarmPools',
+        'schedule': timedelta(minutes=5).total_seconds(),
+        'options': {
+            'expires': timedelta(minutes=5).total_seconds()
+        }
+    },
     'ProcessOrderTimeLimits': {
         'task': 'bodega_all.ProcessOrderTimeLimits',
         # This is somewhat spammy in task history given that most of the time,
-        # orders are nowhere near their notification or ejection times. Later
-        # we may try something like setting up dynamic schedules to check on
-        # orders more frequently as they get closer to the times that we
-        # should be taking action.
+        # orders are nowhere near their notification or ejection times. Each
+        # run only loads the orders whose next_action_time is due though, so
+        # it stays cheap regardless of how many orders are fulfilled.
         'schedule': timedelta(seconds=30).total_seconds(),
         'options': {
             'expires': timedelta(seconds=30).total_seconds()
@@ -414,6 +420,64 @@ else:
     # Else fulfillment will use ctime-based priority.
     ENABLE_ORDER_PRICE_PRIORITY = False
 
+if 'ENABLE_ORDER_ASSIGNMENT_SOLVER' in locals() and \
+        ENABLE_ORDER_ASSIGNMENT_SOLVER:
+    # Open orders will be matched to items together so that an early order
+    # doesn't take the only item which satisfies a later order.
+    pass
+else:
+    # Else fulfillment greedily selects items one order at a time.
+    ENABLE_ORDER_ASSIGNMENT_SOLVER = False
+
+if 'ORDER_ASSIGNMENT_SOLVER_MAX_ORDERS' not in locals():
+    # Only the highest priority open orders are matched together, the rest
+    # are processed greedily.
+    ORDER_ASSIGNMENT_SOLVER_MAX_ORDERS = 200
+
+if 'FULFILLMENT_PASS_PROFILE_RETENTION' not in locals():
+    # Profiles of fulfillment passes are deleted once they're this old.
+    FULFILLMENT_PASS_PROFILE_RETENTION = timedelta(days=7)
+
+if 'FULFILLMENT_TRIGGER_DEBOUNCE' not in locals():
+    # Requests for a fulfillment pass are coalesced into a single pending
+    # pass which starts this long after the first of them.
+    FULFILLMENT_TRIGGER_DEBOUNCE = timedelta(seconds=5)
+
+if 'FULFILLMENT_SHARDS' not in locals():
+    # Open orders are fulfilled by a single pass at a time unless shards of
+    # disjoint item types and/or locations are defined here, in the format
+    # described in bodega_core.sharding.
+    FULFILLMENT_SHARDS = {}
+
+if 'WARM_POOLS' not in locals():
+    # Pools of dynamic items created ahead of demand, in the format described
+    # in bodega_core.warm_pools.
+    WARM_POOLS = {}
+
+if 'WARM_POOL_DEMAND_WINDOW' not in locals():
+    # The target size of warm pools follows the demand over this window.
+    WARM_POOL_DEMAND_WINDOW = timedelta(days=7)
+
+if 'QUEUE_ESTIMATE_HISTORY_WINDOW' not in locals():
+    # Fulfillment estimates of open orders are based on the fulfillments
+    # within this window.
+    QUEUE_ESTIMATE_HISTORY_WINDOW = timedelta(days=7)
+
+if 'TASTE_TEST_MAX_WORKERS' not in locals():
+    # Taste tests of the items for a single order run concurrently on at most
+    # this many threads.
+    TASTE_TEST_MAX_WORKERS = 8
+
+if 'TASTE_TEST_TIMEOUT' not in locals():
+    # Seconds to wait for each taste test before treating its item as
+    # spoiled.
+    TASTE_TEST_TIMEOUT = 120
+
+if 'ITEM_PRICE_CACHE_TIMEOUT' not in locals():
+    # Item prices are remembered in each process for up to this long, since
+    # some depend on the items in inventory which other processes may create.
+    ITEM_PRICE_CACHE_TIMEOUT = timedelta(minutes=10)
+
 if 'ENABLE_PHYSICAL_STOCK' in locals() and ENABLE_PHYSICAL_STOCK:
     INSTALLED_APPS += ['bodega_physical']
 else: